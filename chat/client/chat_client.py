@@ -6,27 +6,74 @@ COSC 450 Final Project - Kaustubh Rai
 
 import socket
 import threading
+import queue
+import json
+import time
+import os
 import sys
+from collections import deque
+
+# Add shared module to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from shared.protocol import (
+    BUFFER_SIZE, HEARTBEAT, HEARTBEAT_REPLY, LineBuffer, encode_line,
+    make_hello, make_stamp, parse_seq_line, parse_stamp, parse_welcome
+)
+from shared.sockopts import SocketTuning, add_socket_arguments
 
 
 class ChatClient:
     """Chat client with threaded message receiving"""
     
-    def __init__(self, server_host, server_port, username):
+    def __init__(self, server_host, server_port, username, reconnect_attempts=5,
+                 heartbeat_interval=15.0, headless=False, max_fps=30,
+                 queue_size=1000, socket_profile='interactive', link_mbps=0, rtt_ms=0):
         self.server_host = server_host
         self.server_port = server_port
         self.username = username
         self.socket = None
         self.running = False
+        self.reconnect_attempts = reconnect_attempts
+        self.last_seq = None  # Highest message sequence seen so far
+        self.epoch = None  # Server history the sequences belong to
+        self.resume_token = None  # Lets a reconnect take over our old session
+        
+        # Heartbeats keep the server from reaping a quiet client, and the
+        # server's replies let us notice a dead server within a few beats
+        self.heartbeat_interval = heartbeat_interval
+        self.last_send = time.monotonic()
+        self.send_lock = threading.Lock()
+        
+        # The receive thread only decodes; a render thread draws queued
+        # batches at most max_fps times a second. If the terminal falls
+        # behind, batches are dropped instead of blocking the socket (and,
+        # through TCP backpressure, the server and everyone else).
+        self.headless = headless
+        if max_fps <= 0:
+            raise ValueError(f"max_fps must be above 0, not {max_fps}")
+        self.max_fps = max_fps
+        self.render_queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0  # Guarded by the render queue's mutex
+        
+        # Counters for headless mode (bots and benchmarks)
+        self.received = 0
+        self.latencies_ms = deque(maxlen=100_000)
+        
+        # NODELAY so each line goes out at once, keepalive for dead links
+        self.tuning = SocketTuning(socket_profile, link_mbps, rtt_ms)
     
     def connect(self):
         """Connect to chat server"""
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.tuning.apply(self.socket)
             self.socket.connect((self.server_host, self.server_port))
+            if self.heartbeat_interval:
+                self.socket.settimeout(self.heartbeat_interval * 3)
             
-            # Send username
-            self.socket.send(self.username.encode('utf-8'))
+            # Send username, and the last sequence seen when resuming
+            self.socket.sendall(make_hello(self.username, self.last_seq, self.epoch,
+                                               self.resume_token))
             
             print(f"[+] Connected to chat server at {self.server_host}:{self.server_port}")
             print("=" * 70)
@@ -35,23 +82,147 @@ class ChatClient:
             print(f"[!] Connection failed: {e}")
             return False
     
+    def reconnect(self):
+        """Reconnect after a dropped connection, resuming from last_seq"""
+        for attempt in range(1, self.reconnect_attempts + 1):
+            if not self.running:
+                return False
+            
+            delay = min(2 ** (attempt - 1), 10)
+            print(f"\r[!] Reconnecting in {delay}s (attempt {attempt}/{self.reconnect_attempts})...")
+            time.sleep(delay)
+            
+            if self.socket:
+                self.socket.close()
+            if self.connect():
+                return True
+        return False
+    
+    def send_line(self, text):
+        """Send one line; safe to call from several threads"""
+        with self.send_lock:
+            self.socket.sendall(encode_line(text))
+            self.last_send = time.monotonic()
+    
+    def send_heartbeats(self):
+        """Send a heartbeat whenever we have been quiet for an interval"""
+        while self.running:
+            idle = time.monotonic() - self.last_send
+            if idle < self.heartbeat_interval:
+                time.sleep(self.heartbeat_interval - idle)
+                continue
+            try:
+                self.send_line(HEARTBEAT)
+            except OSError:
+                # The receive thread notices the drop and reconnects
+                time.sleep(self.heartbeat_interval)
+    
+    def handle_lines(self, lines):
+        """Track sequence numbers and return the text to display"""
+        texts = []
+        for line in lines:
+            if line == HEARTBEAT_REPLY:
+                continue
+            welcome = parse_welcome(line)
+            if welcome is not None:
+                # A restarted server numbers from scratch; our old
+                # sequences would hide its messages
+                epoch, server_seq, self.resume_token = welcome
+                if epoch != self.epoch or server_seq < (self.last_seq or 0):
+                    self.last_seq = None
+                self.epoch = epoch
+                continue
+            seq, text = parse_seq_line(line)
+            if seq is not None:
+                # Skip anything already seen before a reconnect
+                if self.last_seq is not None and seq <= self.last_seq:
+                    continue
+                self.last_seq = seq
+            texts.append(text)
+        return texts
+    
     def receive_messages(self):
-        """Receive and display messages from server"""
+        """Receive and decode messages from server"""
+        buffer = LineBuffer()
+        
         while self.running:
             try:
-                message = self.socket.recv(4096).decode('utf-8')
-                if message:
-                    # Clear current line, print message, reprint prompt
-                    print(f"\r{message}", end='')
-                    print(f"You: ", end='', flush=True)
-                else:
-                    break
+                data = self.socket.recv(BUFFER_SIZE)
             except:
+                data = b''
+            
+            lines = []
+            if data:
+                try:
+                    lines = buffer.feed(data)
+                except ValueError as e:
+                    print(f"\r[!] Bad data from server: {e}")
+                    data = b''
+            
+            if not data:
+                if self.running and self.reconnect():
+                    buffer = LineBuffer()
+                    continue
                 break
+            
+            texts = self.handle_lines(lines)
+            if texts:
+                self.deliver(texts)
         
         print("\n[!] Disconnected from server")
         self.running = False
     
+    def deliver(self, texts):
+        """Hand decoded messages to the renderer, or just count them"""
+        self.received += len(texts)
+        
+        if self.headless:
+            now = time.monotonic_ns()
+            for text in texts:
+                sent_ns = parse_stamp(text)
+                if sent_ns is not None:
+                    self.latencies_ms.append((now - sent_ns) / 1e6)
+            return
+        
+        try:
+            self.render_queue.put_nowait(texts)
+        except queue.Full:
+            with self.render_queue.mutex:
+                self.dropped += len(texts)
+    
+    def render_messages(self):
+        """Draw queued messages in batches, at most max_fps times a second"""
+        frame_time = 1.0 / self.max_fps
+        last_frame = 0.0
+        
+        while self.running or not self.render_queue.empty():
+            try:
+                batch = self.render_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            
+            wait = last_frame + frame_time - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            
+            # Take everything that arrived meanwhile
+            lines = list(batch)
+            while True:
+                try:
+                    lines.extend(self.render_queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            with self.render_queue.mutex:
+                dropped, self.dropped = self.dropped, 0
+            if dropped:
+                lines.append(f"[!] {dropped} messages not shown (output too slow)")
+            
+            # Clear current line, print messages, reprint prompt in one write
+            sys.stdout.write("\r" + "\n".join(lines) + "\nYou: ")
+            sys.stdout.flush()
+            last_frame = time.monotonic()
+    
     def send_messages(self):
         """Send messages to server"""
         print("You: ", end='', flush=True)
@@ -66,7 +237,10 @@ class ChatClient:
                     break
                 
                 if message.strip():
-                    self.socket.send(message.encode('utf-8'))
+                    try:
+                        self.send_line(message)
+                    except OSError:
+                        print("[!] Not connected, message not sent")
                     print("You: ", end='', flush=True)
                     
             except KeyboardInterrupt:
@@ -84,13 +258,22 @@ class ChatClient:
         self.running = True
         
         print("\nChat Commands:")
-        print("  /quit - Exit the chat")
+        print("  /who               - List users online")
+        print("  /msg <user> <text> - Send a direct message")
+        print("  /quit              - Exit the chat")
         print("=" * 70 + "\n")
         
-        # Start receive thread
+        # Start receive and render threads
         receive_thread = threading.Thread(target=self.receive_messages, daemon=True)
         receive_thread.start()
         
+        render_thread = threading.Thread(target=self.render_messages, daemon=True)
+        render_thread.start()
+        
+        if self.heartbeat_interval:
+            heartbeat_thread = threading.Thread(target=self.send_heartbeats, daemon=True)
+            heartbeat_thread.start()
+        
         # Handle sending in main thread
         try:
             self.send_messages()
@@ -100,6 +283,65 @@ class ChatClient:
             self.running = False
             if self.socket:
                 self.socket.close()
+    
+    def run_headless(self, duration=None, send_rate=0):
+        """Run without any terminal I/O; optionally send stamped messages"""
+        if not self.connect():
+            return None
+        
+        self.running = True
+        threading.Thread(target=self.receive_messages, daemon=True).start()
+        if self.heartbeat_interval:
+            threading.Thread(target=self.send_heartbeats, daemon=True).start()
+        
+        start = time.monotonic()
+        next_send = start
+        try:
+            while self.running:
+                now = time.monotonic()
+                if duration and now - start >= duration:
+                    break
+                if send_rate > 0 and now >= next_send:
+                    try:
+                        self.send_line(make_stamp())
+                    except OSError:
+                        pass
+                    next_send += 1.0 / send_rate
+                    continue
+                time.sleep(min(0.1, max(0.0, next_send - now)) if send_rate > 0 else 0.1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.running = False
+            if self.socket:
+                self.socket.close()
+        
+        return self.stats(time.monotonic() - start)
+    
+    def stats(self, elapsed):
+        """Summary of what a headless client received"""
+        result = {
+            'received': self.received,
+            'elapsed': elapsed,
+            'messages_per_sec': self.received / elapsed if elapsed else 0,
+        }
+        latencies = sorted(self.latencies_ms)
+        if latencies:
+            result['latency_ms'] = {
+                'p50': latencies[len(latencies) // 2],
+                'p99': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+                'max': latencies[-1],
+                'samples': len(latencies),
+            }
+        return result
+
+
+def positive_int(value):
+    """argparse type for counts that must be at least 1"""
+    number = int(value)
+    if number < 1:
+        raise ValueError(value)
+    return number
 
 
 if __name__ == '__main__':
@@ -114,8 +356,34 @@ if __name__ == '__main__':
                        help='Server port (default: 8888)')
     parser.add_argument('--username', required=True,
                        help='Your username')
+    parser.add_argument('--reconnect-attempts', type=int, default=5,
+                       help='Reconnect attempts after a dropped connection (default: 5)')
+    parser.add_argument('--heartbeat', type=float, default=15.0,
+                       help='Heartbeat interval in seconds, 0 to disable (default: 15)')
+    parser.add_argument('--max-fps', type=positive_int, default=30,
+                       help='Maximum screen redraws per second (default: 30)')
+    parser.add_argument('--headless', action='store_true',
+                       help='No terminal I/O; count messages and latency, then print stats')
+    parser.add_argument('--duration', type=float, default=None,
+                       help='Headless: seconds to run (default: until Ctrl-C)')
+    parser.add_argument('--send-rate', type=float, default=0,
+                       help='Headless: timestamped messages to send per second (default: 0)')
+    add_socket_arguments(parser, 'interactive')
     
     args = parser.parse_args()
     
-    client = ChatClient(args.host, args.port, args.username)
-    client.start()
+    client = ChatClient(args.host, args.port, args.username,
+                        reconnect_attempts=args.reconnect_attempts,
+                        heartbeat_interval=args.heartbeat,
+                        headless=args.headless,
+                        max_fps=args.max_fps,
+                        socket_profile=args.socket_profile,
+                        link_mbps=args.link_mbps,
+                        rtt_ms=args.rtt_ms)
+    
+    if args.headless:
+        stats = client.run_headless(args.duration, args.send_rate)
+        if stats is not None:
+            print(json.dumps(stats, indent=2))
+    else:
+        client.start()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+SSL/TLS-enabled Chat Client
+COSC 450 Final Project - Kaustubh Rai
+"""
+
+import socket
+import os
+import sys
+
+# Ensure original client module can be imported
+sys.path.insert(0, os.path.dirname(__file__))
+
+from chat_client import ChatClient
+from shared.protocol import make_hello
+from shared.sockopts import add_socket_arguments
+from shared.tls import CIPHER_PROFILES, client_context, get_session, save_session
+
+
+class ChatClientSSL(ChatClient):
+    """
+    Chat client with SSL/TLS encryption.
+    Reconnects resume the previous TLS session when the server allows it.
+    """
+
+    def __init__(self, server_host, server_port, username,
+                 cipher_profile='default', cafile=None, **kwargs):
+        super().__init__(server_host, server_port, username, **kwargs)
+        self.context = client_context(cipher_profile, cafile)
+
+    def connect(self):
+        """Connect to the chat server using SSL/TLS."""
+        try:
+            raw_socket = self.tuning.apply(socket.socket(socket.AF_INET, socket.SOCK_STREAM))
+            self.socket = self.context.wrap_socket(
+                raw_socket,
+                server_hostname=self.server_host,
+                session=get_session(self.server_host, self.server_port)
+            )
+            self.socket.connect((self.server_host, self.server_port))
+            if self.heartbeat_interval:
+                self.socket.settimeout(self.heartbeat_interval * 3)
+
+            # Send username, and the last sequence seen when resuming
+            self.socket.sendall(make_hello(self.username, self.last_seq, self.epoch,
+                                               self.resume_token))
+
+            resumed = " (session resumed)" if self.socket.session_reused else ""
+            print(f"[+] Connected securely to {self.server_host}:{self.server_port}{resumed}")
+            print("=" * 70)
+            return True
+        except Exception as e:
+            print(f"[!] SSL connection failed: {e}")
+            return False
+
+    def reconnect(self):
+        """Keep the TLS session of the dropped connection, then reconnect"""
+        if self.socket:
+            save_session(self.server_host, self.server_port, self.socket)
+        return super().reconnect()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='SSL/TLS Chat Client for COSC 450 Project'
+    )
+    parser.add_argument('--host', required=True,
+                        help='Server hostname or IP address')
+    parser.add_argument('--port', type=int, default=8889,
+                        help='Server port (default: 8889)')
+    parser.add_argument('--username', required=True,
+                        help='Your username')
+    parser.add_argument('--ciphers', default='default',
+                        choices=sorted(CIPHER_PROFILES),
+                        help='TLS 1.2 cipher profile (default: default)')
+    parser.add_argument('--cafile', default=None,
+                        help='CA bundle to verify the server certificate')
+    add_socket_arguments(parser, 'interactive')
+
+    args = parser.parse_args()
+
+    client = ChatClientSSL(args.host, args.port, args.username,
+                           cipher_profile=args.ciphers, cafile=args.cafile,
+                           socket_profile=args.socket_profile,
+                           link_mbps=args.link_mbps, rtt_ms=args.rtt_ms)
+    client.start()
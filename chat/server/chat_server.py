@@ -5,25 +5,85 @@ COSC 450 Final Project - Kaustubh Rai
 """
 
 import socket
+import struct
 import threading
 import json
+import os
+import signal
+import sys
 from datetime import datetime
 
+# Add shared module to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+from shared.protocol import (
+    BUFFER_SIZE, HEARTBEAT, HEARTBEAT_REPLY, LineBuffer, encode_line,
+    encode_seq_line, make_welcome, parse_hello
+)
+from shared.sockopts import SocketTuning, add_socket_arguments
+from shared.timer_wheel import TimerWheel
+from shared.profiler import DEFAULT_HZ, ProfilerControl, StackSampler, add_profiler_arguments
+from history import MessageHistory
+from outbox import MAX_BACKLOG, Outbox
+from presence import PresenceBatcher, PresenceDirectory
+
 
 class ChatServer:
     """Multi-threaded chat server with client management"""
     
-    def __init__(self, host='0.0.0.0', port=8888):
+    def __init__(self, host='0.0.0.0', port=8888, history_size=1000,
+                 history_bytes=1024 * 1024, history_dir=None,
+                 history_disk_bytes=64 * 1024 * 1024, join_replay=20,
+                 presence_interval=1.0, idle_timeout=60.0, hello_timeout=10.0,
+                 send_timeout=5.0, max_backlog=MAX_BACKLOG, socket_profile='interactive',
+                 link_mbps=0, rtt_ms=0, profile_file=None, profile_hz=DEFAULT_HZ, profile_control=None):
         self.host = host
         self.port = port
         self.server_socket = None
-        self.clients = {}  # {socket: username}
+        self.clients = PresenceDirectory()  # {socket: username} + name index
         self.clients_lock = threading.Lock()
+        
+        # Lines are queued per client under clients_lock and sent by each
+        # client's writer thread, so a slow reader never holds the lock
+        self.outboxes = {}  # {socket: Outbox}
+        self.max_backlog = max_backlog
+        
+        # Recent messages for replay to joining/reconnecting clients
+        self.history = MessageHistory(
+            max_messages=history_size,
+            max_bytes=history_bytes,
+            log_dir=history_dir,
+            max_disk_bytes=history_disk_bytes
+        )
+        self.join_replay = join_replay
+        
+        # Join/leave notices are batched so a mass reconnect costs one
+        # broadcast per interval instead of one per user
+        self.presence = PresenceBatcher(self.broadcast, presence_interval)
+        
+        # Silent connections are reaped by one timer wheel rather than a
+        # timer or poll per socket; 0 disables a timeout
+        self.idle_timeout = idle_timeout
+        self.hello_timeout = hello_timeout
+        self.send_timeout = send_timeout
+        self.timers = TimerWheel(tick=0.5)
+        
+        # NODELAY and keepalive by default; buffers follow the link's
+        # bandwidth-delay product when it is given
+        self.tuning = SocketTuning(socket_profile, link_mbps, rtt_ms)
+        
+        # Stack sampling: from startup with a profile file, or started and
+        # dumped at runtime through the control socket
+        self.profiler = StackSampler(profile_hz)
+        self.profile_file = profile_file
+        self.profiler_control = (ProfilerControl(self.profiler, profile_control)
+                                 if profile_control else None)
     
     def start(self):
         """Start the chat server"""
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.tuning.apply(self.server_socket)
         self.server_socket.bind((self.host, self.port))
         self.server_socket.listen(10)
         
@@ -32,12 +92,18 @@ class ChatServer:
         print("=" * 70)
         print(f"Host: {self.host}")
         print(f"Port: {self.port}")
+        print(f"Socket profile: {self.tuning.describe()}")
         print("=" * 70)
         print("Waiting for connections...\n")
         
+        self.timers.start()
+        self.start_profiling()
+        self.write_on_sigterm()
+        
         try:
             while True:
                 client_socket, client_address = self.server_socket.accept()
+                self.tuning.apply(client_socket)
                 
                 # Handle client in separate thread
                 client_thread = threading.Thread(
@@ -52,84 +118,279 @@ class ChatServer:
         finally:
             self.shutdown()
     
+    def start_profiling(self):
+        """Start the profiler and/or its control socket, as configured"""
+        if self.profile_file:
+            self.profiler.start()
+            print(f"[+] Profiling at {self.profiler.hz:g} Hz into {self.profile_file}")
+        if self.profiler_control:
+            self.profiler_control.start()
+            print(f"[+] Profiler control socket: {self.profiler_control.path}")
+    
+    def write_on_sigterm(self):
+        """Shut down cleanly on SIGTERM too, so the profile file gets written"""
+        if not self.profile_file:
+            return
+        
+        def terminate(signum, frame):
+            raise KeyboardInterrupt
+        
+        signal.signal(signal.SIGTERM, terminate)
+    
+    def stop_profiling(self):
+        """Stop profiling; the profile file gets what was collected"""
+        if self.profiler_control:
+            self.profiler_control.stop()
+        self.profiler.stop()
+        if self.profile_file:
+            self.profiler.dump(self.profile_file)
+            status = self.profiler.status()
+            print(f"[+] Profile written to {self.profile_file} ({status['samples']} samples, "
+                  f"{status['overhead_percent']:.2f}% CPU overhead)")
+    
     def handle_client(self, client_socket, client_address):
         """Handle a client connection"""
         username = None
         
         try:
-            # Receive username
-            username = client_socket.recv(1024).decode('utf-8').strip()
+            self.arm_timeouts(client_socket, client_address)
+            
+            # Receive hello line: username plus optional last-seen sequence
+            buffer = LineBuffer()
+            lines = []
+            while not lines:
+                data = client_socket.recv(BUFFER_SIZE)
+                if not data:
+                    client_socket.close()
+                    return
+                lines = buffer.feed(data)
+            
+            username, last_seq, epoch, token = parse_hello(lines.pop(0))
             
             if not username:
                 client_socket.close()
                 return
             
-            # Add client to active clients
+            # Send welcome text and missed messages in one batch, and add
+            # the client under the same lock so no broadcast interleaves
             with self.clients_lock:
-                self.clients[client_socket] = username
+                old_socket = None
+                admitted = True
+                if self.clients.lookup(username) is not None:
+                    # A resuming client replaces its own stale connection
+                    # (e.g. one that has not timed out after a VPN drop),
+                    # proven by the resume token that session was given
+                    old_socket = self.clients.replace(client_socket, username, token)
+                    admitted = old_socket is not None
+                else:
+                    self.clients.add(client_socket, username)
+                
+                if admitted:
+                    self.attach(client_socket)
+                    welcome_msg = f"Welcome to the chat, {username}!\n"
+                    welcome_msg += f"Users online: {len(self.clients)}"
+                    room = self.history.room()
+                    # Sequences from another epoch, or ahead of ours, come
+                    # from before a restart that lost the history: join afresh
+                    if (last_seq is None or last_seq > room.last_seq or
+                            epoch not in (None, room.epoch)):
+                        last_seq = max(0, room.last_seq - self.join_replay)
+                    missed = room.since(last_seq)
+                    
+                    batch = [make_welcome(room.epoch, room.last_seq,
+                                          self.clients.token(client_socket)),
+                             encode_line(welcome_msg)]
+                    batch.extend(encode_seq_line(seq, text) for seq, text in missed)
+                    self.outboxes[client_socket].put(b''.join(batch))
             
-            print(f"[+] User '{username}' joined from {client_address[0]}:{client_address[1]}")
+            if not admitted:
+                client_socket.sendall(encode_line(
+                    f"[!] Username '{username}' is already taken"
+                ))
+                username = None
+                return
             
-            # Broadcast join message
-            join_msg = f"*** {username} has joined the chat ***"
-            self.broadcast(join_msg, client_socket)
+            print(f"[+] User '{username}' joined from {client_address[0]}:{client_address[1]}"
+                  f" (replayed {len(missed)} messages)")
             
-            # Send welcome message
-            welcome_msg = f"Welcome to the chat, {username}!\n"
-            welcome_msg += f"Users online: {len(self.clients)}\n"
-            client_socket.send(welcome_msg.encode('utf-8'))
+            if self.idle_timeout:
+                self.timers.touch(client_socket, self.idle_timeout)
+            else:
+                self.timers.cancel(client_socket)
+            
+            if old_socket is not None:
+                try:
+                    old_socket.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            else:
+                self.presence.joined_event(username)
             
             # Handle messages from this client
             while True:
-                message = client_socket.recv(4096).decode('utf-8')
+                for message in lines:
+                    if not message:
+                        continue
+                    
+                    if message.startswith('/'):
+                        self.handle_command(client_socket, username, message)
+                        continue
+                    
+                    # Format and broadcast message
+                    timestamp = datetime.now().strftime("%H:%M:%S")
+                    formatted_msg = f"[{timestamp}] {username}: {message}"
+                    print(formatted_msg)
+                    
+                    self.broadcast(formatted_msg, client_socket)
                 
-                if not message:
+                data = client_socket.recv(BUFFER_SIZE)
+                if not data:
                     break
-                
-                # Format and broadcast message
-                timestamp = datetime.now().strftime("%H:%M:%S")
-                formatted_msg = f"[{timestamp}] {username}: {message}"
-                print(formatted_msg)
-                
-                self.broadcast(formatted_msg, client_socket)
+                if self.idle_timeout:
+                    self.timers.touch(client_socket, self.idle_timeout)
+                lines = buffer.feed(data)
             
         except Exception as e:
             print(f"[!] Error handling client {client_address}: {e}")
         
         finally:
-            # Remove client and broadcast leave message
+            self.timers.cancel(client_socket)
+            
+            # Remove client and queue leave notice
             with self.clients_lock:
-                if client_socket in self.clients:
-                    username = self.clients[client_socket]
-                    del self.clients[client_socket]
+                username = self.clients.remove(client_socket)
+                outbox = self.outboxes.pop(client_socket, None)
+            if outbox is not None:
+                outbox.close()
             
             if username:
-                leave_msg = f"*** {username} has left the chat ***"
-                print(leave_msg)
-                self.broadcast(leave_msg, client_socket)
+                print(f"[-] User '{username}' left")
+                self.presence.left_event(username)
             
             client_socket.close()
     
+    def arm_timeouts(self, client_socket, client_address):
+        """Set the send timeout and start the hello/idle timer for a client"""
+        if self.send_timeout:
+            # SO_SNDTIMEO bounds a blocked send without affecting recv, so
+            # a stalled client's writer thread gives up and drops it
+            seconds = int(self.send_timeout)
+            micros = int((self.send_timeout - seconds) * 1_000_000)
+            client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO,
+                                     struct.pack('ll', seconds, micros))
+        
+        timeout = self.hello_timeout or self.idle_timeout
+        if timeout:
+            self.timers.schedule(
+                client_socket, timeout,
+                lambda: self.reap(client_socket, client_address)
+            )
+    
+    def reap(self, client_socket, client_address):
+        """Drop a connection that went quiet; its thread then cleans up"""
+        print(f"[-] Reaping idle connection {client_address[0]}:{client_address[1]}")
+        self.disconnect(client_socket)
+    
+    def disconnect(self, client_socket):
+        """Shut a connection down; its recv returns and its thread cleans up"""
+        try:
+            client_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    
+    def attach(self, client_socket):
+        """Give a registered client its outbox; caller holds clients_lock"""
+        self.outboxes[client_socket] = Outbox(client_socket, self.disconnect,
+                                              self.max_backlog)
+    
+    def _queue_locked(self, client_socket, data):
+        """Queue bytes for one client; False if it is gone or too far behind"""
+        outbox = self.outboxes.get(client_socket)
+        return outbox is not None and outbox.put(data)
+    
+    def handle_command(self, client_socket, username, command):
+        """Handle a /command from a client; replies go only to that client"""
+        name, _, args = command.partition(' ')
+        name = name.lower()
+        
+        if name == HEARTBEAT:
+            self.send_to(client_socket, HEARTBEAT_REPLY)
+        
+        elif name == '/who':
+            with self.clients_lock:
+                users = self.clients.usernames()
+            reply = f"Users online ({len(users)}): {', '.join(users)}"
+            self.send_to(client_socket, reply)
+        
+        elif name == '/msg':
+            target, _, text = args.strip().partition(' ')
+            if not target or not text.strip():
+                self.send_to(client_socket, "[!] Usage: /msg <user> <message>")
+                return
+            
+            timestamp = datetime.now().strftime("%H:%M:%S")
+            with self.clients_lock:
+                target_socket = self.clients.lookup(target)
+                if target_socket is None:
+                    reply = f"[!] User '{target}' is not online"
+                else:
+                    target_name = self.clients.username(target_socket)
+                    self._send_locked(
+                        target_socket,
+                        f"[{timestamp}] [DM from {username}]: {text}"
+                    )
+                    reply = f"[{timestamp}] [DM to {target_name}]: {text}"
+                self._send_locked(client_socket, reply)
+        
+        else:
+            self.send_to(
+                client_socket,
+                f"[!] Unknown command: {name} (try /who or /msg <user> <message>)"
+            )
+    
+    def send_to(self, client_socket, message):
+        """Send an unsequenced line to a single client"""
+        with self.clients_lock:
+            self._send_locked(client_socket, message)
+    
+    def _send_locked(self, client_socket, message):
+        """Send a line to one client; caller holds clients_lock"""
+        if not self._queue_locked(client_socket, encode_line(message)):
+            self.disconnect(client_socket)
+    
     def broadcast(self, message, sender_socket=None):
         """Broadcast message to all connected clients except sender"""
-        message_bytes = (message + '\n').encode('utf-8')
+        dead = []
         
         with self.clients_lock:
-            for client_socket in list(self.clients.keys()):
-                if client_socket != sender_socket:
-                    try:
-                        client_socket.send(message_bytes)
-                    except:
-                        # Remove dead client
-                        if client_socket in self.clients:
-                            username = self.clients[client_socket]
-                            del self.clients[client_socket]
-                            print(f"[-] Removed dead connection: {username}")
+            # Sequence and send under one lock so every client sees the
+            # same order as the history
+            seq = self.history.append(message)
+            message_bytes = encode_seq_line(seq, message)
+            
+            outboxes = self.outboxes
+            for client_socket in self.clients.sockets():
+                if client_socket == sender_socket:
+                    continue
+                outbox = outboxes.get(client_socket)
+                if outbox is None or not outbox.put(message_bytes):
+                    # Too far behind (or its writer failed): drop it, and
+                    # let its handler thread see the shutdown and exit
+                    username = self.clients.remove(client_socket)
+                    self.disconnect(client_socket)
+                    if username:
+                        dead.append(username)
+                        print(f"[-] Removed slow or dead connection: {username}")
+        
+        for username in dead:
+            self.presence.left_event(username)
     
     def shutdown(self):
         """Shutdown server and close all connections"""
         with self.clients_lock:
-            for client_socket in self.clients.keys():
+            for outbox in self.outboxes.values():
+                outbox.close()
+            for client_socket in self.clients.sockets():
                 try:
                     client_socket.close()
                 except:
@@ -138,21 +399,76 @@ class ChatServer:
         if self.server_socket:
             self.server_socket.close()
         
+        self.timers.stop()
+        self.history.close()
+        self.stop_profiling()
         print("[+] Server shutdown complete")
 
 
+def add_server_arguments(parser, port=8888):
+    """Options shared by the plain and the SSL chat server"""
+    parser.add_argument('--host', default='0.0.0.0',
+                       help='Host to bind to (default: 0.0.0.0)')
+    parser.add_argument('--port', type=int, default=port,
+                       help=f'Port to bind to (default: {port})')
+    parser.add_argument('--history-size', type=int, default=1000,
+                       help='Messages kept in memory per room (default: 1000)')
+    parser.add_argument('--history-kb', type=int, default=1024,
+                       help='Memory cap for history per room in KB (default: 1024)')
+    parser.add_argument('--history-dir', default=None,
+                       help='Directory for the on-disk message log (default: off)')
+    parser.add_argument('--history-disk-mb', type=int, default=64,
+                       help='Disk cap for the message log per room in MB (default: 64)')
+    parser.add_argument('--join-replay', type=int, default=20,
+                       help='Recent messages shown to newly joined users (default: 20)')
+    parser.add_argument('--presence-interval', type=float, default=1.0,
+                       help='Seconds to batch join/leave notices, 0 to disable (default: 1.0)')
+    parser.add_argument('--idle-timeout', type=float, default=60.0,
+                       help='Drop clients silent for this many seconds, 0 to disable (default: 60)')
+    parser.add_argument('--hello-timeout', type=float, default=10.0,
+                       help='Drop connections that send no username in time (default: 10)')
+    parser.add_argument('--send-timeout', type=float, default=5.0,
+                       help='Drop clients that block a send this long (default: 5)')
+    parser.add_argument('--send-backlog-kb', type=int, default=MAX_BACKLOG // 1024,
+                       help='Drop clients with this much unsent output queued '
+                            f'(default: {MAX_BACKLOG // 1024})')
+    add_socket_arguments(parser, 'interactive')
+    add_profiler_arguments(parser)
+
+
+def server_options(args):
+    """ChatServer keyword arguments from add_server_arguments' options"""
+    return dict(
+        host=args.host,
+        port=args.port,
+        history_size=args.history_size,
+        history_bytes=args.history_kb * 1024,
+        history_dir=args.history_dir,
+        history_disk_bytes=args.history_disk_mb * 1024 * 1024,
+        join_replay=args.join_replay,
+        presence_interval=args.presence_interval,
+        idle_timeout=args.idle_timeout,
+        hello_timeout=args.hello_timeout,
+        send_timeout=args.send_timeout,
+        max_backlog=args.send_backlog_kb * 1024,
+        socket_profile=args.socket_profile,
+        link_mbps=args.link_mbps,
+        rtt_ms=args.rtt_ms,
+        profile_file=args.profile,
+        profile_hz=args.profile_hz,
+        profile_control=args.profile_control
+    )
+
+
 if __name__ == '__main__':
     import argparse
     
     parser = argparse.ArgumentParser(
         description='Multi-Client Chat Server for COSC 450 Project'
     )
-    parser.add_argument('--host', default='0.0.0.0',
-                       help='Host to bind to (default: 0.0.0.0)')
-    parser.add_argument('--port', type=int, default=8888,
-                       help='Port to bind to (default: 8888)')
+    add_server_arguments(parser)
     
     args = parser.parse_args()
     
-    server = ChatServer(args.host, args.port)
+    server = ChatServer(**server_options(args))
     server.start()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+SSL/TLS-enabled Multi-Client Chat Server
+COSC 450 Final Project - Kaustubh Rai
+"""
+
+import ssl
+import os
+import sys
+
+# Ensure original server module can be imported
+sys.path.insert(0, os.path.dirname(__file__))
+
+from chat_server import ChatServer, add_server_arguments, server_options
+from shared.tls import CIPHER_PROFILES, server_context
+
+
+class ChatServerSSL(ChatServer):
+    """
+    Chat server with SSL/TLS encryption.
+    The TLS handshake runs in the per-client thread, so a slow or
+    stalled handshake never blocks the accept loop.
+    """
+
+    def __init__(self, host='0.0.0.0', port=8889, certfile=None, keyfile=None,
+                 cipher_profile='default', handshake_timeout=10.0, **kwargs):
+        super().__init__(host=host, port=port, **kwargs)
+        self.context = server_context(certfile, keyfile, cipher_profile)
+        self.cipher_profile = cipher_profile
+        self.handshake_timeout = handshake_timeout
+
+    def start(self):
+        """Start SSL-enabled chat server."""
+        print(f"[+] SSL/TLS enabled for chat server (ciphers: {self.cipher_profile})")
+        super().start()
+
+    def handle_client(self, client_socket, client_address):
+        """Complete the TLS handshake, then handle the client as usual"""
+        try:
+            client_socket.settimeout(self.handshake_timeout)
+            tls_socket = self.context.wrap_socket(client_socket, server_side=True)
+            tls_socket.settimeout(None)
+        except (ssl.SSLError, OSError) as e:
+            print(f"[!] TLS handshake failed with {client_address}: {e}")
+            client_socket.close()
+            return
+
+        super().handle_client(tls_socket, client_address)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='SSL/TLS Multi-Client Chat Server for COSC 450 Project'
+    )
+    add_server_arguments(parser, port=8889)
+    parser.add_argument('--certfile', required=True)
+    parser.add_argument('--keyfile', required=True)
+    parser.add_argument('--ciphers', default='default',
+                        choices=sorted(CIPHER_PROFILES),
+                        help='TLS 1.2 cipher profile (default: default)')
+    parser.add_argument('--handshake-timeout', type=float, default=10.0,
+                        help='Drop clients that do not finish the TLS handshake in time '
+                             '(default: 10)')
+
+    args = parser.parse_args()
+
+    server = ChatServerSSL(
+        certfile=args.certfile,
+        keyfile=args.keyfile,
+        cipher_profile=args.ciphers,
+        handshake_timeout=args.handshake_timeout,
+        **server_options(args)
+    )
+    server.start()
@@ -0,0 +1,238 @@
+"""
+Chat Message History
+COSC 450 Final Project - Kaustubh Rai
+
+Keeps a bounded, sequenced history of recent messages per room so that
+joining or reconnecting clients can be brought up to date in one batch.
+Recent messages live in an in-memory ring buffer; optionally every
+message is also appended to on-disk segment files so that a client that
+was gone for longer than the ring covers can still be replayed.
+
+Sequence numbers only mean something within one history. Each room has
+an epoch: random per run, or kept in the log directory next to the
+segments, so it changes exactly when the numbering starts over.
+"""
+
+import os
+import threading
+from collections import deque
+from itertools import islice
+
+DEFAULT_ROOM = 'lobby'
+SEGMENT_SUFFIX = '.log'
+EPOCH_SUFFIX = '.epoch'
+
+
+class RoomHistory:
+    """Ring buffer of recent messages for one room, with optional segment log"""
+
+    def __init__(self, room, max_messages=1000, max_bytes=1024 * 1024,
+                 log_dir=None, segment_bytes=1024 * 1024,
+                 max_disk_bytes=64 * 1024 * 1024, max_replay=5000):
+        self.room = room
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.log_dir = log_dir
+        self.segment_bytes = segment_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.max_replay = max_replay
+
+        self.ring = deque()  # (seq, text)
+        self.ring_bytes = 0
+        self.last_seq = 0
+        self.lock = threading.Lock()
+
+        self.segments = []  # [(first_seq, path)] oldest first
+        self.segment_file = None
+        self.segment_size = 0
+
+        self.epoch = os.urandom(4).hex()
+        if self.log_dir:
+            os.makedirs(self.log_dir, exist_ok=True)
+            self._load_segments()
+            self.epoch = self._load_epoch()
+
+    def append(self, text):
+        """Store a message and return its sequence number"""
+        with self.lock:
+            self.last_seq += 1
+            seq = self.last_seq
+
+            self.ring.append((seq, text))
+            self.ring_bytes += len(text)
+            while self.ring and (len(self.ring) > self.max_messages or
+                                 self.ring_bytes > self.max_bytes):
+                _, old_text = self.ring.popleft()
+                self.ring_bytes -= len(old_text)
+
+            if self.log_dir:
+                self._write_to_log(seq, text)
+
+            return seq
+
+    def since(self, last_seq, limit=None):
+        """Return [(seq, text)] for every message after last_seq"""
+        limit = limit or self.max_replay
+
+        with self.lock:
+            if last_seq >= self.last_seq:
+                return []
+
+            first_wanted = max(last_seq + 1, self.last_seq - limit + 1)
+            ring_start = self.ring[0][0] if self.ring else self.last_seq + 1
+
+            messages = []
+            if first_wanted < ring_start and self.log_dir:
+                messages = self._read_from_log(first_wanted, ring_start)
+
+            skip = max(0, first_wanted - ring_start)
+            messages.extend(islice(self.ring, skip, None))
+            return messages
+
+    def close(self):
+        """Flush and close the active segment"""
+        with self.lock:
+            if self.segment_file:
+                self.segment_file.close()
+                self.segment_file = None
+
+    # ------------------------------------------------------------------
+    # Segment log
+    # ------------------------------------------------------------------
+
+    def _segment_path(self, first_seq):
+        return os.path.join(self.log_dir,
+                            f"{self.room}.{first_seq:012d}{SEGMENT_SUFFIX}")
+
+    def _load_segments(self):
+        """Pick up segments from a previous run and refill the ring"""
+        prefix = f"{self.room}."
+        for name in os.listdir(self.log_dir):
+            if not (name.startswith(prefix) and name.endswith(SEGMENT_SUFFIX)):
+                continue
+            first_seq = name[len(prefix):-len(SEGMENT_SUFFIX)]
+            if first_seq.isdigit():
+                self.segments.append(
+                    (int(first_seq), os.path.join(self.log_dir, name))
+                )
+        self.segments.sort()
+
+        # Walk segments newest-first until the ring is full
+        recent = []
+        for _, path in reversed(self.segments):
+            recent = self._read_segment(path) + recent
+            if len(recent) >= self.max_messages:
+                break
+
+        for seq, text in recent[-self.max_messages:]:
+            self.ring.append((seq, text))
+            self.ring_bytes += len(text)
+        while self.ring and self.ring_bytes > self.max_bytes:
+            _, old_text = self.ring.popleft()
+            self.ring_bytes -= len(old_text)
+
+        if recent:
+            self.last_seq = recent[-1][0]
+        if self.segments:
+            self.segment_size = os.path.getsize(self.segments[-1][1])
+
+    def _load_epoch(self):
+        """Reuse the epoch of a previous run, unless its log is gone"""
+        path = os.path.join(self.log_dir, f"{self.room}{EPOCH_SUFFIX}")
+        if self.segments:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    epoch = f.read().strip()
+                if epoch:
+                    return epoch
+            except OSError:
+                pass
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.epoch + '\n')
+        return self.epoch
+
+    def _read_segment(self, path):
+        messages = []
+        with open(path, encoding='utf-8', errors='replace') as f:
+            for line in f:
+                seq, sep, text = line.rstrip('\n').partition('\t')
+                if sep and seq.isdigit():
+                    messages.append((int(seq), text))
+        return messages
+
+    def _read_from_log(self, first_seq, end_seq):
+        """Read messages in [first_seq, end_seq) from the segment files"""
+        if self.segment_file:
+            self.segment_file.flush()
+
+        messages = []
+        for i, (start, path) in enumerate(self.segments):
+            next_start = (self.segments[i + 1][0]
+                          if i + 1 < len(self.segments) else None)
+            if next_start is not None and next_start <= first_seq:
+                continue
+            if start >= end_seq:
+                break
+            for seq, text in self._read_segment(path):
+                if first_seq <= seq < end_seq:
+                    messages.append((seq, text))
+        return messages
+
+    def _write_to_log(self, seq, text):
+        line = f"{seq}\t{text}\n".encode('utf-8')
+
+        if self.segment_file is None or self.segment_size >= self.segment_bytes:
+            self._roll_segment(seq)
+
+        self.segment_file.write(line)
+        self.segment_size += len(line)
+
+    def _roll_segment(self, first_seq):
+        """Start a new segment and drop the oldest ones over the disk cap"""
+        if self.segment_file:
+            self.segment_file.close()
+        elif self.segments and self.segment_size < self.segment_bytes:
+            # Keep appending to the last segment from a previous run
+            self.segment_file = open(self.segments[-1][1], 'ab')
+            return
+
+        path = self._segment_path(first_seq)
+        self.segment_file = open(path, 'ab')
+        self.segment_size = 0
+        self.segments.append((first_seq, path))
+
+        total = sum(os.path.getsize(p) for _, p in self.segments[:-1])
+        while len(self.segments) > 1 and total > self.max_disk_bytes:
+            _, oldest = self.segments.pop(0)
+            total -= os.path.getsize(oldest)
+            try:
+                os.remove(oldest)
+            except OSError:
+                pass
+
+
+class MessageHistory:
+    """Per-room message histories sharing the same limits"""
+
+    def __init__(self, **room_options):
+        self.room_options = room_options
+        self.rooms = {}
+        self.lock = threading.Lock()
+
+    def room(self, name=DEFAULT_ROOM):
+        """Return the history for a room, creating it on first use"""
+        with self.lock:
+            if name not in self.rooms:
+                self.rooms[name] = RoomHistory(name, **self.room_options)
+            return self.rooms[name]
+
+    def append(self, text, room=DEFAULT_ROOM):
+        return self.room(room).append(text)
+
+    def since(self, last_seq, room=DEFAULT_ROOM, limit=None):
+        return self.room(room).since(last_seq, limit)
+
+    def close(self):
+        with self.lock:
+            for history in self.rooms.values():
+                history.close()
@@ -0,0 +1,94 @@
+"""
+Chat Outbound Queues
+COSC 450 Final Project - Kaustubh Rai
+
+Every client gets an outbox. The server puts messages into it while
+holding its clients lock, which keeps every client's order the same as
+the history. A client that keeps up costs no more than before: when
+nothing is queued, the message is sent right away with MSG_DONTWAIT.
+Whatever did not fit is queued for the outbox's writer thread, which does
+the blocking send outside the lock. TLS sockets take no flags, and
+switching one to non-blocking would race with its reader thread, so
+their messages always go through the writer. A client that stops reading
+only fills its own queue and never stalls a broadcast to everyone else.
+When its backlog passes max_bytes, put() refuses and the server drops it.
+
+The writer hands everything queued since its last send to one sendall,
+so a burst of broadcasts costs one system call per client.
+"""
+
+import socket
+import ssl
+import threading
+from collections import deque
+
+MAX_BACKLOG = 1024 * 1024
+
+
+class Outbox:
+    """Outbound queue of one client, drained by its own writer thread"""
+
+    def __init__(self, client_socket, on_error, max_bytes=MAX_BACKLOG):
+        self.client_socket = client_socket
+        self.on_error = on_error  # callback(client_socket), from the writer thread
+        self.max_bytes = max_bytes
+        self.pending = deque()
+        self.backlog = 0  # queued bytes plus the batch being sent
+        self.closed = False
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)  # wakes the writer
+        # A send on a TLS socket can block whatever poll() says
+        self.direct = not isinstance(client_socket, ssl.SSLSocket)
+        self.thread = threading.Thread(target=self._run, name='chat-writer', daemon=True)
+        self.thread.start()
+
+    def put(self, data):
+        """Queue bytes; returns False if the client is too far behind or gone"""
+        with self.lock:
+            # An idle client always takes one message, however large (e.g.
+            # the welcome batch with a long replay)
+            if self.closed or (self.backlog and self.backlog + len(data) > self.max_bytes):
+                return False
+            if self.direct and not self.backlog:
+                try:
+                    sent = self.client_socket.send(data, socket.MSG_DONTWAIT)
+                    if sent == len(data):
+                        return True
+                    data = data[sent:]
+                except BlockingIOError:
+                    pass
+                except OSError:
+                    self.closed = True
+                    self.condition.notify()
+                    return False
+            self.pending.append(data)
+            self.backlog += len(data)
+            self.condition.notify()
+        return True
+
+    def close(self):
+        """Stop the writer; anything still queued is dropped"""
+        with self.condition:
+            self.closed = True
+            self.pending.clear()
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                batch = b''.join(self.pending)
+                self.pending.clear()
+            try:
+                self.client_socket.sendall(batch)
+            except OSError:
+                with self.condition:
+                    self.closed = True
+                    self.pending.clear()
+                self.on_error(self.client_socket)
+                return
+            with self.condition:
+                self.backlog -= len(batch)
@@ -0,0 +1,154 @@
+"""
+Chat Presence
+COSC 450 Final Project - Kaustubh Rai
+
+Username directory for the chat server and batching of join/leave
+notifications. The directory is not locked on its own; the server only
+touches it while holding its clients lock, which also orders sends.
+"""
+
+import hmac
+import secrets
+import threading
+
+
+class PresenceDirectory:
+    """Two-way index between usernames and client connections"""
+
+    def __init__(self):
+        self.connections = {}  # {socket: username}
+        self.users = {}        # {casefolded username: socket}
+        self.tokens = {}       # {socket: resume token of that session}
+
+    def __len__(self):
+        return len(self.connections)
+
+    def __contains__(self, client_socket):
+        return client_socket in self.connections
+
+    @staticmethod
+    def key(username):
+        return username.casefold()
+
+    def add(self, client_socket, username):
+        """Register a connection; returns False if the name is taken"""
+        key = self.key(username)
+        if key in self.users:
+            return False
+        self.users[key] = client_socket
+        self.connections[client_socket] = username
+        self.tokens[client_socket] = secrets.token_hex(16)
+        return True
+
+    def replace(self, client_socket, username, token):
+        """Take over a name from its owner, given that session's resume token
+
+        Returns the evicted connection, or None (and changes nothing) if the
+        name is free or the token does not match.
+        """
+        old_socket = self.users.get(self.key(username))
+        if old_socket is None or not token or not hmac.compare_digest(
+                token.encode(), self.tokens[old_socket].encode()):
+            return None
+        del self.connections[old_socket]
+        del self.tokens[old_socket]
+        self.users[self.key(username)] = client_socket
+        self.connections[client_socket] = username
+        self.tokens[client_socket] = secrets.token_hex(16)
+        return old_socket
+
+    def remove(self, client_socket):
+        """Unregister a connection and return its username (or None)"""
+        self.tokens.pop(client_socket, None)
+        username = self.connections.pop(client_socket, None)
+        if username is not None:
+            self.users.pop(self.key(username), None)
+        return username
+
+    def lookup(self, username):
+        """Return the connection for a username, or None if offline"""
+        return self.users.get(self.key(username))
+
+    def username(self, client_socket):
+        return self.connections.get(client_socket)
+
+    def token(self, client_socket):
+        return self.tokens.get(client_socket)
+
+    def sockets(self):
+        return list(self.connections)
+
+    def usernames(self):
+        return sorted(self.connections.values(), key=str.casefold)
+
+
+class PresenceBatcher:
+    """Coalesce join/leave events into at most one notice per interval"""
+
+    def __init__(self, emit, interval=1.0, max_names=5):
+        self.emit = emit  # callback(message)
+        self.interval = interval
+        self.max_names = max_names
+        self.joined = []
+        self.left = []
+        self.timer = None
+        self.lock = threading.Lock()
+
+    def joined_event(self, username):
+        self._add(username, self.joined, self.left)
+
+    def left_event(self, username):
+        self._add(username, self.left, self.joined)
+
+    def _add(self, username, events, opposite):
+        with self.lock:
+            # A join and a leave inside one window cancel out
+            if username in opposite:
+                opposite.remove(username)
+            else:
+                events.append(username)
+
+            if self.interval <= 0:
+                pending = self._take()
+            else:
+                pending = []
+                if self.timer is None:
+                    self.timer = threading.Timer(self.interval, self.flush)
+                    self.timer.daemon = True
+                    self.timer.start()
+
+        for message in pending:
+            self.emit(message)
+
+    def _take(self):
+        """Build notices for pending events and reset (lock held)"""
+        messages = []
+        if self.joined:
+            messages.append(self.describe(self.joined, 'joined'))
+        if self.left:
+            messages.append(self.describe(self.left, 'left'))
+        self.joined = []
+        self.left = []
+        self.timer = None
+        return messages
+
+    def flush(self):
+        """Send all pending notices now"""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+            messages = self._take()
+        for message in messages:
+            self.emit(message)
+
+    def describe(self, names, action):
+        if len(names) == 1:
+            return f"*** {names[0]} has {action} the chat ***"
+
+        shown = names[:self.max_names]
+        others = len(names) - len(shown)
+        if others:
+            who = f"{', '.join(shown)} and {others} others"
+        else:
+            who = f"{', '.join(shown[:-1])} and {shown[-1]}"
+        return f"*** {who} have {action} the chat ***"
@@ -0,0 +1,153 @@
+"""
+Chat Protocol - Shared Utilities
+COSC 450 Final Project
+
+Every message on the wire is a UTF-8 line terminated by '\\n'.
+
+Client -> server:
+    first line   "<username>" or
+                 "<username> resume=<last_seq> epoch=<epoch> token=<token>"
+    other lines  chat text
+    "/ping"      heartbeat, answered with "/pong"
+
+Server -> client:
+    "/welcome epoch=<epoch> seq=<last_seq> token=<token>"
+                     first line after the hello; the epoch changes when the
+                     server restarts without its history, so sequence
+                     numbers from an older epoch mean nothing. Only a hello
+                     with the session's token may take over its name.
+    "#<seq> <text>"  sequenced room message (kept in the history)
+    "<text>"         unsequenced line (welcome text, notices)
+
+Latency probes (bots, load tests) send "LT <monotonic ns>" as their text;
+receivers on the same host can then compute the broadcast latency.
+
+Lines are limited to MAX_LINE_BYTES; a peer that sends a longer one (or
+never sends a newline) is disconnected.
+"""
+
+import time
+
+ENCODING = 'utf-8'
+BUFFER_SIZE = 4096
+MAX_LINE_BYTES = 64 * 1024
+
+SEQ_PREFIX = '#'
+RESUME_TOKEN = 'resume='
+EPOCH_TOKEN = 'epoch='
+SESSION_TOKEN = 'token='
+WELCOME = '/welcome'
+
+# Application-level heartbeat; clients send it when they have been quiet
+HEARTBEAT = '/ping'
+HEARTBEAT_REPLY = '/pong'
+
+STAMP_PREFIX = 'LT '
+
+
+def encode_line(text):
+    """Encode a single unsequenced line"""
+    return (text + '\n').encode(ENCODING)
+
+
+def encode_seq_line(seq, text):
+    """Encode a sequenced room message"""
+    return f"{SEQ_PREFIX}{seq} {text}\n".encode(ENCODING)
+
+
+def parse_seq_line(line):
+    """Split a received line into (seq, text); seq is None if unsequenced"""
+    if line.startswith(SEQ_PREFIX):
+        head, _, text = line.partition(' ')
+        if head[1:].isdigit():
+            return int(head[1:]), text
+    return None, line
+
+
+def make_stamp():
+    """Message text carrying the current send time"""
+    return f"{STAMP_PREFIX}{time.monotonic_ns()}"
+
+
+def parse_stamp(text):
+    """Return the send time (ns) of a stamped broadcast, or None"""
+    _, sep, value = text.rpartition(': ' + STAMP_PREFIX)
+    if sep and value.isdigit():
+        return int(value)
+    return None
+
+
+def make_hello(username, last_seq=None, epoch=None, token=None):
+    """Build the first line a client sends after connecting"""
+    if last_seq is None and token is None:
+        return encode_line(username)
+    # A session that has not seen a sequenced message yet resumes from 0
+    line = f"{username} {RESUME_TOKEN}{last_seq or 0}"
+    if epoch is not None:
+        line += f" {EPOCH_TOKEN}{epoch}"
+    if token is not None:
+        line += f" {SESSION_TOKEN}{token}"
+    return encode_line(line)
+
+
+def parse_hello(line):
+    """Parse a hello line into (username, last_seq, epoch, token)"""
+    line = line.strip()
+    name, fields = line, {}
+    for prefix in (SESSION_TOKEN, EPOCH_TOKEN):
+        head, _, field = name.rpartition(' ')
+        if head and field.startswith(prefix):
+            name, fields[prefix] = head, field[len(prefix):]
+    head, _, field = name.rpartition(' ')
+    if head and field.startswith(RESUME_TOKEN):
+        value = field[len(RESUME_TOKEN):]
+        if value.isdigit():
+            return (head.strip(), int(value), fields.get(EPOCH_TOKEN),
+                    fields.get(SESSION_TOKEN))
+    return line, None, None, None
+
+
+def make_welcome(epoch, last_seq, token):
+    """Build the line telling a client its history epoch and resume token"""
+    return encode_line(f"{WELCOME} {EPOCH_TOKEN}{epoch} seq={last_seq} {SESSION_TOKEN}{token}")
+
+
+def parse_welcome(line):
+    """Return (epoch, last_seq, token) from a welcome line, or None"""
+    command, _, rest = line.partition(' ')
+    if command != WELCOME:
+        return None
+    fields = dict(field.partition('=')[::2] for field in rest.split())
+    if 'epoch' not in fields or not fields.get('seq', '').isdigit():
+        return None
+    return fields['epoch'], int(fields['seq']), fields.get('token')
+
+
+class LineBuffer:
+    """Reassemble newline-terminated lines from a TCP byte stream"""
+
+    def __init__(self, max_line=MAX_LINE_BYTES):
+        self._buffer = bytearray()
+        self.max_line = max_line
+
+    def feed(self, data):
+        """Add received bytes and return the list of complete lines
+
+        Raises ValueError if a line grows past max_line bytes; the stream
+        cannot be resynchronised, so the caller should drop the connection.
+        """
+        self._buffer += data
+        if b'\n' not in data:
+            self._check(len(self._buffer))
+            return []
+
+        *lines, rest = self._buffer.split(b'\n')
+        self._check(max(len(rest), *map(len, lines)))
+        self._buffer = bytearray(rest)
+        return [line.decode(ENCODING, errors='replace').rstrip('\r')
+                for line in lines]
+
+    def _check(self, length):
+        if length > self.max_line:
+            self._buffer.clear()
+            raise ValueError(f'line longer than {self.max_line} bytes')
@@ -0,0 +1,85 @@
+"""
+Chat TLS - Shared Utilities
+COSC 450 Final Project
+
+SSLContext objects are expensive to build (certificate loading, cipher
+setup) and session tickets can only be resumed against the context that
+issued them, so contexts are created once per configuration and shared.
+"""
+
+import ssl
+import threading
+
+# Cipher list used for TLS 1.2. TLS 1.3 always negotiates one of its
+# built-in AEAD suites (AES-GCM or ChaCha20-Poly1305), which Python's ssl
+# module does not let us reorder.
+CIPHER_PROFILES = {
+    'default': None,
+    'aesgcm': 'ECDHE+AESGCM',             # fastest with AES-NI
+    'chacha20': 'ECDHE+CHACHA20:ECDHE+AESGCM',  # fastest without AES-NI
+}
+
+_contexts = {}
+_contexts_lock = threading.Lock()
+
+# {(host, port): ssl.SSLSession} for cheap reconnects
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _apply_profile(context, profile):
+    if profile not in CIPHER_PROFILES:
+        raise ValueError(f"Unknown cipher profile: {profile}")
+    ciphers = CIPHER_PROFILES[profile]
+    if ciphers:
+        context.set_ciphers(ciphers)
+
+
+def server_context(certfile, keyfile, profile='default'):
+    """Return the shared server SSLContext for this certificate and profile"""
+    key = ('server', certfile, keyfile, profile)
+    with _contexts_lock:
+        context = _contexts.get(key)
+        if context is None:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            context.options |= ssl.OP_CIPHER_SERVER_PREFERENCE
+            _apply_profile(context, profile)
+            # Issue tickets so reconnecting clients can skip the full handshake
+            context.num_tickets = 2
+            _contexts[key] = context
+        return context
+
+
+def client_context(profile='default', cafile=None):
+    """Return the shared client SSLContext"""
+    key = ('client', cafile, profile)
+    with _contexts_lock:
+        context = _contexts.get(key)
+        if context is None:
+            context = ssl.create_default_context(cafile=cafile)
+            if cafile is None:
+                # For this project, we do not verify the certificate
+                # (in real world, you MUST verify certificates)
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            _apply_profile(context, profile)
+            _contexts[key] = context
+        return context
+
+
+def get_session(host, port):
+    """Return a cached TLS session for this server, if any"""
+    with _sessions_lock:
+        return _sessions.get((host, port))
+
+
+def save_session(host, port, tls_socket):
+    """Remember the session of a live connection for later resumption"""
+    try:
+        session = tls_socket.session
+    except (AttributeError, ValueError):
+        return
+    if session is not None:
+        with _sessions_lock:
+            _sessions[(host, port)] = session
@@ -7,26 +7,89 @@ COSC 450 Final Project - Longyu Tang
 import socket
 import os
 import sys
-from tqdm import tqdm
+import json
+import queue
+import threading
+import time
 
-# Add shared module to path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
-from shared.protocol import (
-    FileTransferProtocol, BUFFER_SIZE,
-    MSG_FILE_HEADER, MSG_FILE_CHUNK, MSG_FILE_COMPLETE
-)
+# Installed as the filetransfer package, or run as a script from a checkout
+if __package__:
+    from ..shared.protocol import (
+        FileTransferProtocol, BUFFER_SIZE,
+        MSG_FILE_HEADER, MSG_FILE_CHUNK, MSG_FILE_COMPLETE, MSG_HEARTBEAT,
+        MSG_LIST_REQUEST, MSG_LIST_RESPONSE, MSG_DOWNLOAD_REQUEST, MSG_DOWNLOAD_DATA,
+        HASH_SHA256, HASH_TREE
+    )
+    from ..shared.mapped_file import MappedFile
+    from ..shared.progress import PROGRESS_MODES, Progress, ProgressGroup, ProgressTicker
+    from ..shared.ratelimit import TokenBucket
+    from ..shared.sockopts import SocketTuning, add_socket_arguments
+    from ..shared.treehash import TREE_BLOCK_SIZE, hash_file
+    from ..shared import tracing
+else:
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+    from shared.protocol import (
+        FileTransferProtocol, BUFFER_SIZE,
+        MSG_FILE_HEADER, MSG_FILE_CHUNK, MSG_FILE_COMPLETE, MSG_HEARTBEAT,
+        MSG_LIST_REQUEST, MSG_LIST_RESPONSE, MSG_DOWNLOAD_REQUEST, MSG_DOWNLOAD_DATA,
+        HASH_SHA256, HASH_TREE
+    )
+    from shared.mapped_file import MappedFile
+    from shared.progress import PROGRESS_MODES, Progress, ProgressGroup, ProgressTicker
+    from shared.ratelimit import TokenBucket
+    from shared.sockopts import SocketTuning, add_socket_arguments
+    from shared.treehash import TREE_BLOCK_SIZE, hash_file
+    from shared import tracing
+
+KB = 1024
+
+DOWNLOAD_BUFFER_SIZE = 256 * 1024
+
+# Parallel uploads: connections, extra attempts per file, pause before a retry
+DEFAULT_PARALLEL = 4
+DEFAULT_RETRIES = 2
+RETRY_DELAY = 1.0
 
 
 class FileTransferClient:
-    def __init__(self, server_host, server_port):
+    def __init__(self, server_host, server_port, heartbeat_interval=10.0, rate=0,
+                 hash_mode=HASH_SHA256, hash_workers=4, progress='bar',
+                 socket_profile='bulk', link_mbps=0, rtt_ms=0):
         self.server_host = server_host
         self.server_port = server_port
         self.socket = None
 
+        # Heartbeats keep the server from reaping us while we are busy
+        # with something other than sending (e.g. hashing a large file)
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_stop = threading.Event()
+        self.send_lock = threading.Lock()
+        self.last_send = time.monotonic()
+
+        # Optional cap on our own transfer rate (bytes/s, 0 = unlimited),
+        # to leave room for other traffic on the same link
+        self.limiter = TokenBucket(rate)
+
+        # Tree mode hashes blocks of the file on several cores; the
+        # server checks the root of the block hash tree
+        self.hash_mode = hash_mode
+        self.hash_workers = hash_workers
+
+        # The send loop only counts bytes; this reports them ('bar',
+        # 'json' events on stderr, or 'none')
+        self.progress = ProgressTicker(progress)
+        # Set by upload_parallel: every worker's uploads also count here
+        self.progress_group = None
+
+        # Socket buffers sized to the link's bandwidth-delay product when
+        # it is given; bulk corks uploads into full segments
+        self.tuning = SocketTuning(socket_profile, link_mbps, rtt_ms)
+
     def connect(self):
         """Connect to the file transfer server"""
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.tuning.apply(self.socket)
             self.socket.connect((self.server_host, self.server_port))
             print(f"[+] Connected to {self.server_host}:{self.server_port}")
             return True
@@ -34,12 +97,38 @@ class FileTransferClient:
             print(f"[!] Connection failed: {e}")
             return False
 
+    def send_message(self, msg_type, data, metadata=None):
+        """Send a protocol message; serialized with the heartbeat thread"""
+        with self.send_lock:
+            FileTransferProtocol.send_message(self.socket, msg_type, data, metadata)
+            self.last_send = time.monotonic()
+
+    def send_heartbeats(self):
+        """Send a heartbeat whenever nothing else was sent for an interval"""
+        while not self.heartbeat_stop.is_set():
+            idle = time.monotonic() - self.last_send
+            if idle < self.heartbeat_interval:
+                self.heartbeat_stop.wait(self.heartbeat_interval - idle)
+                continue
+            try:
+                self.send_message(MSG_HEARTBEAT, b'')
+            except OSError:
+                return
+
+    @tracing.traced('send_file')
     def send_file(self, file_path):
         """Send a file to the server"""
         if not os.path.exists(file_path):
             print(f"[!] File not found: {file_path}")
             return False
 
+        heartbeat_thread = None
+        if self.heartbeat_interval:
+            self.heartbeat_stop.clear()
+            self.last_send = time.monotonic()
+            heartbeat_thread = threading.Thread(target=self.send_heartbeats, daemon=True)
+            heartbeat_thread.start()
+
         try:
             # Get file info
             file_name = os.path.basename(file_path)
@@ -47,44 +136,57 @@ class FileTransferClient:
 
             print(f"[+] Preparing to send: {file_name} ({file_size} bytes)")
 
-            # Read file and calculate checksum
-            with open(file_path, 'rb') as f:
-                file_data = f.read()
-
-            checksum = FileTransferProtocol.calculate_checksum(file_data)
-            print(f"[+] Checksum: {checksum}")
-
-            # Send file header
-            metadata = {
-                'filename': file_name,
-                'filesize': file_size,
-                'checksum': checksum
-            }
-            FileTransferProtocol.send_message(
-                self.socket, MSG_FILE_HEADER, b'', metadata
-            )
+            # Hash and send straight from a read-only mapping of the file.
+            # Header, chunks and completion are corked into full segments;
+            # leaving the block uncorks before we wait for the answer.
+            with self.tuning.corked(self.socket), MappedFile(file_path) as source:
+                metadata = {
+                    'filename': file_name,
+                    'filesize': file_size,
+                }
+                if self.hash_mode == HASH_TREE:
+                    with tracing.span('tree_hash'):
+                        checksum, _ = hash_file(file_path, TREE_BLOCK_SIZE, self.hash_workers)
+                    metadata.update(hash_mode=HASH_TREE, block_size=TREE_BLOCK_SIZE)
+                else:
+                    with tracing.span('sha256'):
+                        checksum = source.sha256()
+                metadata['checksum'] = checksum
+                print(f"[+] Checksum ({self.hash_mode}): {checksum}")
 
-            # Send file in chunks with progress bar
-            chunks_sent = 0
-            with tqdm(total=file_size, unit='B', unit_scale=True, desc=file_name) as pbar:
-                for i in range(0, len(file_data), BUFFER_SIZE):
-                    chunk = file_data[i:i + BUFFER_SIZE]
-                    FileTransferProtocol.send_message(
-                        self.socket, MSG_FILE_CHUNK, chunk
-                    )
-                    chunks_sent += 1
-                    pbar.update(len(chunk))
-
-            print(f"[+] Sent {chunks_sent} chunks")
-
-            # Send completion message
-            FileTransferProtocol.send_message(
-                self.socket, MSG_FILE_COMPLETE, b'',
-                {'checksum': checksum}
-            )
+                # Send file header
+                self.send_message(MSG_FILE_HEADER, b'', metadata)
+
+                # Send file in chunks
+                chunks_sent = 0
+                progress = Progress(file_size, file_name)
+                self.progress.add(progress)
+                if self.progress_group is not None:
+                    self.progress_group.track(progress)
+                with self.progress:
+                    try:
+                        for chunk in source.chunks(BUFFER_SIZE):
+                            if self.limiter.rate:
+                                with tracing.span('rate_limit'):
+                                    self.limiter.consume(len(chunk))
+                            self.send_message(MSG_FILE_CHUNK, chunk)
+                            chunks_sent += 1
+                            progress.add(len(chunk))
+                        chunk = None  # drop the last view so the mapping can close
+                    finally:
+                        self.progress.remove(progress)
+
+                print(f"[+] Sent {chunks_sent} chunks")
+
+                # Send completion message
+                self.send_message(MSG_FILE_COMPLETE, b'', {'checksum': checksum})
+
+            # The server answers once it has verified the file
+            self.heartbeat_stop.set()
 
             # Receive server response
-            msg_type, metadata, payload = FileTransferProtocol.receive_message(self.socket)
+            with tracing.span('await_response'):
+                msg_type, metadata, payload = FileTransferProtocol.receive_message(self.socket)
 
             if payload == b'SUCCESS':
                 print(f"[+] File transferred successfully!")
@@ -97,6 +199,86 @@ class FileTransferClient:
         except Exception as e:
             print(f"[!] Error sending file: {e}")
             return False
+        finally:
+            self.heartbeat_stop.set()
+            if heartbeat_thread:
+                heartbeat_thread.join()
+
+    def list_files(self, cursor=None, limit=100):
+        """Fetch one page of the server's files.
+
+        Returns (entries, next_cursor, total); next_cursor is None on the
+        last page.
+        """
+        self.send_message(MSG_LIST_REQUEST, b'', {'cursor': cursor, 'limit': limit})
+        msg_type, metadata, payload = FileTransferProtocol.receive_message(self.socket)
+        if msg_type != MSG_LIST_RESPONSE:
+            raise ConnectionError(payload.decode() if payload else 'No response')
+        return json.loads(payload), metadata.get('next_cursor'), metadata.get('total')
+
+    def iter_files(self, page_size=100):
+        """Yield every file on the server, one page at a time"""
+        cursor = None
+        while True:
+            entries, cursor, _ = self.list_files(cursor, page_size)
+            yield from entries
+            if cursor is None:
+                return
+
+    def download_file(self, file_name, dest_path=None, offset=0, length=None):
+        """Download a stored file (or a byte range of it) to dest_path"""
+        dest_path = dest_path or file_name
+        try:
+            self.send_message(
+                MSG_DOWNLOAD_REQUEST, b'',
+                {'filename': file_name, 'offset': offset, 'length': length}
+            )
+
+            header = FileTransferProtocol.receive_header(self.socket)
+            if header is None:
+                print("[!] Connection closed by server")
+                return False
+            if header['msg_type'] != MSG_DOWNLOAD_DATA:
+                message = FileTransferProtocol.receive_exactly(
+                    self.socket, header['payload_size'])
+                if message is None:
+                    print("[!] Connection closed by server")
+                    return False
+                print(f"[!] Download failed: {message.decode()}")
+                return False
+
+            info = header['metadata']
+            remaining = header['payload_size']
+            print(f"[+] Downloading {file_name}: bytes {info['offset']}-"
+                  f"{info['offset'] + info['length']} of {info['size']}")
+
+            # Write ranges in place so partial downloads can be resumed
+            mode = 'r+b' if info['offset'] and os.path.exists(dest_path) else 'wb'
+            buffer = bytearray(DOWNLOAD_BUFFER_SIZE)
+            view = memoryview(buffer)
+            progress = Progress(remaining, file_name)
+            self.progress.add(progress)
+            with open(dest_path, mode) as f, self.progress:
+                try:
+                    f.seek(info['offset'])
+                    while remaining > 0:
+                        n = self.socket.recv_into(view, min(remaining, len(buffer)))
+                        if not n:
+                            print("[!] Connection closed mid-download")
+                            return False
+                        f.write(view[:n])
+                        remaining -= n
+                        progress.add(n)
+                        self.limiter.consume(n)
+                finally:
+                    self.progress.remove(progress)
+
+            print(f"[+] Saved to {dest_path}")
+            return True
+
+        except Exception as e:
+            print(f"[!] Error downloading file: {e}")
+            return False
 
     def disconnect(self):
         """Disconnect from server"""
@@ -105,18 +287,225 @@ class FileTransferClient:
             print("[+] Disconnected")
 
 
-if __name__ == '__main__':
+def collect_files(manifest=None, directory=None):
+    """The files to upload: listed in a manifest, or the files in a directory.
+
+    A manifest has one path per line (blank lines and # comments are
+    skipped); relative paths are taken from the manifest's directory. Only
+    the top level of a directory is read, since the server stores uploads
+    by file name.
+    """
+    if manifest:
+        base = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest, encoding='utf-8') as f:
+            lines = [line.strip() for line in f]
+        return [os.path.join(base, line) for line in lines
+                if line and not line.startswith('#')]
+    entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+    return [entry.path for entry in entries if entry.is_file()]
+
+
+def upload_parallel(make_client, paths, workers=DEFAULT_PARALLEL, retries=DEFAULT_RETRIES,
+                    progress='bar'):
+    """Upload files over a pool of connections; returns a summary dict.
+
+    make_client() builds an unconnected client for each file, so this works
+    for the plain and the SSL client alike. Files are handed out largest
+    first, so the big ones do not start last and leave one connection
+    running alone at the end. A failed upload is retried on a fresh
+    connection up to `retries` more times, ahead of smaller files. The
+    workers share one rate limiter, so a rate caps the total.
+    """
+    if workers < 1:
+        raise ValueError(f"Need at least one connection, not {workers}")
+    if retries < 0:
+        raise ValueError(f"Retries cannot be negative: {retries}")
+    sizes = {}
+    failed = []
+    for path in paths:
+        if os.path.isfile(path):
+            sizes[path] = os.path.getsize(path)
+        else:
+            print(f"[!] File not found: {path}")
+            failed.append(path)
+
+    # (-size, path, attempt): largest first, retries back in size order
+    pending = queue.PriorityQueue()
+    for path, size in sizes.items():
+        pending.put((-size, path, 0))
+
+    group = ProgressGroup(sum(sizes.values()), f"{len(sizes)} files")
+    ticker = ProgressTicker(progress)
+    lock = threading.Lock()
+    sent = []
+    limiter = None
+
+    def worker():
+        nonlocal limiter
+        while True:
+            try:
+                size, path, attempt = pending.get_nowait()
+            except queue.Empty:
+                break
+            # The server closes the connection after every upload, so each
+            # file gets a connection of its own
+            client = make_client()
+            client.progress_group = group
+            with lock:
+                limiter = limiter or client.limiter
+            client.limiter = limiter
+            ok = client.connect() and client.send_file(path)
+            client.disconnect()
+            group.settle(ok)
+            if ok:
+                with lock:
+                    sent.append(path)
+            elif attempt < retries:
+                print(f"[!] Retrying {os.path.basename(path)} "
+                      f"(attempt {attempt + 2} of {retries + 1})")
+                time.sleep(RETRY_DELAY)
+                pending.put((size, path, attempt + 1))
+            else:
+                with lock:
+                    failed.append(path)
+
+    started = time.monotonic()
+    ticker.add(group)
+    with ticker:
+        threads = [threading.Thread(target=worker, name=f'upload-{i}')
+                   for i in range(min(workers, len(sizes)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        ticker.remove(group)
+    elapsed = time.monotonic() - started
+
+    sent_bytes = sum(sizes[path] for path in sent)
+    return {
+        'files': len(sent),
+        'failed': failed,
+        'bytes': sent_bytes,
+        'elapsed_s': elapsed,
+        'throughput_mbps': sent_bytes * 8 / elapsed / 1e6 if elapsed > 0 else 0.0,
+        'workers': workers,
+    }
+
+
+def run_parallel(make_client, args):
+    """Upload --manifest or --dir with --parallel connections; returns success"""
+    paths = collect_files(args.manifest, args.dir)
+    summary = upload_parallel(make_client, paths, args.parallel, args.retries, args.progress)
+    print(f"[+] Uploaded {summary['files']} files ({summary['bytes']} bytes) in "
+          f"{summary['elapsed_s']:.2f}s over {args.parallel} connections: "
+          f"{summary['throughput_mbps']:.2f} Mbps")
+    for path in summary['failed']:
+        print(f"[!] Failed: {path}")
+    return not summary['failed']
+
+
+def count_argument(minimum):
+    """argparse type for an integer of at least minimum"""
+    def parse(value):
+        number = int(value)
+        if number < minimum:
+            raise ValueError(value)
+        return number
+    parse.__name__ = 'positive integer' if minimum == 1 else 'non-negative integer'
+    return parse
+
+
+def add_action_arguments(parser):
+    """Arguments for what the client should do (shared with the SSL client)"""
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--file', help='File to transfer')
+    action.add_argument('--list', action='store_true', help='List files on the server')
+    action.add_argument('--download', metavar='NAME', help='Download a stored file')
+    action.add_argument('--manifest', help='Upload the files listed in this file, one per line')
+    action.add_argument('--dir', help='Upload every file in this directory')
+    parser.add_argument('--parallel', type=count_argument(1), default=DEFAULT_PARALLEL,
+                        metavar='N',
+                        help='Connections for --manifest and --dir uploads '
+                             f'(default: {DEFAULT_PARALLEL})')
+    parser.add_argument('--retries', type=count_argument(0), default=DEFAULT_RETRIES,
+                        help='Extra attempts for a failed upload in --manifest and --dir '
+                             f'mode (default: {DEFAULT_RETRIES})')
+    parser.add_argument('--output', help='Where to save a download (default: NAME)')
+    parser.add_argument('--offset', type=int, default=0, help='Download starting at this byte')
+    parser.add_argument('--length', type=int, default=None, help='Download at most this many bytes')
+    parser.add_argument('--rate', type=float, default=0,
+                        help='Limit transfer speed to this many KB/s (default: unlimited)')
+    parser.add_argument('--hash-mode', choices=[HASH_SHA256, HASH_TREE], default=HASH_SHA256,
+                        help='Upload checksum: whole-file SHA-256 or parallel tree hash')
+    parser.add_argument('--hash-workers', type=int, default=4,
+                        help='Threads for tree hashing (default: 4)')
+    parser.add_argument('--progress', choices=PROGRESS_MODES, default='bar',
+                        help='Progress display: bar, json (events on stderr), log or none')
+    parser.add_argument('--no-progress', dest='progress', action='store_const', const='none',
+                        help='Same as --progress none')
+    parser.add_argument('--trace', metavar='FILE', default=None,
+                        help='Time each transfer phase and write a Chrome trace to FILE')
+    add_socket_arguments(parser, 'bulk')
+
+
+def start_trace(args):
+    """Enable tracing for --trace before anything is timed"""
+    if args.trace:
+        tracing.enable('file_client')
+
+
+def finish_trace(args):
+    """Write the --trace file, if tracing"""
+    if args.trace and tracing.export(args.trace):
+        print(f"[+] Trace written to {args.trace}")
+
+
+def run_action(client, args):
+    """Run the requested upload, listing or download; returns success"""
+    if args.list:
+        count = 0
+        for entry in client.iter_files():
+            print(f"{entry['size']:>14}  {entry['name']}")
+            count += 1
+        print(f"[+] {count} files")
+        return True
+    if args.download:
+        return client.download_file(args.download, args.output, args.offset, args.length)
+    return client.send_file(args.file)
+
+
+def main(argv=None):
+    """Console entry point; returns the process exit code"""
     import argparse
 
     parser = argparse.ArgumentParser(description='File Transfer Client')
     parser.add_argument('--host', required=True, help='Server host')
     parser.add_argument('--port', type=int, default=9999, help='Server port')
-    parser.add_argument('--file', required=True, help='File to transfer')
+    add_action_arguments(parser)
+
+    args = parser.parse_args(argv)
 
-    args = parser.parse_args()
+    def make_client(progress=args.progress):
+        return FileTransferClient(args.host, args.port, rate=args.rate * KB,
+                                  hash_mode=args.hash_mode, hash_workers=args.hash_workers,
+                                  progress=progress, socket_profile=args.socket_profile,
+                                  link_mbps=args.link_mbps, rtt_ms=args.rtt_ms)
 
-    client = FileTransferClient(args.host, args.port)
+    start_trace(args)
+    if args.manifest or args.dir:
+        # One combined progress report instead of one per connection
+        ok = run_parallel(lambda: make_client('none'), args)
+        finish_trace(args)
+        return 0 if ok else 1
 
-    if client.connect():
-        client.send_file(args.file)
-        client.disconnect()
+    client = make_client()
+    if not client.connect():
+        return 1
+    ok = run_action(client, args)
+    client.disconnect()
+    finish_trace(args)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
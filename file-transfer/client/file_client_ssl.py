@@ -9,10 +9,18 @@ import ssl
 import os
 import sys
 
-# Ensure original client module can be imported
-sys.path.insert(0, os.path.dirname(__file__))
-
-from file_client import FileTransferClient
+# Installed as the filetransfer package, or run as a script from a checkout
+if __package__:
+    from .file_client import (
+        KB, FileTransferClient, add_action_arguments, finish_trace, run_action, run_parallel,
+        start_trace, tracing
+    )
+else:
+    sys.path.insert(0, os.path.dirname(__file__))
+    from file_client import (
+        KB, FileTransferClient, add_action_arguments, finish_trace, run_action, run_parallel,
+        start_trace, tracing
+    )
 
 
 class FileTransferClientSSL(FileTransferClient):
@@ -24,7 +32,7 @@ class FileTransferClientSSL(FileTransferClient):
         """Connect to the file transfer server using SSL/TLS."""
         try:
             # Create TCP socket
-            raw_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            raw_socket = self.tuning.apply(socket.socket(socket.AF_INET, socket.SOCK_STREAM))
 
             # Create SSL context
             context = ssl.create_default_context()
@@ -39,8 +47,9 @@ class FileTransferClientSSL(FileTransferClient):
                 server_hostname=self.server_host
             )
 
-            # Connect to server
-            self.socket.connect((self.server_host, self.server_port))
+            # Connect to server (the handshake runs as part of connect)
+            with tracing.span('tls_handshake'):
+                self.socket.connect((self.server_host, self.server_port))
             print(f"[+] Connected securely to {self.server_host}:{self.server_port}")
             return True
         except Exception as e:
@@ -48,7 +57,7 @@ class FileTransferClientSSL(FileTransferClient):
             return False
 
 
-def parse_args():
+def parse_args(argv=None):
     import argparse
 
     parser = argparse.ArgumentParser(
@@ -56,16 +65,35 @@ def parse_args():
     )
     parser.add_argument("--host", required=True, help="Server host")
     parser.add_argument("--port", type=int, default=9998, help="Server port")
-    parser.add_argument("--file", required=True, help="File to send")
-    return parser.parse_args()
+    add_action_arguments(parser)
+    return parser.parse_args(argv)
 
 
-if __name__ == "__main__":
-    args = parse_args()
+def main(argv=None):
+    """Console entry point; returns the process exit code"""
+    args = parse_args(argv)
 
-    client = FileTransferClientSSL(args.host, args.port)
+    def make_client(progress=args.progress):
+        return FileTransferClientSSL(args.host, args.port, rate=args.rate * KB,
+                                     hash_mode=args.hash_mode, hash_workers=args.hash_workers,
+                                     progress=progress, socket_profile=args.socket_profile,
+                                     link_mbps=args.link_mbps, rtt_ms=args.rtt_ms)
 
-    if client.connect():
-        client.send_file(args.file)
-        client.disconnect()
+    start_trace(args)
+    if args.manifest or args.dir:
+        # One combined progress report instead of one per connection
+        ok = run_parallel(lambda: make_client('none'), args)
+        finish_trace(args)
+        return 0 if ok else 1
 
+    client = make_client()
+    if not client.connect():
+        return 1
+    ok = run_action(client, args)
+    client.disconnect()
+    finish_trace(args)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
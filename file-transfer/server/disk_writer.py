@@ -0,0 +1,140 @@
+"""
+Upload Disk Writer
+COSC 450 Final Project - Longyu Tang
+
+Streams an upload to disk instead of collecting it in memory. The file is
+preallocated to its announced size with posix_fallocate (fewer extents,
+and a full disk is reported before the transfer instead of halfway
+through), and incoming chunks are gathered into large aligned buffers
+that a background thread writes with pwrite, so the receive loop never
+waits on small writes.
+
+Durability modes:
+    none   - leave flushing to the OS (fastest)
+    fsync  - fsync the file and its directory once the upload is complete
+    dsync  - open with O_DSYNC so every write reaches stable storage
+"""
+
+import errno
+import os
+import queue
+import threading
+
+DURABILITY_MODES = ('none', 'fsync', 'dsync')
+WRITE_BUFFER_SIZE = 1024 * 1024
+WRITE_QUEUE_DEPTH = 4
+
+
+class DiskWriter:
+    """Write-behind writer for one upload"""
+
+    def __init__(self, path, expected_size=None, durability='none',
+                 buffer_size=WRITE_BUFFER_SIZE):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode: {durability}")
+        self.path = path
+        self.durability = durability
+        self.buffer_size = buffer_size
+        self.buffer = bytearray()
+        self.offset = 0    # file offset of the start of self.buffer
+        self.written = 0   # bytes accepted so far
+        self.error = None
+        self.closed = False
+
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+        if durability == 'dsync':
+            flags |= getattr(os, 'O_DSYNC', 0)
+        self.fd = os.open(path, flags, 0o644)
+
+        if expected_size and hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(self.fd, 0, expected_size)
+            except OSError as e:
+                # Some filesystems cannot preallocate; running out of
+                # space is a real error though
+                if e.errno == errno.ENOSPC:
+                    os.close(self.fd)
+                    os.unlink(path)
+                    raise
+
+        self.queue = queue.Queue(maxsize=WRITE_QUEUE_DEPTH)
+        self.thread = threading.Thread(target=self._write_loop, daemon=True)
+        self.thread.start()
+
+    def _write_loop(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            offset, data = item
+            if self.error is not None:
+                continue
+            try:
+                view = memoryview(data)
+                while view:
+                    n = os.pwrite(self.fd, view, offset)
+                    view = view[n:]
+                    offset += n
+            except OSError as e:
+                self.error = e
+
+    def write(self, data):
+        """Buffer a chunk; full buffers are handed to the writer thread"""
+        if self.error is not None:
+            raise self.error
+        self.buffer += data
+        self.written += len(data)
+        if len(self.buffer) >= self.buffer_size:
+            self._submit()
+
+    def _submit(self):
+        # Hand over whole buffer_size blocks so every write starts on an
+        # aligned offset; the remainder stays for the next round
+        size = len(self.buffer) - len(self.buffer) % self.buffer_size or len(self.buffer)
+        self.queue.put((self.offset, self.buffer[:size]))
+        del self.buffer[:size]
+        self.offset += size
+
+    def close(self):
+        """Flush everything, trim preallocation, apply durability"""
+        try:
+            if self.buffer:
+                self._submit()
+            self.queue.put(None)
+            self.thread.join()
+            if self.error is not None:
+                raise self.error
+            os.ftruncate(self.fd, self.written)
+            if self.durability == 'fsync':
+                os.fsync(self.fd)
+        finally:
+            self.closed = True
+            os.close(self.fd)
+
+    def abort(self):
+        """Stop writing and delete the partial file"""
+        if not self.closed:
+            self.closed = True
+            self.queue.put(None)
+            self.thread.join()
+            os.close(self.fd)
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def commit(self, final_path):
+        """Close and move the file to its final name"""
+        self.close()
+        os.replace(self.path, final_path)
+        if self.durability == 'fsync':
+            fsync_dir(os.path.dirname(final_path) or '.')
+
+
+def fsync_dir(path):
+    """Persist a rename by syncing its directory"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -6,39 +6,152 @@ COSC 450 Final Project - Longyu Tang
 
 import socket
 import threading
+import json
+import hashlib
 import os
+import shutil
+import signal
 import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # Add shared module to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
-from shared.protocol import FileTransferProtocol, MSG_FILE_HEADER, MSG_FILE_CHUNK, MSG_FILE_COMPLETE
+sys.path.insert(0, os.path.dirname(__file__))
+from shared.protocol import (
+    FileTransferProtocol, MSG_FILE_HEADER, MSG_FILE_CHUNK, MSG_FILE_COMPLETE,
+    MSG_HEARTBEAT, MSG_LIST_REQUEST, MSG_LIST_RESPONSE, MSG_DOWNLOAD_REQUEST,
+    MSG_DOWNLOAD_DATA, MSG_ERROR, HASH_TREE
+)
+from shared.treehash import (
+    MAX_TREE_BLOCK_SIZE, MIN_TREE_BLOCK_SIZE, TREE_BLOCK_SIZE, TreeHasher, valid_block_size
+)
+from shared.progress import Progress, ProgressTicker
+from shared.sockopts import SocketTuning, add_socket_arguments
+from shared.timer_wheel import TimerWheel
+from shared.profiler import DEFAULT_HZ, ProfilerControl, StackSampler, add_profiler_arguments
+from shared import tracing
+from disk_writer import DURABILITY_MODES, DiskWriter
+from metadata_store import INDEX_DB_NAME, MetadataStore
+from shaping import KB, TrafficShaper
+from storage_index import StorageIndex
+
+MAX_PAGE_SIZE = 1000
+MB = 1024 * 1024
+
+# Uploads stream into <upload id>.part files in this hidden subdirectory
+# until they are verified. Creating and deleting them there leaves the
+# storage directory's mtime alone, so they never trigger an index rescan.
+PARTS_DIR = '.uploads'
+PART_SUFFIX = '.part'
 
 
 class FileTransferServer:
-    def __init__(self, host='0.0.0.0', port=9999, storage_dir='./uploads'):
+    def __init__(self, host='0.0.0.0', port=9999, storage_dir='./uploads',
+                 idle_timeout=60.0, read_timeout=30.0, index_db=None,
+                 conn_rate=0, ip_rate=0, total_rate=0, limits_file=None,
+                 durability='none', progress_interval=2.0, socket_profile='bulk',
+                 link_mbps=0, rtt_ms=0, trace_file=None, profile_file=None,
+                 profile_hz=DEFAULT_HZ, profile_control=None, max_upload_size=16 * 1024 * MB,
+                 min_free_space=256 * MB):
         self.host = host
         self.port = port
         self.storage_dir = storage_dir
         self.server_socket = None
         self.active_transfers = {}
 
+        # A client that vanishes mid-transfer would otherwise block its
+        # thread in recv forever. read_timeout bounds each recv; idle_timeout
+        # reaps connections that send no complete message (data or
+        # heartbeat) for too long, driven by one timer wheel. 0 disables.
+        self.idle_timeout = idle_timeout
+        self.read_timeout = read_timeout
+        self.timers = TimerWheel(tick=0.5)
+
+        # Bandwidth limits (bytes/s, 0 = unlimited). With a limits file,
+        # SIGHUP re-reads it so limits change without a restart.
+        self.shaper = TrafficShaper(conn_rate, ip_rate, total_rate)
+        self.limits_file = limits_file
+        if limits_file:
+            self.shaper.load(limits_file)
+
+        # One thread logs the progress of every active upload, instead of
+        # a print per received chunk. 0 disables.
+        self.progress = ProgressTicker('log', progress_interval)
+
+        # Applied to the listening socket (so buffer sizes shape the window
+        # scale) and again to each accepted one
+        self.tuning = SocketTuning(socket_profile, link_mbps, rtt_ms)
+
+        # Uploads stream to disk; durability picks none / fsync / dsync
+        self.durability = durability
+
+        # The announced size is preallocated, so it is checked against a
+        # maximum and against free space (minus a reserve) first. 0 = no cap.
+        self.max_upload_size = max_upload_size
+        self.min_free_space = min_free_space
+
+        # Per-phase timings of every connection, written on shutdown
+        self.trace_file = trace_file
+        if trace_file:
+            tracing.enable('file_server')
+
+        # Stack sampling: from startup with a profile file, or started and
+        # dumped at runtime through the control socket
+        self.profiler = StackSampler(profile_hz)
+        self.profile_file = profile_file
+        self.profiler_control = (ProfilerControl(self.profiler, profile_control)
+                                 if profile_control else None)
+
+        # Picking a stored name and renaming the upload to it happen
+        # together, so two uploads finishing at once never share a name
+        self.commit_lock = threading.Lock()
+
+        # Tree-hash uploads hash their blocks here while data still arrives
+        self.hash_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 2)
+
         # Create storage directory
-        os.makedirs(self.storage_dir, exist_ok=True)
+        self.parts_dir = os.path.join(self.storage_dir, PARTS_DIR)
+        os.makedirs(self.parts_dir, exist_ok=True)
+        self.removed_parts = self.sweep_partial_uploads()
+
+        # Size, mtime, checksum and upload ID of every stored file persist
+        # across restarts; startup only hashes files that changed since
+        self.store = MetadataStore(index_db or os.path.join(self.storage_dir, INDEX_DB_NAME))
+
+        # Listing and downloads are served from this index, not listdir
+        self.index = StorageIndex(self.storage_dir, store=self.store)
 
     def start(self):
         """Start the file transfer server"""
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.tuning.apply(self.server_socket)
         self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen(5)
+        self.server_socket.listen(socket.SOMAXCONN)
 
         print(f"[+] File Transfer Server started on {self.host}:{self.port}")
-        print(f"[+] Storage directory: {self.storage_dir}")
+        print(f"[+] Storage directory: {self.storage_dir} (durability: {self.durability})")
+        if self.removed_parts:
+            print(f"[+] Removed {self.removed_parts} unfinished uploads left from a previous run")
+        print(f"[+] Socket profile: {self.tuning.describe()}")
+        sync = self.index.last_sync
+        print(f"[+] Indexed {sync['files']} files ({sync['new']} new, "
+              f"{sync['changed']} changed, {sync['removed']} removed) "
+              f"in {sync['seconds']:.2f}s")
+        self.start_shaping()
+        self.start_tracing()
+        self.start_profiling()
+        self.write_on_sigterm()
+
+        self.timers.start()
+        self.progress.start()
 
         try:
             while True:
                 client_socket, client_address = self.server_socket.accept()
+                self.tuning.apply(client_socket)
                 print(f"[+] New connection from {client_address}")
 
                 # Handle client in separate thread
@@ -51,17 +164,98 @@ class FileTransferServer:
         except KeyboardInterrupt:
             print("\n[!] Server shutting down...")
         finally:
-            self.server_socket.close()
+            self.shutdown()
+
+    def shutdown(self):
+        """Release the listening socket and background workers"""
+        self.server_socket.close()
+        self.timers.stop()
+        self.progress.stop()
+        self.hash_pool.shutdown(wait=False)
+        self.store.close()
+        if self.trace_file and tracing.export(self.trace_file):
+            print(f"[+] Trace written to {self.trace_file}")
+        self.stop_profiling()
+
+    def start_shaping(self):
+        """Report the limits and reload them on SIGHUP (main thread only)"""
+        print(f"[+] Bandwidth limits: {self.shaper.describe()}")
+        if self.limits_file and hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, lambda signum, frame: self.reload_limits())
+
+    def start_tracing(self):
+        if self.trace_file:
+            print(f"[+] Tracing transfer phases into {self.trace_file}")
+
+    def write_on_sigterm(self):
+        """Shut down cleanly on SIGTERM too, so trace and profile files get written"""
+        if not (self.trace_file or self.profile_file):
+            return
+
+        def terminate(signum, frame):
+            raise KeyboardInterrupt
+
+        signal.signal(signal.SIGTERM, terminate)
+
+    def start_profiling(self):
+        """Start the profiler and/or its control socket, as configured"""
+        if self.profile_file:
+            self.profiler.start()
+            print(f"[+] Profiling at {self.profiler.hz:g} Hz into {self.profile_file}")
+        if self.profiler_control:
+            self.profiler_control.start()
+            print(f"[+] Profiler control socket: {self.profiler_control.path}")
+
+    def stop_profiling(self):
+        """Stop profiling; the profile file gets what was collected"""
+        if self.profiler_control:
+            self.profiler_control.stop()
+        self.profiler.stop()
+        if self.profile_file:
+            self.profiler.dump(self.profile_file)
+            status = self.profiler.status()
+            print(f"[+] Profile written to {self.profile_file} ({status['samples']} samples, "
+                  f"{status['overhead_percent']:.2f}% CPU overhead)")
+
+    def reload_limits(self):
+        """Re-read the limits file (on SIGHUP)"""
+        try:
+            self.shaper.load(self.limits_file)
+            print(f"[+] Bandwidth limits reloaded: {self.shaper.describe()}")
+        except (OSError, ValueError) as e:
+            print(f"[!] Could not reload limits from {self.limits_file}: {e}")
+
+    def reap(self, client_socket, client_address):
+        """Drop a connection that went quiet; its thread then cleans up"""
+        print(f"[-] Reaping idle connection {client_address}")
+        try:
+            client_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
 
+    @tracing.traced('handle_client')
     def handle_client(self, client_socket, client_address):
         """Handle a client connection"""
         print(f"[+] Handling client {client_address}")
 
+        if self.read_timeout:
+            client_socket.settimeout(self.read_timeout)
+        if self.idle_timeout:
+            self.timers.schedule(
+                client_socket, self.idle_timeout,
+                lambda: self.reap(client_socket, client_address)
+            )
+        self.shaper.open(client_address, client_address[0])
+
+        writer = None
+        progress = None
         try:
-            file_data = b''
             file_name = None
             file_size = 0
+            bytes_received = 0
             chunks_received = 0
+            digest = None
+            tree = None
 
             while True:
                 msg_type, metadata, payload = FileTransferProtocol.receive_message(client_socket)
@@ -69,51 +263,129 @@ class FileTransferServer:
                 if msg_type is None:
                     break
 
+                if self.idle_timeout:
+                    self.timers.touch(client_socket, self.idle_timeout)
+
+                # Sleeping before the next recv slows the sender down
+                # through TCP flow control
+                if payload:
+                    with tracing.span('throttle'):
+                        self.shaper.throttle(client_address, len(payload))
+
+                if msg_type == MSG_HEARTBEAT:
+                    continue
+
+                if msg_type == MSG_LIST_REQUEST:
+                    self.handle_list(client_socket, metadata or {})
+                    continue
+
+                if msg_type == MSG_DOWNLOAD_REQUEST:
+                    self.handle_download(client_socket, client_address, metadata or {})
+                    continue
+
                 if msg_type == MSG_FILE_HEADER:
                     # File transfer starting
                     file_name = metadata.get('filename')
                     file_size = metadata.get('filesize')
                     checksum = metadata.get('checksum')
+                    upload_id = uuid.uuid4().hex
+
+                    error = self.check_header(metadata)
+                    if error:
+                        print(f"[!] Rejected upload from {client_address}: {error}")
+                        FileTransferProtocol.send_message(
+                            client_socket, MSG_ERROR, f'ERROR: {error}'.encode('utf-8')
+                        )
+                        break
+
+                    # Only now does the connection take a share of the total rate
+                    self.shaper.start_transfer(client_address)
 
                     print(f"[+] Receiving file: {file_name} ({file_size} bytes)")
                     print(f"[+] Expected checksum: {checksum}")
 
-                    file_data = b''
+                    bytes_received = 0
                     chunks_received = 0
 
+                    # Stream to a hidden temporary file; it only gets its
+                    # real name once the checksum has been verified
+                    if writer:
+                        writer.abort()
+                    if progress:
+                        self.progress.remove(progress)
+                    progress = Progress(file_size, file_name)
+                    self.progress.add(progress)
+                    writer = DiskWriter(
+                        os.path.join(self.parts_dir, f"{upload_id}{PART_SUFFIX}"),
+                        file_size,
+                        self.durability
+                    )
+
+                    # Hash as chunks arrive. The plain SHA-256 is always
+                    # kept for the metadata store; tree mode is verified
+                    # against the root of the block hash tree instead.
+                    digest = hashlib.sha256()
+                    tree = None
+                    if metadata.get('hash_mode') == HASH_TREE:
+                        tree = TreeHasher(
+                            metadata.get('block_size', TREE_BLOCK_SIZE), self.hash_pool
+                        )
+
                 elif msg_type == MSG_FILE_CHUNK:
                     # Receiving file chunk
-                    file_data += payload
+                    if writer is None:
+                        raise ValueError("File chunk before file header")
+                    if bytes_received + len(payload) > file_size:
+                        FileTransferProtocol.send_message(
+                            client_socket, MSG_ERROR, b'ERROR: More data than announced'
+                        )
+                        raise ValueError(f"Upload exceeds its announced size of {file_size} bytes")
+                    with tracing.span('disk_write'):
+                        writer.write(payload)
+                    bytes_received += len(payload)
                     chunks_received += 1
-
-                    progress = len(file_data) / file_size * 100
-                    print(f"[+] Progress: {progress:.1f}% ({len(file_data)}/{file_size} bytes)")
+                    with tracing.span('sha256'):
+                        digest.update(payload)
+                    if tree:
+                        with tracing.span('tree_hash'):
+                            tree.update(payload)
+                    progress.add(len(payload))
 
                 elif msg_type == MSG_FILE_COMPLETE:
                     # File transfer complete
-                    print(f"[+] Transfer complete. Received {len(file_data)} bytes in {chunks_received} chunks")
+                    print(f"[+] Transfer complete. Received {bytes_received} bytes in {chunks_received} chunks")
 
                     # Verify checksum
-                    received_checksum = FileTransferProtocol.calculate_checksum(file_data)
+                    with tracing.span('verify'):
+                        sha256 = digest.hexdigest() if digest else None
+                        received_checksum = tree.hexdigest() if tree else sha256
                     expected_checksum = metadata.get('checksum')
 
-                    if received_checksum == expected_checksum:
-                        # Save file
-                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                        safe_filename = f"{timestamp}_{file_name}"
-                        file_path = os.path.join(self.storage_dir, safe_filename)
+                    if writer and received_checksum == expected_checksum:
+                        with tracing.span('commit'):
+                            duplicates = self.store.find_by_checksum(sha256)
 
-                        with open(file_path, 'wb') as f:
-                            f.write(file_data)
+                            with self.commit_lock:
+                                safe_filename = self.stored_name(file_name, upload_id)
+                                file_path = os.path.join(self.storage_dir, safe_filename)
+                                writer.commit(file_path)
+                            writer = None
+                            st = os.stat(file_path)
+                            self.store.record(safe_filename, st.st_size, st.st_mtime_ns,
+                                              sha256, upload_id)
+                            self.index.add(safe_filename)
 
                         print(f"[+] File saved successfully: {file_path}")
                         print(f"[+] Checksum verified: {received_checksum}")
+                        if duplicates:
+                            print(f"[+] Same content already stored as {duplicates[0]}")
 
                         # Send success response
                         response = b'SUCCESS'
                         FileTransferProtocol.send_message(
                             client_socket, MSG_FILE_COMPLETE, response,
-                            {'saved_as': safe_filename}
+                            {'saved_as': safe_filename, 'upload_id': upload_id,
+                             'duplicate_of': duplicates[0] if duplicates else None}
                         )
                     else:
                         print(f"[!] Checksum mismatch!")
@@ -127,12 +399,119 @@ class FileTransferServer:
 
                     break
 
+        except socket.timeout:
+            print(f"[!] Read timeout from {client_address}")
         except Exception as e:
             print(f"[!] Error handling client {client_address}: {e}")
         finally:
+            # Unfinished or rejected uploads leave nothing behind
+            if writer:
+                writer.abort()
+            if progress:
+                self.progress.remove(progress)
+            self.timers.cancel(client_socket)
+            self.shaper.close(client_address)
             client_socket.close()
             print(f"[-] Connection closed: {client_address}")
 
+    def sweep_partial_uploads(self):
+        """Delete upload files a crash left behind; returns how many"""
+        removed = 0
+        with os.scandir(self.parts_dir) as it:
+            for entry in it:
+                if entry.name.endswith(PART_SUFFIX):
+                    try:
+                        os.unlink(entry.path)
+                        removed += 1
+                    except FileNotFoundError:
+                        pass
+        return removed
+
+    def check_header(self, metadata):
+        """Why an upload header cannot be accepted, or None"""
+        file_size = metadata.get('filesize')
+        if type(file_size) is not int or file_size < 0:
+            return f"Invalid file size: {file_size!r}"
+        if self.max_upload_size and file_size > self.max_upload_size:
+            return (f"File is {file_size} bytes; this server accepts at most "
+                    f"{self.max_upload_size} bytes")
+        free = shutil.disk_usage(self.storage_dir).free - self.min_free_space
+        if file_size > free:
+            return f"Not enough free space for {file_size} bytes"
+        if metadata.get('hash_mode') == HASH_TREE:
+            block_size = metadata.get('block_size', TREE_BLOCK_SIZE)
+            if not valid_block_size(block_size):
+                return (f"Tree block size must be a power of two from "
+                        f"{MIN_TREE_BLOCK_SIZE} to {MAX_TREE_BLOCK_SIZE} bytes, "
+                        f"not {block_size!r}")
+        return None
+
+    def stored_name(self, file_name, upload_id):
+        """Timestamped name for a verified upload; adds the upload ID on a clash"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        name = f"{timestamp}_{file_name}"
+        if os.path.exists(os.path.join(self.storage_dir, name)):
+            name = f"{timestamp}_{upload_id[:12]}_{file_name}"
+        return name
+
+    def handle_list(self, client_socket, metadata):
+        """Send one page of the storage listing"""
+        limit = max(1, min(int(metadata.get('limit', 100)), MAX_PAGE_SIZE))
+        entries, next_cursor, total = self.index.page(metadata.get('cursor'), limit)
+
+        payload = json.dumps(entries).encode('utf-8')
+        FileTransferProtocol.send_message(
+            client_socket, MSG_LIST_RESPONSE, payload,
+            {'total': total, 'count': len(entries), 'next_cursor': next_cursor}
+        )
+
+    def handle_download(self, client_socket, client_address, metadata):
+        """Send a stored file, or a byte range of it"""
+        file_name = metadata.get('filename', '')
+        entry = self.index.get(file_name)
+
+        # Only names from the index are served, so no path tricks
+        try:
+            if entry is None:
+                raise FileNotFoundError(file_name)
+            f = open(os.path.join(self.storage_dir, file_name), 'rb')
+        except OSError:
+            FileTransferProtocol.send_message(
+                client_socket, MSG_ERROR, b'ERROR: File not found',
+                {'filename': file_name}
+            )
+            return
+
+        file_size = entry[0]
+        offset = max(0, int(metadata.get('offset', 0)))
+        length = metadata.get('length')
+        if offset > file_size:
+            offset = file_size
+        if length is None or offset + int(length) > file_size:
+            length = file_size - offset
+        length = max(0, int(length))
+
+        print(f"[+] Sending {file_name} bytes {offset}-{offset + length} of {file_size}")
+
+        def throttle(n):
+            # A shaped download can outlast the idle timeout; it is progress
+            if self.idle_timeout:
+                self.timers.touch(client_socket, self.idle_timeout)
+            self.shaper.throttle(client_address, n)
+
+        # Corked, the header leaves in the same segment as the first data
+        self.shaper.start_transfer(client_address)
+        try:
+            with f, self.tuning.corked(client_socket):
+                FileTransferProtocol.send_file_payload(
+                    client_socket, MSG_DOWNLOAD_DATA, f, offset, length,
+                    {'filename': file_name, 'size': file_size,
+                     'offset': offset, 'length': length},
+                    throttle=throttle
+                )
+        finally:
+            self.shaper.end_transfer(client_address)
+
 
 if __name__ == '__main__':
     import argparse
@@ -141,8 +520,54 @@ if __name__ == '__main__':
     parser.add_argument('--host', default='0.0.0.0', help='Host to bind to')
     parser.add_argument('--port', type=int, default=9999, help='Port to bind to')
     parser.add_argument('--storage', default='./uploads', help='Storage directory')
+    parser.add_argument('--idle-timeout', type=float, default=60.0,
+                        help='Drop clients with no messages for this long, 0 to disable')
+    parser.add_argument('--read-timeout', type=float, default=30.0,
+                        help='Timeout for a single socket read, 0 to disable')
+    parser.add_argument('--index-db', default=None,
+                        help=f'Metadata database (default: <storage>/{INDEX_DB_NAME})')
+    parser.add_argument('--conn-rate', type=float, default=0,
+                        help='Per-connection bandwidth limit in KB/s, 0 for none')
+    parser.add_argument('--ip-rate', type=float, default=0,
+                        help='Per-client-IP bandwidth limit in KB/s, 0 for none')
+    parser.add_argument('--total-rate', type=float, default=0,
+                        help='Server-wide bandwidth in KB/s, shared fairly, 0 for none')
+    parser.add_argument('--limits', default=None,
+                        help='JSON limits file, re-read on SIGHUP')
+    parser.add_argument('--durability', choices=DURABILITY_MODES, default='none',
+                        help='none, fsync when an upload completes, or O_DSYNC writes')
+    parser.add_argument('--max-upload-mb', type=float, default=16 * 1024,
+                        help='Largest upload accepted in MB, 0 for no limit (default: 16384)')
+    parser.add_argument('--min-free-mb', type=float, default=256,
+                        help='Free space an upload must leave on the storage disk in MB '
+                             '(default: 256)')
+    parser.add_argument('--progress-interval', type=float, default=2.0,
+                        help='Seconds between upload progress lines, 0 to disable')
+    parser.add_argument('--trace', metavar='FILE', default=None,
+                        help='Time each phase of every connection; Chrome trace '
+                             'written to FILE on Ctrl-C')
+    add_socket_arguments(parser, 'bulk')
+    add_profiler_arguments(parser)
 
     args = parser.parse_args()
 
-    server = FileTransferServer(args.host, args.port, args.storage)
+    server = FileTransferServer(args.host, args.port, args.storage,
+                                idle_timeout=args.idle_timeout,
+                                read_timeout=args.read_timeout,
+                                index_db=args.index_db,
+                                conn_rate=args.conn_rate * KB,
+                                ip_rate=args.ip_rate * KB,
+                                total_rate=args.total_rate * KB,
+                                limits_file=args.limits,
+                                durability=args.durability,
+                                max_upload_size=int(args.max_upload_mb * MB),
+                                min_free_space=int(args.min_free_mb * MB),
+                                progress_interval=args.progress_interval,
+                                socket_profile=args.socket_profile,
+                                link_mbps=args.link_mbps,
+                                rtt_ms=args.rtt_ms,
+                                trace_file=args.trace,
+                                profile_file=args.profile,
+                                profile_hz=args.profile_hz,
+                                profile_control=args.profile_control)
     server.start()
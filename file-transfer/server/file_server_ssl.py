@@ -4,16 +4,19 @@ SSL/TLS-enabled File Transfer Server
 COSC 450 Final Project - Longyu Tang
 """
 
-import socket
 import ssl
-import threading
 import os
 import sys
 
 # Ensure original server module can be imported
 sys.path.insert(0, os.path.dirname(__file__))
 
-from file_server import FileTransferServer
+from file_server import MB, FileTransferServer
+from disk_writer import DURABILITY_MODES
+from shaping import KB
+from shared.profiler import add_profiler_arguments
+from shared.sockopts import add_socket_arguments
+from shared import tracing
 
 
 class FileTransferServerSSL(FileTransferServer):
@@ -24,50 +27,42 @@ class FileTransferServerSSL(FileTransferServer):
     """
 
     def __init__(self, host="0.0.0.0", port=9998,
-                 storage_dir="./uploads", certfile=None, keyfile=None):
-        super().__init__(host=host, port=port, storage_dir=storage_dir)
+                 storage_dir="./uploads", certfile=None, keyfile=None,
+                 **kwargs):
+        super().__init__(host=host, port=port, storage_dir=storage_dir,
+                         **kwargs)
         self.certfile = certfile
         self.keyfile = keyfile
+        self.context = None
 
     def start(self):
         """Start SSL-enabled file transfer server."""
-        # Create TCP socket
-        raw_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        raw_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-
-        # Wrap socket with SSL
+        # Connections are wrapped in their handler thread, so a client that
+        # stalls mid-handshake cannot block the accept loop
         if self.certfile and self.keyfile:
-            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
-            context.load_cert_chain(self.certfile, self.keyfile)
-            self.server_socket = context.wrap_socket(
-                raw_socket, server_side=True
-            )
+            self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            self.context.load_cert_chain(self.certfile, self.keyfile)
             print("[+] SSL/TLS enabled for file transfer server")
         else:
-            self.server_socket = raw_socket
+            self.context = None
             print("[!] WARNING: running WITHOUT SSL")
+        super().start()
 
-        self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen(5)
-
-        print(f"[+] Listening on {self.host}:{self.port}")
-        print(f"[+] Upload directory: {self.storage_dir}")
-
-        try:
-            while True:
-                client_socket, client_address = self.server_socket.accept()
-                print(f"[+] SSL connection from {client_address}")
+    def handle_client(self, client_socket, client_address):
+        """Complete the TLS handshake, then handle the client as usual."""
+        if self.context is not None:
+            try:
+                client_socket.settimeout(self.read_timeout or None)
+                with tracing.span('tls_handshake'):
+                    client_socket = self.context.wrap_socket(
+                        client_socket, server_side=True
+                    )
+            except (ssl.SSLError, OSError) as e:
+                print(f"[!] TLS handshake failed with {client_address}: {e}")
+                client_socket.close()
+                return
 
-                client_thread = threading.Thread(
-                    target=self.handle_client,
-                    args=(client_socket, client_address),
-                    daemon=True
-                )
-                client_thread.start()
-        except KeyboardInterrupt:
-            print("\n[!] Server shutting down...")
-        finally:
-            self.server_socket.close()
+        super().handle_client(client_socket, client_address)
 
 
 def parse_args():
@@ -81,6 +76,20 @@ def parse_args():
     parser.add_argument("--storage", default="./uploads")
     parser.add_argument("--certfile", required=True)
     parser.add_argument("--keyfile", required=True)
+    parser.add_argument("--idle-timeout", type=float, default=60.0)
+    parser.add_argument("--read-timeout", type=float, default=30.0)
+    parser.add_argument("--index-db", default=None)
+    parser.add_argument("--conn-rate", type=float, default=0)
+    parser.add_argument("--ip-rate", type=float, default=0)
+    parser.add_argument("--total-rate", type=float, default=0)
+    parser.add_argument("--limits", default=None)
+    parser.add_argument("--durability", choices=DURABILITY_MODES, default="none")
+    parser.add_argument("--max-upload-mb", type=float, default=16 * 1024)
+    parser.add_argument("--min-free-mb", type=float, default=256)
+    parser.add_argument("--progress-interval", type=float, default=2.0)
+    parser.add_argument("--trace", default=None)
+    add_socket_arguments(parser, "bulk")
+    add_profiler_arguments(parser)
     return parser.parse_args()
 
 
@@ -91,7 +100,25 @@ if __name__ == "__main__":
         port=args.port,
         storage_dir=args.storage,
         certfile=args.certfile,
-        keyfile=args.keyfile
+        keyfile=args.keyfile,
+        idle_timeout=args.idle_timeout,
+        read_timeout=args.read_timeout,
+        index_db=args.index_db,
+        conn_rate=args.conn_rate * KB,
+        ip_rate=args.ip_rate * KB,
+        total_rate=args.total_rate * KB,
+        limits_file=args.limits,
+        durability=args.durability,
+        max_upload_size=int(args.max_upload_mb * MB),
+        min_free_space=int(args.min_free_mb * MB),
+        progress_interval=args.progress_interval,
+        socket_profile=args.socket_profile,
+        link_mbps=args.link_mbps,
+        rtt_ms=args.rtt_ms,
+        trace_file=args.trace,
+        profile_file=args.profile,
+        profile_hz=args.profile_hz,
+        profile_control=args.profile_control
     )
     server.start()
 
@@ -0,0 +1,205 @@
+"""
+Storage Metadata Store
+COSC 450 Final Project - Longyu Tang
+
+Persistent per-file metadata (size, mtime, SHA-256, upload ID) for the
+server's storage directory, kept in SQLite in WAL mode. At startup the
+directory is compared against the stored size/mtime of every file and
+only new or changed files are hashed, so restarting on a large directory
+costs one directory scan rather than re-hashing everything. Lookups go
+through an LRU cache in front of the database.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+INDEX_DB_NAME = '.ftindex.sqlite3'
+HASH_BLOCK_SIZE = 1024 * 1024
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    name      TEXT PRIMARY KEY,
+    size      INTEGER NOT NULL,
+    mtime_ns  INTEGER NOT NULL,
+    sha256    TEXT NOT NULL,
+    upload_id TEXT
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS files_sha256 ON files (sha256);
+'''
+
+
+def hash_file(path):
+    """SHA-256 of a file, read in large blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(HASH_BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """Small thread-safe least-recently-used cache"""
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.items:
+                return None
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.capacity:
+                self.items.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+
+class MetadataStore:
+    """SQLite-backed metadata for every file in the storage directory"""
+
+    def __init__(self, db_path, cache_size=4096, hash_workers=4):
+        self.db_path = db_path
+        self.hash_workers = hash_workers
+        self.cache = LRUCache(cache_size)
+        self.lock = threading.Lock()
+
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+
+    def sync(self, storage_dir):
+        """Bring the store in line with the directory.
+
+        Returns ({name: (size, mtime_ns)}, stats). Only files whose size or
+        mtime differ from the stored row are hashed.
+        """
+        start = time.perf_counter()
+
+        with self.lock:
+            stored = {
+                name: (size, mtime_ns)
+                for name, size, mtime_ns in self.db.execute(
+                    'SELECT name, size, mtime_ns FROM files'
+                )
+            }
+
+        current = {}
+        changed = []
+        with os.scandir(storage_dir) as it:
+            for entry in it:
+                if entry.name.startswith('.') or not entry.is_file(follow_symlinks=False):
+                    continue
+                st = entry.stat(follow_symlinks=False)
+                current[entry.name] = (st.st_size, st.st_mtime_ns)
+                if stored.get(entry.name) != current[entry.name]:
+                    changed.append(entry.name)
+
+        removed = [name for name in stored if name not in current]
+
+        # A rescan can run while uploads are committed: record() may have
+        # stored some of these since `stored` was read, so skip re-hashing
+        if changed:
+            with self.lock:
+                changed = [
+                    name for name in changed
+                    if self.db.execute(
+                        'SELECT size, mtime_ns FROM files WHERE name = ?', (name,)
+                    ).fetchone() != current[name]
+                ]
+
+        rows = []
+        if changed:
+            paths = [os.path.join(storage_dir, name) for name in changed]
+            with ThreadPoolExecutor(max_workers=self.hash_workers) as pool:
+                for name, digest in zip(changed, pool.map(hash_file, paths)):
+                    size, mtime_ns = current[name]
+                    rows.append((name, size, mtime_ns, digest, None))
+
+        with self.lock, self.db:
+            if rows:
+                # A file rewritten with the same content keeps its upload ID
+                self.db.executemany(
+                    'INSERT INTO files VALUES (?, ?, ?, ?, ?) ON CONFLICT (name) DO UPDATE SET '
+                    'size = excluded.size, mtime_ns = excluded.mtime_ns, '
+                    'sha256 = excluded.sha256, upload_id = CASE WHEN '
+                    'files.sha256 = excluded.sha256 THEN files.upload_id END', rows
+                )
+            if removed:
+                self.db.executemany(
+                    'DELETE FROM files WHERE name = ?', [(n,) for n in removed]
+                )
+
+        for name in changed + removed:
+            self.cache.discard(name)
+
+        stats = {
+            'files': len(current),
+            'new': sum(1 for n in changed if n not in stored),
+            'changed': sum(1 for n in changed if n in stored),
+            'removed': len(removed),
+            'seconds': time.perf_counter() - start,
+        }
+        return current, stats
+
+    def record(self, name, size, mtime_ns, sha256, upload_id=None):
+        """Store metadata for a file the server just wrote"""
+        with self.lock, self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)',
+                (name, size, mtime_ns, sha256, upload_id)
+            )
+        self.cache.discard(name)
+
+    def get(self, name):
+        """Return metadata for a file as a dict, or None"""
+        meta = self.cache.get(name)
+        if meta is not None:
+            return meta
+
+        with self.lock:
+            row = self.db.execute(
+                'SELECT name, size, mtime_ns, sha256, upload_id FROM files '
+                'WHERE name = ?', (name,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        meta = {
+            'name': row[0],
+            'size': row[1],
+            'mtime': row[2] / 1e9,
+            'sha256': row[3],
+            'upload_id': row[4],
+        }
+        self.cache.put(name, meta)
+        return meta
+
+    def find_by_checksum(self, sha256):
+        """Names of stored files with this SHA-256 (for dedupe checks)"""
+        with self.lock:
+            return [row[0] for row in self.db.execute(
+                'SELECT name FROM files WHERE sha256 = ?', (sha256,)
+            )]
+
+    def close(self):
+        with self.lock:
+            self.db.close()
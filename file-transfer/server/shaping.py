@@ -0,0 +1,149 @@
+"""
+Traffic Shaping
+COSC 450 Final Project - Longyu Tang
+
+Bandwidth limits for the file server, so one bulk transfer through the
+tunnel cannot starve other uploads (or the chat traffic sharing the VPN
+link). Every connection is held to three limits at once:
+
+- its own token bucket (per-connection rate),
+- a bucket shared by all connections from the same client IP,
+- its weighted share of the server-wide rate, recomputed as transfers
+  start and finish. Only connections with an upload or download in
+  progress hold a share; idle ones and ones that only list files take
+  none, so the transfers that are running split the whole rate.
+
+Limits can be changed while the server runs: update() applies new rates
+to existing connections, and load() reads them from a JSON file such as
+
+    {"connection": 0, "per_ip": 2048, "total": 8192,
+     "weights": {"10.8.0.2": 2}}
+
+with rates in KB/s (0 = unlimited) and weights greater than 0.
+"""
+
+import json
+import math
+import threading
+
+from shared.ratelimit import FairScheduler, TokenBucket, throttle
+
+KB = 1024
+
+
+def is_rate(value):
+    """A usable rate: a finite number of 0 or more (0 = unlimited)"""
+    return (not isinstance(value, bool) and isinstance(value, (int, float))
+            and 0 <= value < math.inf)
+
+
+class TrafficShaper:
+    """Per-connection, per-IP and weighted server-wide rate limits"""
+
+    def __init__(self, conn_rate=0, ip_rate=0, total_rate=0, weights=None):
+        self.conn_rate = 0
+        self.ip_rate = 0
+        self.weights = {}
+        self.scheduler = FairScheduler(0)
+        self.ip_buckets = {}  # {ip: [bucket, connections]}
+        self.flows = {}       # {key: (ip, [buckets])}
+        self.lock = threading.Lock()
+        self.update(conn_rate, ip_rate, total_rate, weights or {})
+
+    def open(self, key, ip):
+        """Start shaping a connection (its own and its IP's limits)"""
+        with self.lock:
+            ip_entry = self.ip_buckets.setdefault(ip, [TokenBucket(self.ip_rate), 0])
+            ip_entry[1] += 1
+            buckets = [TokenBucket(self.conn_rate), ip_entry[0]]
+            self.flows[key] = (ip, buckets)
+
+    def start_transfer(self, key):
+        """Give a connection its share of the server-wide rate"""
+        with self.lock:
+            flow = self.flows.get(key)
+            if flow is None or len(flow[1]) > 2:
+                return
+            ip, buckets = flow
+            buckets.append(self.scheduler.add(key, self.weights.get(ip, 1.0)))
+
+    def end_transfer(self, key):
+        """Hand a connection's share back to the other transfers"""
+        with self.lock:
+            flow = self.flows.get(key)
+            if flow is None or len(flow[1]) <= 2:
+                return
+            del flow[1][2:]
+        self.scheduler.remove(key)
+
+    def close(self, key):
+        self.end_transfer(key)
+        with self.lock:
+            flow = self.flows.pop(key, None)
+            if flow is None:
+                return
+            ip = flow[0]
+            self.ip_buckets[ip][1] -= 1
+            if not self.ip_buckets[ip][1]:
+                del self.ip_buckets[ip]
+
+    def throttle(self, key, n):
+        """Account n bytes to a connection, sleeping to hold its limits"""
+        flow = self.flows.get(key)
+        if flow is not None:
+            throttle(flow[1], n)
+
+    def update(self, conn_rate=None, ip_rate=None, total_rate=None, weights=None):
+        """Change limits; existing connections pick them up immediately"""
+        for name, value in (('connection', conn_rate), ('per_ip', ip_rate),
+                            ('total', total_rate)):
+            if value is not None and not is_rate(value):
+                raise ValueError(f"Rate {name} must be a number of 0 or more, not {value!r}")
+        if weights is not None:
+            if not isinstance(weights, dict):
+                raise ValueError(f"Weights must map client IPs to numbers, not {weights!r}")
+            for ip, weight in weights.items():
+                if isinstance(weight, bool) or not isinstance(weight, (int, float)) \
+                        or weight <= 0:
+                    raise ValueError(f"Weight for {ip} must be a number above 0, "
+                                     f"not {weight!r}")
+        with self.lock:
+            if conn_rate is not None:
+                self.conn_rate = conn_rate
+                for _, buckets in self.flows.values():
+                    buckets[0].set_rate(conn_rate)
+            if ip_rate is not None:
+                self.ip_rate = ip_rate
+                for bucket, _ in self.ip_buckets.values():
+                    bucket.set_rate(ip_rate)
+            if weights is not None:
+                self.weights = dict(weights)
+                for key, (ip, _) in self.flows.items():
+                    self.scheduler.set_weight(key, self.weights.get(ip, 1.0))
+        if total_rate is not None:
+            self.scheduler.set_total(total_rate)
+
+    def load(self, path):
+        """Apply limits from a JSON file (rates in KB/s)"""
+        with open(path) as f:
+            limits = json.load(f)
+        if not isinstance(limits, dict):
+            raise ValueError(f"{path} must hold a JSON object")
+
+        def rate(name):
+            if name not in limits:
+                return None
+            # Checked before scaling: "100" * KB would be a long string
+            if not is_rate(limits[name]):
+                raise ValueError(f"Rate {name} must be a number of 0 or more, "
+                                 f"not {limits[name]!r}")
+            return limits[name] * KB
+
+        self.update(rate('connection'), rate('per_ip'), rate('total'),
+                    limits.get('weights'))
+
+    def describe(self):
+        def fmt(rate):
+            return f"{rate / KB:.0f} KB/s" if rate else "unlimited"
+        return (f"connection {fmt(self.conn_rate)}, per IP {fmt(self.ip_rate)}, "
+                f"total {fmt(self.scheduler.total_rate)}")
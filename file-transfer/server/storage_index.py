@@ -0,0 +1,121 @@
+"""
+Storage Directory Index
+COSC 450 Final Project - Longyu Tang
+
+In-memory index of the server's storage directory, used to answer list
+and download requests without an os.listdir per request. Uploads handled
+by this server are added directly; files added or removed by anything
+else are picked up because they change the directory's mtime, which is
+checked with a single stat per request. The rescan itself runs in a
+background thread, so a request never waits for it; until it finishes,
+requests are answered from the previous index.
+
+With a MetadataStore attached, rescans go through the store so the same
+directory scan also keeps the persistent checksums up to date, and
+listings include each file's SHA-256.
+"""
+
+import bisect
+import os
+import threading
+
+
+class StorageIndex:
+    """Sorted name -> (size, mtime) index of a storage directory"""
+
+    def __init__(self, storage_dir, store=None):
+        self.storage_dir = storage_dir
+        self.store = store
+        self.last_sync = None
+        self.entries = {}  # {name: (size, mtime)}
+        self.names = []    # sorted names, for paging
+        self.dir_mtime_ns = None
+        self.refreshing = False
+        self.lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        """Rebuild the index from a directory scan"""
+        dir_mtime_ns = os.stat(self.storage_dir).st_mtime_ns
+        if self.store is not None:
+            files, self.last_sync = self.store.sync(self.storage_dir)
+            entries = {name: (size, mtime_ns / 1e9)
+                       for name, (size, mtime_ns) in files.items()}
+        else:
+            entries = {}
+            with os.scandir(self.storage_dir) as it:
+                for entry in it:
+                    # Dotfiles are the server's own (e.g. the metadata db)
+                    if entry.name.startswith('.'):
+                        continue
+                    if entry.is_file(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        entries[entry.name] = (st.st_size, st.st_mtime)
+
+        with self.lock:
+            self.entries = entries
+            self.names = sorted(entries)
+            self.dir_mtime_ns = dir_mtime_ns
+
+    def check_for_changes(self):
+        """Start a rescan if something else changed the directory"""
+        try:
+            mtime_ns = os.stat(self.storage_dir).st_mtime_ns
+        except FileNotFoundError:
+            return
+        with self.lock:
+            if mtime_ns == self.dir_mtime_ns or self.refreshing:
+                return
+            self.refreshing = True
+        threading.Thread(target=self._refresh_in_background, name='index-refresh',
+                         daemon=True).start()
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except OSError as e:
+            print(f"[!] Storage rescan failed: {e}")
+        finally:
+            # Changes made during the scan left the mtime newer than the
+            # one recorded, so the next request starts another rescan
+            with self.lock:
+                self.refreshing = False
+
+    def add(self, name):
+        """Record a file this server just wrote"""
+        path = os.path.join(self.storage_dir, name)
+        st = os.stat(path)
+        dir_mtime_ns = os.stat(self.storage_dir).st_mtime_ns
+        with self.lock:
+            if name not in self.entries:
+                bisect.insort(self.names, name)
+            self.entries[name] = (st.st_size, st.st_mtime)
+            self.dir_mtime_ns = dir_mtime_ns
+
+    def get(self, name):
+        """Return (size, mtime) for a stored file, or None"""
+        self.check_for_changes()
+        return self.entries.get(name)
+
+    def page(self, cursor=None, limit=100):
+        """Return (entries, next_cursor, total) for names after cursor"""
+        self.check_for_changes()
+        with self.lock:
+            start = bisect.bisect_right(self.names, cursor) if cursor else 0
+            names = self.names[start:start + limit]
+            entries = [
+                {'name': name,
+                 'size': self.entries[name][0],
+                 'mtime': self.entries[name][1]}
+                for name in names
+            ]
+            more = start + limit < len(self.names)
+            total = len(self.names)
+
+        if self.store is not None:
+            for entry in entries:
+                meta = self.store.get(entry['name'])
+                entry['sha256'] = meta['sha256'] if meta else None
+
+        next_cursor = names[-1] if names and more else None
+        return entries, next_cursor, total
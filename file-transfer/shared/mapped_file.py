@@ -0,0 +1,84 @@
+"""
+Memory-Mapped File Source - Shared Utilities
+COSC 450 Final Project
+
+Read-only mmap of a file for sending. Hashing runs directly over the
+mapping and chunks are handed out as memoryviews of it, so the file is
+never copied into Python bytes. The kernel is told the access is
+sequential, and ranges that have been fully consumed are dropped from
+the mapping as we go, so resident memory stays at a few windows' worth
+even for files larger than RAM.
+"""
+
+import hashlib
+import mmap
+import os
+
+WINDOW_SIZE = 8 * 1024 * 1024
+
+
+class MappedFile:
+    """Sequential, zero-copy view of a file on disk"""
+
+    def __init__(self, path, window_size=WINDOW_SIZE):
+        self.path = path
+        self.window_size = window_size
+        self.file = open(path, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+
+        # mmap cannot map an empty file
+        if self.size:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.advise(getattr(mmap, 'MADV_SEQUENTIAL', None))
+            self.view = memoryview(self.map)
+        else:
+            self.map = None
+            self.view = memoryview(b'')
+
+    def advise(self, advice, start=0, length=None):
+        """madvise where the platform supports it"""
+        if self.map is None or advice is None or not hasattr(self.map, 'madvise'):
+            return
+        if length is None:
+            length = self.size - start
+        if length > 0:
+            self.map.madvise(advice, start, length)
+
+    def release(self, end):
+        """Drop pages before end; they are clean and re-read on demand"""
+        end -= end % mmap.PAGESIZE
+        self.advise(getattr(mmap, 'MADV_DONTNEED', None), 0, end)
+
+    def sha256(self):
+        """SHA-256 of the whole file, straight from the mapping"""
+        digest = hashlib.sha256()
+        for start in range(0, self.size, self.window_size):
+            digest.update(self.view[start:start + self.window_size])
+            self.release(start + self.window_size)
+        return digest.hexdigest()
+
+    def chunks(self, chunk_size):
+        """Yield memoryview chunks of the file in order"""
+        released = 0
+        for start in range(0, self.size, chunk_size):
+            yield self.view[start:start + chunk_size]
+            if start - released >= self.window_size:
+                self.release(start)
+                released = start
+
+    def close(self):
+        self.file.close()
+        self.view.release()
+        if self.map is None:
+            return
+        try:
+            self.map.close()
+        except BufferError:
+            # A chunk view is still referenced; the mapping goes with it
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,315 @@
+"""
+Sampling Profiler - Shared Utilities
+COSC 450 Final Project
+
+Continuous CPU profiling for the servers, switched on and off while they
+run. A background thread wakes `hz` times a second, takes the Python
+stack of every other thread (sys._current_frames) and counts it as a
+folded stack, "thread;outer;...;inner count": the input of flamegraph.pl,
+speedscope and inferno.
+
+A thread rather than a signal timer, because Python runs signal handlers
+only in the main thread, and in these servers that thread sits in
+accept() while the work happens in the per-client threads.
+
+Only threads that used CPU since the previous sample are counted (each
+thread's CPU clock is read from the kernel), so the thousands of client
+threads blocked in recv() do not bury the busy ones. mode='wall' counts
+every thread instead. Numbered default thread names ("Thread-12
+(handle_client)") are folded into one ("Thread (handle_client)"), so a
+pool of identical threads shows up as a single flame.
+
+Overhead is bounded: the sampler measures the CPU time it spends itself
+and stretches its interval whenever sampling would cost more than
+max_overhead of one CPU (1% by default). status() reports the measured
+overhead and the rate actually achieved.
+
+The servers take --profile FILE (sample from startup, folded stacks
+written on shutdown) and --profile-control PATH, a Unix socket taking one
+command per connection:
+
+    start [hz] | stop | status | reset | dump [file]
+
+    echo status | nc -U /tmp/server-profile.sock
+    echo dump | nc -U /tmp/server-profile.sock > server.folded
+"""
+
+import argparse
+import math
+import os
+import re
+import socket
+import sys
+import threading
+import time
+
+DEFAULT_HZ = 100
+MAX_OVERHEAD = 0.01
+MAX_DEPTH = 128
+
+_NUMBERED_THREAD = re.compile(r'^Thread-\d+')
+
+
+def check_hz(hz):
+    """Return hz as a float; raises ValueError unless it is a usable rate"""
+    hz = float(hz)
+    if not (hz > 0 and math.isfinite(hz)):
+        raise ValueError(f"sampling rate must be a positive number of Hz, not {hz:g}")
+    return hz
+
+
+def hz_argument(value):
+    """argparse type for --profile-hz"""
+    try:
+        return check_hz(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def thread_cpu_clock(native_id):
+    """Kernel CPU clock of one thread of this process (Linux), or None.
+
+    This is the clock id glibc's pthread_getcpuclockid builds; unlike that
+    call it is safe on a thread that has already exited (clock_gettime
+    then fails with EINVAL).
+    """
+    if not sys.platform.startswith('linux') or native_id is None:
+        return None
+    return (~native_id << 3) | 6
+
+
+def thread_label(thread):
+    if thread is None:
+        return 'unknown'
+    return _NUMBERED_THREAD.sub('Thread', thread.name)
+
+
+class StackSampler:
+    """Folded-stack CPU profile of every thread in this process"""
+
+    def __init__(self, hz=DEFAULT_HZ, mode='cpu', max_overhead=MAX_OVERHEAD):
+        if mode not in ('cpu', 'wall'):
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        self.hz = check_hz(hz)
+        self.mode = mode
+        self.max_overhead = max_overhead
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.labels = {}       # {code: 'function (file:line)'}
+        self.thread_info = {}  # {ident: (thread label, CPU clock id)}
+        self.cpu_seen = {}     # {ident: thread CPU ns at the last sample}
+        self.reset()
+
+    def reset(self):
+        """Forget the stacks collected so far"""
+        with self.lock:
+            self.stacks = {}  # {(thread label, (code, ...)): count}
+            self.samples = 0
+            self.sampling_seconds = 0.0
+            self.started = time.monotonic()
+            self.running_seconds = 0.0
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, hz=None):
+        if hz is not None:
+            self.hz = check_hz(hz)
+        if self.running:
+            return
+        self.stop_event.clear()
+        self.started = time.monotonic()
+        self.thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+
+    def _run(self):
+        interval = 1 / self.hz
+        while not self.stop_event.wait(interval):
+            cost_start = time.thread_time()
+            self.sample()
+            cost = time.thread_time() - cost_start
+            with self.lock:
+                self.samples += 1
+                self.sampling_seconds += cost
+            # Keep cost / interval under the overhead budget
+            interval = max(1 / self.hz, cost / self.max_overhead)
+        with self.lock:
+            self.running_seconds += time.monotonic() - self.started
+
+    def _label(self, code):
+        label = self.labels.get(code)
+        if label is None:
+            name = getattr(code, 'co_qualname', code.co_name)
+            label = f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self.labels[code] = label
+        return label
+
+    def _refresh_threads(self, idents):
+        """Look up the name and CPU clock of every thread (when threads change)"""
+        threads = {t.ident: t for t in threading.enumerate()}
+        info = {}
+        for ident in idents:
+            thread = threads.get(ident)
+            info[ident] = (thread_label(thread),
+                           thread_cpu_clock(getattr(thread, 'native_id', None)))
+        self.thread_info = info
+        self.cpu_seen = {i: c for i, c in self.cpu_seen.items() if i in info}
+
+    def sample(self):
+        """Count the current stack of every other (busy) thread once"""
+        me = threading.get_ident()
+        frames = sys._current_frames()
+        if frames.keys() != self.thread_info.keys():
+            self._refresh_threads(frames)
+        info, seen = self.thread_info, self.cpu_seen
+        cpu_mode = self.mode == 'cpu'
+        counted = []
+        for ident, frame in frames.items():
+            if ident == me:
+                continue
+            label, clock = info[ident]
+            if cpu_mode and clock is not None:
+                # Skip threads that used no CPU since the previous sample
+                try:
+                    cpu = time.clock_gettime_ns(clock)
+                except OSError:
+                    # Exited, and its ident reused; look threads up again
+                    self.thread_info = {}
+                    continue
+                previous = seen.get(ident)
+                seen[ident] = cpu
+                if previous is None or cpu <= previous:
+                    continue
+            codes = []
+            while frame is not None and len(codes) < MAX_DEPTH:
+                codes.append(frame.f_code)
+                frame = frame.f_back
+            counted.append((label, tuple(reversed(codes))))
+        del frames
+
+        with self.lock:
+            for key in counted:
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def folded(self):
+        """The profile as folded-stack lines, most frequent first"""
+        with self.lock:
+            stacks = list(self.stacks.items())
+        lines = []
+        for (thread, codes), count in sorted(stacks, key=lambda item: -item[1]):
+            frames = [thread] + [self._label(code) for code in codes]
+            lines.append(f"{';'.join(frames)} {count}")
+        return '\n'.join(lines) + '\n' if lines else ''
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.folded())
+        return path
+
+    def status(self):
+        with self.lock:
+            elapsed = self.running_seconds
+            if self.running:
+                elapsed += time.monotonic() - self.started
+            return {
+                'running': self.running,
+                'mode': self.mode,
+                'hz': self.hz,
+                'achieved_hz': self.samples / elapsed if elapsed else 0.0,
+                'samples': self.samples,
+                'stacks': len(self.stacks),
+                'overhead_percent': self.sampling_seconds / elapsed * 100 if elapsed else 0.0,
+            }
+
+
+class ProfilerControl:
+    """Unix socket for driving a StackSampler at runtime"""
+
+    def __init__(self, sampler, path):
+        self.sampler = sampler
+        self.path = path
+        self.server_socket = None
+        self.thread = None
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # left over from a previous run
+        self.server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server_socket.bind(self.path)
+        os.chmod(self.path, 0o600)
+        self.server_socket.listen(4)
+        self.thread = threading.Thread(target=self._serve, args=(self.server_socket,),
+                                       name='profiler-control', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.server_socket is None:
+            return
+        # shutdown wakes the accept() in the serving thread
+        try:
+            self.server_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.server_socket.close()
+        self.server_socket = None
+        self.thread.join()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _serve(self, server_socket):
+        while True:
+            try:
+                conn, _ = server_socket.accept()
+            except OSError:
+                return
+            with conn:
+                conn.settimeout(5.0)
+                try:
+                    command = conn.makefile('r').readline().split()
+                    conn.sendall(self.handle(command).encode('utf-8'))
+                except OSError:
+                    pass
+
+    def handle(self, command):
+        """Run one command; returns the reply text"""
+        name, args = (command[0].lower(), command[1:]) if command else ('status', [])
+        try:
+            if name == 'start':
+                self.sampler.start(float(args[0]) if args else None)
+            elif name == 'stop':
+                self.sampler.stop()
+            elif name == 'reset':
+                self.sampler.reset()
+            elif name == 'dump':
+                if not args:
+                    return self.sampler.folded()
+                return f"ok: wrote {self.sampler.dump(args[0])}\n"
+            elif name != 'status':
+                return f"error: unknown command {name} (start, stop, status, reset, dump)\n"
+        except (ValueError, OSError) as e:
+            return f"error: {e}\n"
+        status = self.sampler.status()
+        return ' '.join(f"{k}={round(v, 3) if isinstance(v, float) else v}"
+                        for k, v in status.items()) + '\n'
+
+
+def add_profiler_arguments(parser):
+    """--profile, --profile-hz and --profile-control, shared by the servers"""
+    parser.add_argument('--profile', metavar='FILE', default=None,
+                        help='Sample CPU stacks from startup; folded stacks written '
+                             'to FILE on shutdown')
+    parser.add_argument('--profile-hz', type=hz_argument, default=DEFAULT_HZ,
+                        help=f'Stack samples per second (default: {DEFAULT_HZ})')
+    parser.add_argument('--profile-control', metavar='PATH', default=None,
+                        help='Unix socket to start, stop and dump the profiler at runtime')
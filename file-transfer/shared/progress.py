@@ -0,0 +1,205 @@
+"""
+Transfer Progress - Shared Utilities
+COSC 450 Final Project
+
+Progress reporting that stays out of the transfer loop. The loop only
+adds to a byte counter (Progress.add); a single ticker thread looks at
+every active transfer a few times a second and reports it as a terminal
+bar, a log line, or a JSON event per line for scripts. Each report has
+the instantaneous rate since the last tick, an exponentially smoothed
+rate, and an ETA based on the smoothed rate. The bar and the JSON events
+go to stderr, so a script reading the events never has to pick them out
+of the client's own messages on stdout.
+
+Only the transfer thread writes a counter and the ticker only reads it,
+so no lock is needed on the hot path.
+"""
+
+import json
+import math
+import sys
+import threading
+import time
+
+PROGRESS_MODES = ('bar', 'json', 'log', 'none')
+SMOOTHING = 0.3
+
+
+def format_bytes(n):
+    for unit in ('B', 'KB', 'MB'):
+        if n < 1024:
+            return f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GB"
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return '--:--'
+    seconds = int(seconds)
+    return f"{seconds // 60:d}:{seconds % 60:02d}"
+
+
+class Progress:
+    """Byte counter for one transfer"""
+
+    def __init__(self, total, label=''):
+        self.total = total or 0
+        self.label = label
+        self.done = 0
+        self.started = time.monotonic()
+        self.last_time = self.started
+        self.last_done = 0
+        self.smoothed = None
+
+    def add(self, n):
+        """Called from the transfer loop; must stay this cheap"""
+        self.done += n
+
+    def snapshot(self, now=None):
+        """Sample the counter; updates the rates (ticker thread only)"""
+        now = now or time.monotonic()
+        done = self.done
+        elapsed = now - self.last_time
+        rate = (done - self.last_done) / elapsed if elapsed > 0 else 0.0
+        if self.smoothed is None:
+            self.smoothed = rate
+        else:
+            self.smoothed = SMOOTHING * rate + (1 - SMOOTHING) * self.smoothed
+        self.last_time = now
+        self.last_done = done
+
+        remaining = max(0, self.total - done)
+        eta = remaining / self.smoothed if self.smoothed else None
+        if eta is not None and not math.isfinite(eta):
+            eta = None  # stalled; the smoothed rate has decayed to ~0
+        return {
+            'label': self.label,
+            'bytes': done,
+            'total': self.total,
+            'percent': done / self.total * 100 if self.total else 100.0,
+            'rate_bps': rate,
+            'smoothed_bps': self.smoothed,
+            'average_bps': done / (now - self.started) if now > self.started else 0.0,
+            'eta_s': eta,
+            'elapsed_s': now - self.started,
+        }
+
+
+class ProgressGroup(Progress):
+    """Combined progress of transfers running in several threads.
+
+    Each thread registers the Progress of the transfer it is running; the
+    group's count is the bytes of the files that succeeded plus those of
+    the transfers in flight, summed when the ticker samples it. A failed
+    attempt's bytes drop out again, so a retried file is not counted twice.
+    """
+
+    def __init__(self, total, label=''):
+        super().__init__(total, label)
+        self.lock = threading.Lock()
+        self.current = {}  # {thread ident: Progress of its transfer}
+        self.finished = 0
+
+    def track(self, progress):
+        """Count progress as the calling thread's current transfer"""
+        with self.lock:
+            self.current[threading.get_ident()] = progress
+
+    def settle(self, ok):
+        """The calling thread's transfer ended; keep its bytes if it succeeded"""
+        with self.lock:
+            progress = self.current.pop(threading.get_ident(), None)
+            if ok and progress is not None:
+                self.finished += progress.total
+
+    def snapshot(self, now=None):
+        with self.lock:
+            self.done = self.finished + sum(p.done for p in self.current.values())
+        return super().snapshot(now)
+
+
+class ProgressTicker:
+    """Report every registered transfer at a fixed interval"""
+
+    def __init__(self, mode='bar', interval=0.5, stream=None):
+        if mode not in PROGRESS_MODES:
+            raise ValueError(f"Unknown progress mode: {mode}")
+        self.mode = mode
+        self.interval = interval
+        self.stream = stream
+        self.active = []
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @property
+    def enabled(self):
+        return self.mode != 'none' and self.interval > 0
+
+    def add(self, progress):
+        if self.enabled:
+            with self.lock:
+                self.active.append(progress)
+
+    def remove(self, progress):
+        """Stop tracking a transfer and give its final report"""
+        if not self.enabled:
+            return
+        with self.lock:
+            if progress not in self.active:
+                return
+            self.active.remove(progress)
+        self.report(progress, final=True)
+
+    def start(self):
+        if self.enabled and self.thread is None:
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            with self.lock:
+                active = list(self.active)
+            for progress in active:
+                self.report(progress)
+
+    def report(self, progress, final=False):
+        stats = progress.snapshot()
+        if self.mode == 'json':
+            stats['event'] = 'done' if final else 'progress'
+            stream = self.stream or sys.stderr
+            stream.write(json.dumps(stats) + '\n')
+            stream.flush()
+        elif self.mode == 'bar':
+            stream = self.stream or sys.stderr
+            if final:
+                line = (f"{progress.label}: {format_bytes(stats['bytes'])} in "
+                        f"{stats['elapsed_s']:.1f}s ({format_bytes(stats['average_bps'])}/s)")
+            else:
+                line = (f"{progress.label}: {stats['percent']:5.1f}% "
+                        f"{format_bytes(stats['bytes'])}/{format_bytes(stats['total'])} "
+                        f"{format_bytes(stats['rate_bps'])}/s "
+                        f"(avg {format_bytes(stats['smoothed_bps'])}/s) "
+                        f"ETA {format_eta(stats['eta_s'])}")
+            stream.write('\r' + line.ljust(79) + ('\n' if final else ''))
+            stream.flush()
+        elif self.mode == 'log' and not final:
+            print(f"[+] Progress: {progress.label} {stats['percent']:.1f}% "
+                  f"({stats['bytes']}/{stats['total']} bytes) "
+                  f"{format_bytes(stats['smoothed_bps'])}/s "
+                  f"ETA {format_eta(stats['eta_s'])}")
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
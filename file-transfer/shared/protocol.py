@@ -3,13 +3,19 @@ File Transfer Protocol - Shared Utilities
 COSC 450 Final Project
 """
 
+import os
 import struct
+import sys
 import hashlib
 import json
 
+from . import tracing
+
 # Protocol constants
 BUFFER_SIZE = 4096
 HEADER_SIZE = 1024
+SMALL_PAYLOAD_SIZE = 64 * 1024
+SHAPED_CHUNK_SIZE = 256 * 1024
 
 # Message types
 MSG_FILE_HEADER = 1
@@ -18,6 +24,22 @@ MSG_FILE_COMPLETE = 3
 MSG_AUTH_REQUEST = 4
 MSG_AUTH_RESPONSE = 5
 MSG_ERROR = 6
+MSG_HEARTBEAT = 7
+MSG_LIST_REQUEST = 8
+MSG_LIST_RESPONSE = 9
+MSG_DOWNLOAD_REQUEST = 10
+MSG_DOWNLOAD_DATA = 11
+
+# Checksum modes for uploads (MSG_FILE_HEADER 'hash_mode')
+HASH_SHA256 = 'sha256'
+HASH_TREE = 'tree'
+
+
+def is_tls(sock):
+    # ssl is not imported here to keep client startup fast; if nothing
+    # imported it, this cannot be an SSL socket
+    ssl = sys.modules.get('ssl')
+    return bool(ssl) and isinstance(sock, ssl.SSLSocket)
 
 
 class FileTransferProtocol:
@@ -46,34 +68,105 @@ class FileTransferProtocol:
 
     @staticmethod
     def send_message(sock, msg_type, data, metadata=None):
-        """Send a protocol message"""
-        header = FileTransferProtocol.create_header(
-            msg_type, len(data), metadata
-        )
-        sock.sendall(header + data)
+        """Send a protocol message.
+
+        On plain sockets the header and payload go out in one sendmsg
+        without being joined first, so a memoryview payload (e.g. a chunk
+        of a mapped file) is never copied. SSL sockets do not support
+        sendmsg and get the joined bytes.
+        """
+        with tracing.span('encode_header'):
+            header = FileTransferProtocol.create_header(
+                msg_type, len(data), metadata
+            )
+        tls = is_tls(sock)
+        with tracing.span('tls_send' if tls else 'socket_send'):
+            if not data or tls:
+                sock.sendall(header + data)
+                return
+
+            parts = [memoryview(header), memoryview(data).cast('B')]
+            while parts:
+                sent = sock.sendmsg(parts)
+                while parts and sent >= len(parts[0]):
+                    sent -= len(parts[0])
+                    parts.pop(0)
+                if parts:
+                    parts[0] = parts[0][sent:]
 
     @staticmethod
-    def receive_message(sock):
-        """Receive a protocol message safely (FIXED VERSION)"""
+    def send_file_payload(sock, msg_type, file_obj, offset, length, metadata=None,
+                          throttle=None):
+        """Send a message whose payload is a byte range of an open file.
+
+        Uses socket.sendfile, which is zero-copy os.sendfile on plain
+        sockets and falls back to regular sends on SSL sockets. Small
+        ranges go out in one write together with the header instead.
+        With a throttle callable, the range is sent in chunks and
+        throttle(n) is called before each one.
+        """
+        header = FileTransferProtocol.create_header(msg_type, length, metadata)
+        if length <= SMALL_PAYLOAD_SIZE:
+            data = os.pread(file_obj.fileno(), length, offset)
+            if throttle:
+                throttle(length)
+            sock.sendall(header + data)
+            return
+        sock.sendall(header)
+        if not throttle:
+            sock.sendfile(file_obj, offset, length)
+            return
+        end = offset + length
+        while offset < end:
+            n = min(SHAPED_CHUNK_SIZE, end - offset)
+            throttle(n)
+            sock.sendfile(file_obj, offset, n)
+            offset += n
+
+    @staticmethod
+    def receive_header(sock):
+        """Receive and parse a header; returns None if the peer closed"""
         # ✅ Ensure full header read
         header_bytes = b''
-        while len(header_bytes) < HEADER_SIZE:
-            chunk = sock.recv(HEADER_SIZE - len(header_bytes))
-            if not chunk:
-                return None, None, None
-            header_bytes += chunk
+        with tracing.span('tls_recv' if is_tls(sock) else 'socket_recv'):
+            while len(header_bytes) < HEADER_SIZE:
+                chunk = sock.recv(HEADER_SIZE - len(header_bytes))
+                if not chunk:
+                    return None
+                header_bytes += chunk
+
+        with tracing.span('parse_header'):
+            return FileTransferProtocol.parse_header(header_bytes)
+
+    @staticmethod
+    def receive_exactly(sock, size):
+        """Receive exactly size bytes; returns None if the peer closed first"""
+        data = bytearray()
+        with tracing.span('tls_recv' if is_tls(sock) else 'socket_recv'):
+            while len(data) < size:
+                chunk = sock.recv(min(BUFFER_SIZE, size - len(data)))
+                if not chunk:
+                    return None
+                data += chunk
+        return bytes(data)
 
-        header = FileTransferProtocol.parse_header(header_bytes)
+    @staticmethod
+    def receive_message(sock):
+        """Receive a protocol message safely (FIXED VERSION)"""
+        header = FileTransferProtocol.receive_header(sock)
+        if header is None:
+            return None, None, None
 
         # ✅ Ensure full payload read
         payload = b''
         remaining = header['payload_size']
 
-        while remaining > 0:
-            chunk = sock.recv(min(BUFFER_SIZE, remaining))
-            if not chunk:
-                break
-            payload += chunk
-            remaining -= len(chunk)
+        with tracing.span('tls_recv' if is_tls(sock) else 'socket_recv'):
+            while remaining > 0:
+                chunk = sock.recv(min(BUFFER_SIZE, remaining))
+                if not chunk:
+                    break
+                payload += chunk
+                remaining -= len(chunk)
 
         return header['msg_type'], header.get('metadata'), payload
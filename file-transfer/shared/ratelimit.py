@@ -0,0 +1,111 @@
+"""
+Rate Limiting - Shared Utilities
+COSC 450 Final Project
+
+Token buckets for shaping transfer bandwidth, and a weighted fair-share
+scheduler that splits an aggregate rate among the transfers that are
+active at the moment. Rates are in bytes per second; 0 means unlimited.
+
+Buckets are allowed to go into debt: taking more than the available
+tokens succeeds, and the caller sleeps until the debt is paid back. That
+keeps large sends (e.g. a sendfile chunk) in one piece while the average
+rate still converges on the limit.
+"""
+
+import threading
+import time
+
+MIN_BURST = 64 * 1024
+BURST_SECONDS = 0.25
+
+
+class TokenBucket:
+    """Thread-safe token bucket; consume() blocks to hold the rate"""
+
+    def __init__(self, rate=0, burst=None):
+        self.lock = threading.Lock()
+        self.tokens = 0.0
+        self.set_rate(rate, burst)
+
+    def set_rate(self, rate, burst=None):
+        """Change the rate; takes effect for the next reservation"""
+        with self.lock:
+            self.rate = rate
+            self.burst = burst or max(rate * BURST_SECONDS, MIN_BURST)
+            self.tokens = min(self.tokens, self.burst)
+            self.stamp = time.monotonic()
+
+    def reserve(self, n):
+        """Take n tokens now; returns how long the caller should wait"""
+        if not self.rate:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            self.tokens -= n
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def consume(self, n):
+        """Wait until n bytes may be sent (or have been received)"""
+        delay = self.reserve(n)
+        if delay:
+            time.sleep(delay)
+
+
+def throttle(buckets, n):
+    """Consume n from several buckets at once, waiting for the slowest"""
+    delay = max((bucket.reserve(n) for bucket in buckets), default=0.0)
+    if delay:
+        time.sleep(delay)
+
+
+class FairScheduler:
+    """Split an aggregate rate among active flows in proportion to weight.
+
+    Each flow gets its own bucket, re-rated whenever a flow starts, ends
+    or changes weight, so a single bulk transfer cannot take more than
+    its share while others are active, and gets everything once alone.
+    """
+
+    def __init__(self, total_rate=0):
+        self.total_rate = total_rate
+        self.flows = {}  # {key: [weight, bucket]}
+        self.lock = threading.Lock()
+
+    def add(self, key, weight=1.0):
+        """Register a flow and return its bucket"""
+        if weight <= 0:
+            raise ValueError(f"Flow weight must be above 0, not {weight}")
+        with self.lock:
+            bucket = TokenBucket()
+            self.flows[key] = [weight, bucket]
+            self._rebalance()
+            return bucket
+
+    def remove(self, key):
+        with self.lock:
+            if self.flows.pop(key, None) is not None:
+                self._rebalance()
+
+    def set_weight(self, key, weight):
+        if weight <= 0:
+            raise ValueError(f"Flow weight must be above 0, not {weight}")
+        with self.lock:
+            if key in self.flows:
+                self.flows[key][0] = weight
+                self._rebalance()
+
+    def set_total(self, total_rate):
+        with self.lock:
+            self.total_rate = total_rate
+            self._rebalance()
+
+    def _rebalance(self):
+        total_weight = sum(weight for weight, _ in self.flows.values())
+        for weight, bucket in self.flows.values():
+            share = self.total_rate * weight / total_weight if self.total_rate else 0
+            bucket.set_rate(share)
+
+    def __len__(self):
+        return len(self.flows)
@@ -0,0 +1,154 @@
+"""
+Socket Options - Shared Utilities
+COSC 450 Final Project
+
+Named TCP tuning profiles applied to every listening, accepted and client
+socket:
+
+  default      - no options, as before; buffers only if the link is given
+  interactive  - TCP_NODELAY so short chat lines are not held back by
+                 Nagle, and keepalive so a peer lost behind the VPN is
+                 noticed even when nobody is talking
+  bulk         - TCP_NOTSENT_LOWAT so a large send buffer does not turn
+                 into a large queue of unsent data, TCP_CORK around bursts
+                 of protocol messages (see SocketTuning.corked), and a
+                 slower keepalive
+
+Given the link speed and round-trip time, SO_SNDBUF/SO_RCVBUF are sized to
+the bandwidth-delay product. Otherwise they are left alone, because
+setting SO_RCVBUF turns off the kernel's receive buffer autotuning.
+Buffers must be set before connect() or listen() to affect the window
+scale, so servers apply the profile to the listening socket as well as to
+each accepted one.
+
+Options the platform does not have (TCP_CORK is Linux only) are skipped.
+"""
+
+import contextlib
+import socket
+
+SOCKET_PROFILES = {
+    'default': {},
+    'interactive': {
+        'nodelay': True,
+        'keepalive': (30, 10, 3),  # idle seconds, probe interval, probes
+    },
+    'bulk': {
+        'nodelay': False,
+        'cork': True,
+        'notsent_lowat': 128 * 1024,
+        'keepalive': (60, 15, 4),
+    },
+}
+
+MIN_BUFFER = 64 * 1024
+MAX_BUFFER = 64 * 1024 * 1024
+
+
+def bdp_bytes(link_mbps, rtt_ms):
+    """Bandwidth-delay product of a link in bytes, 0 if either is unknown"""
+    if link_mbps <= 0 or rtt_ms <= 0:
+        return 0
+    bdp = int(link_mbps * 1_000_000 / 8 * rtt_ms / 1000)
+    return min(max(bdp, MIN_BUFFER), MAX_BUFFER)
+
+
+def _set(sock, level, name, value):
+    option = getattr(socket, name, None)
+    if option is None:
+        return False
+    try:
+        sock.setsockopt(level, option, value)
+    except OSError:
+        return False
+    return True
+
+
+class SocketTuning:
+    """A resolved socket profile that can be applied to sockets"""
+
+    def __init__(self, profile='default', link_mbps=0, rtt_ms=0):
+        if profile not in SOCKET_PROFILES:
+            raise ValueError(f"Unknown socket profile: {profile}")
+        self.profile = profile
+        self.options = dict(SOCKET_PROFILES[profile])
+        self.buffer_size = bdp_bytes(link_mbps, rtt_ms)
+
+    def apply(self, sock):
+        """Set the profile's options; call before connect() or listen()"""
+        options = self.options
+        if self.buffer_size:
+            _set(sock, socket.SOL_SOCKET, 'SO_SNDBUF', self.buffer_size)
+            _set(sock, socket.SOL_SOCKET, 'SO_RCVBUF', self.buffer_size)
+        if 'nodelay' in options:
+            _set(sock, socket.IPPROTO_TCP, 'TCP_NODELAY', int(options['nodelay']))
+        if 'notsent_lowat' in options:
+            _set(sock, socket.IPPROTO_TCP, 'TCP_NOTSENT_LOWAT', options['notsent_lowat'])
+        if 'keepalive' in options:
+            idle, interval, count = options['keepalive']
+            _set(sock, socket.SOL_SOCKET, 'SO_KEEPALIVE', 1)
+            _set(sock, socket.IPPROTO_TCP, 'TCP_KEEPIDLE', idle)
+            _set(sock, socket.IPPROTO_TCP, 'TCP_KEEPINTVL', interval)
+            _set(sock, socket.IPPROTO_TCP, 'TCP_KEEPCNT', count)
+        return sock
+
+    @contextlib.contextmanager
+    def corked(self, sock):
+        """
+        Hold back partial segments while a burst of messages is sent, so
+        headers and payloads go out in full segments. Uncorking on exit
+        pushes whatever is left, so the last message is not delayed.
+        """
+        cork = self.options.get('cork') and _set(sock, socket.IPPROTO_TCP, 'TCP_CORK', 1)
+        try:
+            yield sock
+        finally:
+            if cork:
+                _set(sock, socket.IPPROTO_TCP, 'TCP_CORK', 0)
+
+    def describe(self):
+        options = self.options
+        parts = [self.profile]
+        if self.buffer_size:
+            parts.append(f"buffers {self.buffer_size // 1024} KB")
+        if options.get('nodelay'):
+            parts.append("nodelay")
+        if options.get('cork'):
+            parts.append("cork")
+        if 'notsent_lowat' in options:
+            parts.append(f"notsent_lowat {options['notsent_lowat'] // 1024} KB")
+        if 'keepalive' in options:
+            parts.append("keepalive {}s/{}s x{}".format(*options['keepalive']))
+        return ', '.join(parts)
+
+
+def add_socket_arguments(parser, default_profile):
+    """--socket-profile, --link-mbps and --rtt-ms, shared by every CLI"""
+    parser.add_argument('--socket-profile', choices=sorted(SOCKET_PROFILES),
+                        default=default_profile,
+                        help=f'TCP tuning profile (default: {default_profile})')
+    parser.add_argument('--link-mbps', type=float, default=0,
+                        help='Link speed in Mbit/s, to size socket buffers (default: unknown)')
+    parser.add_argument('--rtt-ms', type=float, default=0,
+                        help='Round-trip time in ms, to size socket buffers (default: unknown)')
+
+
+def effective_options(sock):
+    """Read back what the kernel actually uses (buffers are clamped and doubled)"""
+    def get(level, name):
+        option = getattr(socket, name, None)
+        if option is None:
+            return None
+        try:
+            return sock.getsockopt(level, option)
+        except OSError:
+            return None
+
+    return {
+        'sndbuf': get(socket.SOL_SOCKET, 'SO_SNDBUF'),
+        'rcvbuf': get(socket.SOL_SOCKET, 'SO_RCVBUF'),
+        'nodelay': get(socket.IPPROTO_TCP, 'TCP_NODELAY'),
+        'notsent_lowat': get(socket.IPPROTO_TCP, 'TCP_NOTSENT_LOWAT'),
+        'keepalive': get(socket.SOL_SOCKET, 'SO_KEEPALIVE'),
+        'keepidle': get(socket.IPPROTO_TCP, 'TCP_KEEPIDLE'),
+    }
@@ -0,0 +1,103 @@
+"""
+Timer Wheel - Shared Utilities
+COSC 450 Final Project
+
+A hashed timing wheel for connection timeouts. One background thread
+advances the wheel every tick and fires expired timers, so a server with
+thousands of idle connections does not need a timer thread or a poll per
+socket. Re-arming a timer (touch) is a single dict write; timers are
+only moved between slots lazily, when their slot comes around.
+"""
+
+import math
+import threading
+import time
+
+
+class TimerWheel:
+    """Hashed timing wheel firing callbacks from a single thread"""
+
+    def __init__(self, tick=0.5, slots=512):
+        self.tick = tick
+        self.slots = [set() for _ in range(slots)]
+        self.timers = {}  # {key: [deadline, callback]}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.current_tick = self._tick_of(time.monotonic())
+
+    def _tick_of(self, when):
+        return math.ceil(when / self.tick)
+
+    def _insert(self, key, deadline):
+        """Put key in the slot for its deadline (lock held)"""
+        tick = max(self._tick_of(deadline), self.current_tick + 1)
+        self.slots[tick % len(self.slots)].add(key)
+
+    def schedule(self, key, delay, callback):
+        """Fire callback() after delay seconds unless touched or cancelled"""
+        deadline = time.monotonic() + delay
+        with self.lock:
+            self.timers[key] = [deadline, callback]
+            self._insert(key, deadline)
+
+    def touch(self, key, delay):
+        """Push an existing timer's deadline to delay seconds from now"""
+        timer = self.timers.get(key)
+        if timer is not None:
+            timer[0] = time.monotonic() + delay
+
+    def cancel(self, key):
+        with self.lock:
+            self.timers.pop(key, None)
+
+    def __len__(self):
+        return len(self.timers)
+
+    def advance(self, now=None):
+        """Fire every timer whose deadline has passed"""
+        now = time.monotonic() if now is None else now
+        target = self._tick_of(now)
+        expired = []
+
+        with self.lock:
+            # Never walk more than one full turn of the wheel
+            first = max(self.current_tick + 1, target - len(self.slots) + 1)
+            for tick in range(first, target + 1):
+                self.current_tick = tick
+                slot = self.slots[tick % len(self.slots)]
+                keys = list(slot)
+                slot.clear()
+                for key in keys:
+                    timer = self.timers.get(key)
+                    if timer is None:
+                        continue
+                    if timer[0] <= now:
+                        del self.timers[key]
+                        expired.append(timer[1])
+                    else:
+                        self._insert(key, timer[0])
+            self.current_tick = max(self.current_tick, target)
+
+        for callback in expired:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[!] Timer callback failed: {e}")
+
+    def start(self):
+        """Run the wheel in a daemon thread"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+        return self
+
+    def _run(self):
+        while not self.stop_event.wait(self.tick):
+            self.advance()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
@@ -0,0 +1,203 @@
+"""
+Transfer Tracing - Shared Utilities
+COSC 450 Final Project
+
+Per-phase timing of uploads: where the time of a slow transfer went
+(checksum, socket or TLS send, server recv, header parsing, disk write,
+...). Code marks a phase with
+
+    with tracing.span('disk_write'):
+        writer.write(payload)
+
+or decorates a function with @tracing.traced('handle_client'). Until
+enable() is called, span() returns one shared do-nothing context manager,
+so a disabled hook costs a global lookup and two empty method calls.
+
+When enabled, each span is timed with perf_counter_ns and kept as a
+Chrome trace event (open the file in chrome://tracing or Perfetto).
+Timestamps are wall-clock based, so client and server traces of the same
+transfer line up when loaded together. Spans nest; besides the events,
+every phase keeps a running count, total and self time (total minus the
+spans nested in it), which is what analyze_results.py charts. Those
+totals are exact even after the event list reaches its cap.
+
+With the client's mapped-file source there is no separate file read:
+pages are read in as the checksum and the socket send touch them, so
+that time shows up in those two phases.
+"""
+
+import functools
+import os
+import threading
+import time
+
+MAX_EVENTS = 200_000
+
+_tracer = None
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'start', 'children')
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.tracer.local.stack.append(self)
+        self.children = 0
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        duration = time.perf_counter_ns() - self.start
+        stack = self.tracer.local.stack
+        stack.pop()
+        if stack:
+            stack[-1].children += duration
+        self.tracer.add(self.name, self.start, duration, duration - self.children)
+        return False
+
+
+class _ThreadState(threading.local):
+    def __init__(self):
+        self.stack = []
+
+
+class Tracer:
+    """Collects spans from every thread of this process"""
+
+    def __init__(self, role, max_events=MAX_EVENTS):
+        self.role = role
+        self.max_events = max_events
+        self.pid = os.getpid()
+        # perf_counter_ns + offset = nanoseconds since the epoch
+        self.offset_ns = time.time_ns() - time.perf_counter_ns()
+        self.lock = threading.Lock()
+        self.local = _ThreadState()
+        self.events = []
+        self.dropped = 0
+        self.totals = {}  # {name: [count, total_ns, self_ns]}
+        self.threads = {}
+
+    def span(self, name):
+        return _Span(self, name)
+
+    def add(self, name, start_ns, duration_ns, self_ns):
+        tid = threading.get_ident()
+        with self.lock:
+            totals = self.totals.get(name)
+            if totals is None:
+                totals = self.totals[name] = [0, 0, 0]
+            totals[0] += 1
+            totals[1] += duration_ns
+            totals[2] += self_ns
+            if tid not in self.threads:
+                self.threads[tid] = threading.current_thread().name
+            if len(self.events) < self.max_events:
+                self.events.append((name, start_ns, duration_ns, tid))
+            else:
+                self.dropped += 1
+
+    def phase_totals(self):
+        """{phase: {count, total_ms, self_ms}}"""
+        with self.lock:
+            return {
+                name: {'count': count, 'total_ms': total / 1e6, 'self_ms': own / 1e6}
+                for name, (count, total, own) in self.totals.items()
+            }
+
+    def to_chrome_trace(self):
+        """The trace as a Chrome trace-event JSON object"""
+        with self.lock:
+            events, threads = list(self.events), dict(self.threads)
+        trace_events = [
+            {'ph': 'M', 'name': 'process_name', 'pid': self.pid, 'tid': 0,
+             'args': {'name': f'{self.role} ({self.pid})'}},
+        ]
+        for tid, thread_name in threads.items():
+            trace_events.append({'ph': 'M', 'name': 'thread_name', 'pid': self.pid,
+                                 'tid': tid, 'args': {'name': thread_name}})
+        for name, start_ns, duration_ns, tid in events:
+            trace_events.append({
+                'ph': 'X', 'name': name, 'cat': self.role,
+                'pid': self.pid, 'tid': tid,
+                # Chrome traces count microseconds
+                'ts': (start_ns + self.offset_ns) / 1000,
+                'dur': duration_ns / 1000,
+            })
+        return {
+            'traceEvents': trace_events,
+            'displayTimeUnit': 'ns',
+            'otherData': {
+                'role': self.role,
+                'dropped_events': self.dropped,
+                'phases': self.phase_totals(),
+            },
+        }
+
+    def export(self, path):
+        import json
+
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_chrome_trace(), f)
+        return path
+
+
+def enable(role, max_events=MAX_EVENTS):
+    """Start tracing in this process; returns the Tracer"""
+    global _tracer
+    _tracer = Tracer(role, max_events)
+    return _tracer
+
+
+def disable():
+    """Stop tracing; returns the Tracer that was active, if any"""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def enabled():
+    return _tracer is not None
+
+
+def span(name):
+    """Context manager timing one phase (no-op unless enabled)"""
+    if _tracer is None:
+        return _NULL_SPAN
+    return _tracer.span(name)
+
+
+def traced(name=None):
+    """Decorator timing every call of a function as one span"""
+    def decorate(func):
+        phase = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            with _tracer.span(phase):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def export(path):
+    """Write the active trace to path; returns False if tracing is off"""
+    if _tracer is None:
+        return False
+    _tracer.export(path)
+    return True
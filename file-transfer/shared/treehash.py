@@ -0,0 +1,120 @@
+"""
+Tree Hash - Shared Utilities
+COSC 450 Final Project
+
+Parallel SHA-256 for large files. The data is split into fixed-size
+blocks, each block is hashed on its own (on a thread pool; hashlib
+releases the GIL for large buffers, so this scales across cores), and a
+binary Merkle tree is built over the block digests. The root identifies
+the whole file, and each block can be checked against its leaf digest on
+its own, e.g. when resuming or re-fetching part of a file.
+
+Leaves and interior nodes are hashed with different one-byte prefixes so
+a node can never be passed off as a block.
+"""
+
+import hashlib
+import os
+
+TREE_BLOCK_SIZE = 4 * 1024 * 1024
+# Block sizes a server accepts from a client (powers of two only)
+MIN_TREE_BLOCK_SIZE = 64 * 1024
+MAX_TREE_BLOCK_SIZE = 64 * 1024 * 1024
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+
+def leaf_digest(block):
+    """Digest of one block (without copying it to add the prefix)"""
+    digest = hashlib.sha256(LEAF_PREFIX)
+    digest.update(block)
+    return digest.digest()
+
+
+def root_digest(leaves):
+    """Merkle root of a list of leaf digests; odd nodes move up unchanged"""
+    level = list(leaves) or [leaf_digest(b'')]
+    while len(level) > 1:
+        parents = [
+            hashlib.sha256(NODE_PREFIX + level[i] + level[i + 1]).digest()
+            for i in range(0, len(level) - 1, 2)
+        ]
+        if len(level) % 2:
+            parents.append(level[-1])
+        level = parents
+    return level[0]
+
+
+def valid_block_size(block_size):
+    """Whether a client-announced block size is safe to hash with"""
+    return (type(block_size) is int
+            and MIN_TREE_BLOCK_SIZE <= block_size <= MAX_TREE_BLOCK_SIZE
+            and block_size & (block_size - 1) == 0)
+
+
+def verify_block(block, leaf_hex):
+    """Check one block against its leaf digest (hex)"""
+    return leaf_digest(block).hex() == leaf_hex
+
+
+def hash_file(path, block_size=TREE_BLOCK_SIZE, workers=4):
+    """Tree-hash a file from disk; returns (root_hex, [leaf_hex, ...])"""
+    size = os.path.getsize(path)
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        def hash_block(offset):
+            return leaf_digest(os.pread(fd, block_size, offset))
+
+        offsets = range(0, size, block_size)
+        if workers > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                leaves = list(pool.map(hash_block, offsets))
+        else:
+            leaves = [hash_block(offset) for offset in offsets]
+    finally:
+        os.close(fd)
+    return root_digest(leaves).hex(), [leaf.hex() for leaf in leaves]
+
+
+class TreeHasher:
+    """Incremental tree hash for data that arrives in pieces.
+
+    Complete blocks are hashed as soon as they fill up, on the given
+    executor if there is one, so verification overlaps the transfer.
+    """
+
+    def __init__(self, block_size=TREE_BLOCK_SIZE, executor=None):
+        if block_size <= 0:
+            raise ValueError(f"Invalid tree block size: {block_size}")
+        self.block_size = block_size
+        self.executor = executor
+        self.pending = bytearray()
+        self.leaves = []  # digests, or futures of digests
+
+    def update(self, data):
+        self.pending += data
+        while len(self.pending) >= self.block_size:
+            block = bytes(self.pending[:self.block_size])
+            del self.pending[:self.block_size]
+            self._add_block(block)
+
+    def _add_block(self, block):
+        if self.executor is not None:
+            self.leaves.append(self.executor.submit(leaf_digest, block))
+        else:
+            self.leaves.append(leaf_digest(block))
+
+    def leaf_digests(self):
+        """Hex digests of every block so far, including a partial last one"""
+        if self.pending:
+            self._add_block(bytes(self.pending))
+            self.pending.clear()
+        return [
+            (leaf.result() if hasattr(leaf, 'result') else leaf).hex()
+            for leaf in self.leaves
+        ]
+
+    def hexdigest(self):
+        """Root hash of everything passed to update()"""
+        return root_digest(bytes.fromhex(h) for h in self.leaf_digests()).hex()
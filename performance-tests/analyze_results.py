@@ -4,26 +4,104 @@
 Performance Results Analysis and Visualization
 
 COSC 450 Final Project - Longyu Tang
+
+Results files are ingested into the results store (results_store.py)
+first. Only files written since the last analysis are parsed, the charts
+use the latest run of each scenario, and the trend chart and regression
+report cover every stored run.
+
+The resource timeline chart plots results/resources.csv (written by
+resource_sampler.py) with the scenario spans of results/logs/timeline.json
+shaded behind it, so a CPU or memory spike can be matched to the test
+that caused it.
+
+The phase breakdown chart reads the Chrome traces in results/traces/
+(file client and server --trace) and shows where each transfer spent its
+time, one bar per trace.
+
+Charts are rendered in a pool of worker processes, one chart method per
+task. --format svg or --fast (PNG at 100 dpi) skips most of the
+rasterizing time that 300 dpi PNGs cost.
 """
 
+import csv
 import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import matplotlib.pyplot as plt
 import numpy as np
 from pathlib import Path
 
+from latency_histogram import PERCENTILES, LatencyHistogram, find_histograms
+from results_store import STORE_NAME, ResultsStore
+
+CHART_METHODS = [
+    'plot_latency_comparison',
+    'plot_throughput_comparison',
+    'plot_file_transfer_performance',
+    'plot_chat_latency',
+    'plot_latency_percentiles',
+    'plot_latency_cdfs',
+    'plot_overhead_analysis',
+    'plot_trends',
+    'plot_resource_timeline',
+    'plot_phase_breakdown',
+]
+
+# Self time of these outer spans is untraced work between the phases
+OUTER_SPANS = {'send_file', 'handle_client'}
+
+# Resource timeline panels: (CSV column, axis label), by source kind
+PROCESS_PANELS = [
+    ('cpu_percent', 'CPU (%)'),
+    ('rss_mb', 'RSS (MB)'),
+    ('fds', 'Open fds'),
+    ('ctx_involuntary_s', 'Involuntary ctx switches/s'),
+]
+INTERFACE_PANELS = [
+    ('rx_bytes_s', 'Received (MB/s)'),
+]
+
+# The analyzer a render worker inherits when the pool forks
+_worker_analyzer = None
+
+
+def _init_render_worker():
+    """Give the forked worker its own store connection"""
+    _worker_analyzer.store = ResultsStore(_worker_analyzer.store.db_path)
+
+
+def _render_chart(method):
+    getattr(_worker_analyzer, method)()
+    return method
+
 
 class ResultsAnalyzer:
-    def __init__(self, results_dir='./results'):
+    def __init__(self, results_dir='./results', chart_format='png', dpi=300):
         self.results_dir = Path(results_dir)
+        self.chart_format = chart_format
+        self.dpi = dpi
+        self.store = ResultsStore(self.results_dir / STORE_NAME)
         self.data = {}
+        self.new_runs = []
         self.load_all_results()
 
     def load_all_results(self):
-        """Load all JSON result files"""
-        for json_file in self.results_dir.glob('*.json'):
-            with open(json_file) as f:
-                scenario = json_file.stem
-                self.data[scenario] = json.load(f)
+        """Store new result files, then load the latest run of each scenario"""
+        self.new_runs = self.store.ingest(self.results_dir)
+        print(f"[+] {len(self.new_runs)} new result files, "
+              f"{self.store.latest_run_id()} runs stored")
+        on_disk = {json_file.stem for json_file in self.results_dir.glob('*.json')}
+        self.data = self.store.latest_documents(on_disk)
+
+    def save_chart(self, name):
+        """Save and close the current figure in the chosen format"""
+        filename = f'{name}.{self.chart_format}'
+        plt.savefig(self.results_dir / filename, dpi=self.dpi)
+        plt.close()
+        print(f"[+] Saved: {filename}")
 
     def plot_latency_comparison(self):
         """Create latency comparison bar chart"""
@@ -62,9 +140,7 @@ class ResultsAnalyzer:
             )
 
         plt.tight_layout()
-        plt.savefig(self.results_dir / 'latency_comparison.png', dpi=300)
-        plt.close()
-        print("[+] Saved: latency_comparison.png")
+        self.save_chart('latency_comparison')
 
     def plot_throughput_comparison(self):
         """Create throughput comparison bar chart"""
@@ -102,9 +178,7 @@ class ResultsAnalyzer:
             )
 
         plt.tight_layout()
-        plt.savefig(self.results_dir / 'throughput_comparison.png', dpi=300)
-        plt.close()
-        print("[+] Saved: throughput_comparison.png")
+        self.save_chart('throughput_comparison')
 
     def plot_file_transfer_performance(self):
         """Create file transfer performance chart"""
@@ -142,9 +216,110 @@ class ResultsAnalyzer:
         plt.legend(fontsize=10)
         plt.grid(alpha=0.3)
         plt.tight_layout()
-        plt.savefig(self.results_dir / 'file_transfer_performance.png', dpi=300)
-        plt.close()
-        print("[+] Saved: file_transfer_performance.png")
+        self.save_chart('file_transfer_performance')
+
+    def plot_chat_latency(self):
+        """Create chat broadcast latency percentile chart"""
+        percentiles = ['p50', 'p90', 'p99', 'p999']
+        scenarios = []
+        values = []
+
+        for scenario, data in sorted(self.data.items()):
+            if 'chat' in scenario and 'chat_latency' in data.get('tests', {}):
+                lat = data['tests']['chat_latency']
+                scenarios.append(scenario.replace('_', ' ').title())
+                values.append([lat.get(p, 0) for p in percentiles])
+
+        if not scenarios:
+            print("[!] No chat load results found, skipping chat latency plot.")
+            return
+
+        x = np.arange(len(scenarios))
+        width = 0.8 / len(percentiles)
+
+        plt.figure(figsize=(10, 6))
+        for i, pct in enumerate(percentiles):
+            plt.bar(
+                x + i * width,
+                [v[i] for v in values],
+                width,
+                label=pct,
+            )
+
+        plt.xticks(x + width * (len(percentiles) - 1) / 2, scenarios)
+        plt.xlabel('Configuration', fontsize=12)
+        plt.ylabel('Broadcast Latency (ms)', fontsize=12)
+        plt.title('Chat Broadcast Latency Percentiles', fontsize=14, fontweight='bold')
+        plt.legend(fontsize=10)
+        plt.grid(axis='y', alpha=0.3)
+        plt.tight_layout()
+        self.save_chart('chat_latency')
+
+    def latency_histograms(self):
+        """Histograms in the results, grouped by test: {test: {label: histogram}}"""
+        groups = {}
+        for scenario, data in sorted(self.data.items()):
+            for name, lat in find_histograms(data.get('tests', {})).items():
+                test, _, sub = name.partition('/')
+                label = scenario.replace('_', ' ').title()
+                if sub:
+                    label += f' {sub}'
+                groups.setdefault(test, {})[label] = LatencyHistogram.from_dict(
+                    lat['histogram']
+                )
+        return groups
+
+    def plot_latency_percentiles(self):
+        """Create p50/p90/p99/p999 charts, one per test with a histogram"""
+        groups = self.latency_histograms()
+        if not groups:
+            print("[!] No latency histograms found, skipping percentile plots.")
+            return
+
+        for test, histograms in groups.items():
+            labels = list(histograms)
+            x = np.arange(len(labels))
+            width = 0.8 / len(PERCENTILES)
+
+            plt.figure(figsize=(max(10, 2 * len(labels)), 6))
+            for i, (name, pct) in enumerate(PERCENTILES.items()):
+                plt.bar(
+                    x + i * width,
+                    [histograms[label].percentile(pct) for label in labels],
+                    width,
+                    label=name,
+                )
+
+            plt.xticks(x + width * (len(PERCENTILES) - 1) / 2, labels,
+                       rotation=20, ha='right')
+            plt.yscale('log')
+            plt.xlabel('Scenario', fontsize=12)
+            plt.ylabel('Latency (ms, log scale)', fontsize=12)
+            plt.title(f"{test.replace('_', ' ').title()} Percentiles",
+                      fontsize=14, fontweight='bold')
+            plt.legend(fontsize=10)
+            plt.grid(axis='y', alpha=0.3)
+            plt.tight_layout()
+            self.save_chart(f'percentiles_{test}')
+
+    def plot_latency_cdfs(self):
+        """Create latency CDF charts, one per test with a histogram"""
+        for test, histograms in self.latency_histograms().items():
+            plt.figure(figsize=(10, 6))
+            for label, histogram in histograms.items():
+                values, fractions = zip(*histogram.cdf())
+                plt.step(values, fractions, where='post', linewidth=2, label=label)
+
+            plt.xscale('log')
+            plt.ylim(0, 1.01)
+            plt.xlabel('Latency (ms, log scale)', fontsize=12)
+            plt.ylabel('Fraction of Samples', fontsize=12)
+            plt.title(f"{test.replace('_', ' ').title()} CDF",
+                      fontsize=14, fontweight='bold')
+            plt.legend(fontsize=10)
+            plt.grid(alpha=0.3, which='both')
+            plt.tight_layout()
+            self.save_chart(f'cdf_{test}')
 
     def plot_overhead_analysis(self):
         """Calculate and plot VPN overhead"""
@@ -193,9 +368,167 @@ class ResultsAnalyzer:
             )
 
         plt.tight_layout()
-        plt.savefig(self.results_dir / 'vpn_overhead.png', dpi=300)
-        plt.close()
-        print("[+] Saved: vpn_overhead.png")
+        self.save_chart('vpn_overhead')
+
+    def plot_trends(self):
+        """Create throughput trend chart across stored runs, marking regressions"""
+        metrics = [(test, name) for test, name in self.store.throughput_metrics()
+                   if name == 'value']
+        series = {m: self.store.series(*m) for m in metrics}
+        series = {m: s for m, s in series.items()
+                  if any(len(e['values']) > 1 for e in s.values())}
+        if not series:
+            print("[!] Fewer than two runs of any throughput test, skipping trend plot.")
+            return
+
+        flagged = {(r['scenario'], r['metric'], r['run_id'])
+                   for r in self.store.regressions()}
+        fig, axes = plt.subplots(len(series), 1, figsize=(12, 4 * len(series)),
+                                 squeeze=False)
+        for ax, ((test, name), by_scenario) in zip(axes[:, 0], series.items()):
+            for scenario, entry in by_scenario.items():
+                runs = np.arange(1, len(entry['values']) + 1)
+                ax.plot(runs, entry['values'], marker='o', linewidth=2,
+                        label=scenario.replace('_', ' ').title())
+                if (scenario, f'{test}/{name}', entry['run_ids'][-1]) in flagged:
+                    ax.plot(runs[-1], entry['values'][-1], 'rx', markersize=14,
+                            markeredgewidth=3)
+            unit = self.store.db.execute(
+                'SELECT unit FROM metrics WHERE test = ? AND name = ? LIMIT 1',
+                (test, name)
+            ).fetchone()[0]
+            ax.set_title(f"{test.replace('_', ' ').title()} by Run "
+                         "(x = regression)", fontsize=12, fontweight='bold')
+            ax.set_xlabel('Run', fontsize=10)
+            ax.set_ylabel(unit or '', fontsize=10)
+            ax.legend(fontsize=9)
+            ax.grid(alpha=0.3)
+
+        plt.tight_layout()
+        self.save_chart('throughput_trend')
+
+    def load_resource_samples(self):
+        """Samples of resources.csv as {source: {column: array}}, times from 0"""
+        path = self.results_dir / 'resources.csv'
+        if not path.exists():
+            return {}, None
+        rows = {}
+        with path.open(newline='') as f:
+            for row in csv.DictReader(f):
+                rows.setdefault(row['source'], []).append(row)
+        if not rows:
+            return {}, None
+
+        start = min(float(r[0]['time']) for r in rows.values())
+        samples = {}
+        for source, source_rows in rows.items():
+            columns = {'time': np.array([float(r['time']) - start for r in source_rows])}
+            for column in source_rows[0]:
+                if column in ('time', 'source'):
+                    continue
+                values = [r[column] for r in source_rows]
+                if all(values):
+                    columns[column] = np.array(values, dtype=float)
+            samples[source] = columns
+        return samples, start
+
+    def plot_resource_timeline(self):
+        """Create resource usage timeline with the test scenarios shaded"""
+        samples, start = self.load_resource_samples()
+        if not samples:
+            print("[!] No resource samples found, skipping resource timeline.")
+            return
+
+        timeline = []
+        timeline_file = self.results_dir / 'logs' / 'timeline.json'
+        if timeline_file.exists():
+            with timeline_file.open() as f:
+                timeline = json.load(f)
+
+        processes = {s: c for s, c in samples.items() if not s.startswith('net:')}
+        # Interfaces that carried no traffic only clutter the chart
+        interfaces = {s: c for s, c in samples.items()
+                      if s.startswith('net:') and c.get('rx_bytes_s', np.zeros(1)).any()}
+        panels = [(p, processes) for p in PROCESS_PANELS if processes]
+        panels += [(p, interfaces) for p in INTERFACE_PANELS if interfaces]
+        if not panels:
+            print("[!] Resource samples are empty, skipping resource timeline.")
+            return
+
+        fig, axes = plt.subplots(len(panels), 1, figsize=(14, 2.8 * len(panels)),
+                                 sharex=True, squeeze=False)
+        colors = plt.cm.tab10.colors
+        for ax, ((column, label), sources) in zip(axes[:, 0], panels):
+            for i, span in enumerate(timeline):
+                ax.axvspan(span['start'] - start, span['end'] - start,
+                           color=colors[i % len(colors)], alpha=0.12)
+            for source, columns in sources.items():
+                values = columns[column]
+                if column == 'rx_bytes_s':
+                    values = values / 1e6
+                ax.plot(columns['time'], values, linewidth=1.2, label=source)
+            ax.set_ylabel(label, fontsize=9)
+            ax.grid(alpha=0.3)
+            ax.legend(fontsize=7, loc='upper right')
+
+        # Scenario names along the top panel
+        top = axes[0, 0]
+        for i, span in enumerate(timeline):
+            top.text(span['start'] - start, 1.02, span['scenario'],
+                     transform=top.get_xaxis_transform(), fontsize=7, rotation=30,
+                     color=colors[i % len(colors)], ha='left', va='bottom')
+        top.set_title('Server and Interface Resources During the Test Run',
+                      fontsize=12, fontweight='bold', pad=40 if timeline else 6)
+        axes[-1, 0].set_xlabel('Seconds since sampling started', fontsize=10)
+
+        plt.tight_layout()
+        self.save_chart('resource_timeline')
+
+    def load_phase_traces(self):
+        """Per-phase self time (ms) of every trace in results/traces"""
+        traces = {}
+        for trace_file in sorted((self.results_dir / 'traces').glob('*.json')):
+            with trace_file.open() as f:
+                phases = json.load(f).get('otherData', {}).get('phases')
+            if not phases:
+                continue
+            times = {}
+            for phase, totals in phases.items():
+                key = '(other)' if phase in OUTER_SPANS else phase
+                times[key] = times.get(key, 0) + totals['self_ms']
+            traces[trace_file.stem] = times
+        return traces
+
+    def plot_phase_breakdown(self):
+        """Create per-phase time breakdown of traced transfers"""
+        traces = self.load_phase_traces()
+        if not traces:
+            print("[!] No transfer traces found, skipping phase breakdown.")
+            return
+
+        totals = {}
+        for times in traces.values():
+            for phase, ms in times.items():
+                totals[phase] = totals.get(phase, 0) + ms
+        phases = sorted(totals, key=totals.get, reverse=True)
+        names = [name.replace('_', ' ') for name in traces]
+
+        fig, ax = plt.subplots(figsize=(12, 1.2 + 0.6 * len(traces)))
+        colors = plt.cm.tab20.colors
+        left = np.zeros(len(traces))
+        for i, phase in enumerate(phases):
+            widths = np.array([times.get(phase, 0) for times in traces.values()])
+            ax.barh(names, widths, left=left, label=phase, color=colors[i % len(colors)])
+            left += widths
+
+        ax.invert_yaxis()
+        ax.set_xlabel('Time (ms, self time per phase)', fontsize=12)
+        ax.set_title('Where Transfers Spend Their Time', fontsize=14, fontweight='bold')
+        ax.legend(fontsize=8, loc='center left', bbox_to_anchor=(1.01, 0.5))
+        ax.grid(axis='x', alpha=0.3)
+        # Leave room on the right for the legend
+        plt.tight_layout(rect=(0, 0, 0.85, 1))
+        self.save_chart('phase_breakdown')
 
     def generate_summary_report(self):
         """Generate text summary of results"""
@@ -218,6 +551,10 @@ class ResultsAnalyzer:
                     f.write(f"  Average: {lat['avg']:.2f} ms\n")
                     f.write(f"  Min: {lat['min']:.2f} ms\n")
                     f.write(f"  Max: {lat['max']:.2f} ms\n")
+                    if 'p99' in lat:
+                        f.write(f"  p99: {lat['p99']:.2f} ms\n")
+                    if 'p999' in lat:
+                        f.write(f"  p99.9: {lat['p999']:.2f} ms\n")
                     f.write(f"  Std Dev: {lat['stdev']:.2f} ms\n\n")
 
                 if 'throughput' in tests:
@@ -230,6 +567,38 @@ class ResultsAnalyzer:
                     pl = tests['packet_loss']
                     f.write(f"Packet Loss: {pl['value']:.2f}%\n\n")
 
+                if 'chat_latency' in tests:
+                    lat = tests['chat_latency']
+                    f.write("Chat Broadcast Latency:\n")
+                    f.write(f"  p50: {lat['p50']:.2f} ms\n")
+                    f.write(f"  p90: {lat['p90']:.2f} ms\n")
+                    f.write(f"  p99: {lat['p99']:.2f} ms\n")
+                    f.write(f"  Max: {lat['max']:.2f} ms\n\n")
+
+                if 'chat_throughput' in tests:
+                    tp = tests['chat_throughput']
+                    f.write(
+                        f"Chat Delivery: {tp['value']:.0f} {tp['unit']} "
+                        f"({tp['delivered']}/{tp['expected']} delivered)\n\n"
+                    )
+
+                if 'server_resources' in tests and tests['server_resources']:
+                    res = tests['server_resources']
+                    f.write(
+                        f"Server CPU: {res['cpu_percent_avg']:.1f}% avg, "
+                        f"RSS: {res['rss_mb_max']:.1f} MB max\n\n"
+                    )
+
+                if 'microbench' in tests:
+                    f.write("Microbenchmarks (median per call):\n")
+                    for name, bench in tests['microbench'].items():
+                        f.write(f"  {name}: {bench['median_us']:.2f} us")
+                        if 'change_percent' in bench:
+                            f.write(f" (fastest round {bench['change_percent']:+.1f}% "
+                                    "vs baseline)")
+                        f.write("\n")
+                    f.write("\n")
+
                 if 'file_transfer' in tests:
                     f.write("File Transfer Results:\n")
                     for transfer in tests['file_transfer']:
@@ -239,18 +608,61 @@ class ResultsAnalyzer:
                             f"({transfer['throughput_mbps']:.2f} Mbps)\n"
                         )
 
+            regressions = self.store.regressions()
+            f.write("\nTHROUGHPUT REGRESSIONS (latest run vs earlier runs)\n")
+            f.write("-" * 70 + "\n")
+            for r in regressions:
+                f.write(
+                    f"  {r['scenario']} {r['metric']}: {r['latest']:.2f} vs "
+                    f"{r['baseline']:.2f}, -{r['drop_percent']:.1f}% "
+                    f"(limit {r['limit_percent']:.1f}%, build {r['build']})\n"
+                )
+            if not regressions:
+                f.write("  None\n")
+
             f.write("\n" + "=" * 70 + "\n")
 
         print(f"[+] Summary report saved: {report_file}")
+        for r in regressions:
+            print(f"[!] Regression: {r['scenario']} {r['metric']} "
+                  f"-{r['drop_percent']:.1f}%")
+
+    def render_charts(self, jobs):
+        """Run every chart method, in worker processes when jobs > 1"""
+        if jobs <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+            for method in CHART_METHODS:
+                getattr(self, method)()
+            return
+
+        global _worker_analyzer
+        _worker_analyzer = self
+        # Workers open their own connection; a forked one is not safe to share
+        self.store.close()
+        try:
+            with ProcessPoolExecutor(
+                max_workers=min(jobs, len(CHART_METHODS)),
+                mp_context=multiprocessing.get_context('fork'),
+                initializer=_init_render_worker,
+            ) as pool:
+                for _ in pool.map(_render_chart, CHART_METHODS):
+                    pass
+        finally:
+            _worker_analyzer = None
+            self.store = ResultsStore(self.store.db_path)
+
+    def generate_all_visualizations(self, force=False, jobs=1):
+        """Generate all charts and reports, unless nothing changed since last time"""
+        latest = str(self.store.latest_run_id())
+        report = self.results_dir / 'performance_summary.txt'
+        if (not force and not self.new_runs and report.exists()
+                and self.store.get_state('analyzed_through') == latest):
+            print("[+] No new results since the last analysis (use --force to redraw)")
+            return
 
-    def generate_all_visualizations(self):
-        """Generate all charts and reports"""
         print("\n=== Generating Performance Visualizations ===\n")
-        self.plot_latency_comparison()
-        self.plot_throughput_comparison()
-        self.plot_file_transfer_performance()
-        self.plot_overhead_analysis()
+        self.render_charts(jobs)
         self.generate_summary_report()
+        self.store.set_state('analyzed_through', latest)
         print("\n[+] All visualizations complete!")
 
 
@@ -259,9 +671,19 @@ if __name__ == '__main__':
 
     parser = argparse.ArgumentParser(description='Analyze Performance Results')
     parser.add_argument('--dir', default='./results', help='Results directory')
+    parser.add_argument('--force', action='store_true',
+                        help='Redraw charts even if no results are new')
+    parser.add_argument('--format', choices=['png', 'svg'], default='png',
+                        help='Chart file format (default: png)')
+    parser.add_argument('--dpi', type=int, default=300,
+                        help='Resolution of PNG charts (default: 300)')
+    parser.add_argument('--fast', action='store_true',
+                        help='Quick look: PNG at 100 dpi')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+                        help='Chart rendering processes (default: CPU count)')
 
     args = parser.parse_args()
 
-    analyzer = ResultsAnalyzer(args.dir)
-    analyzer.generate_all_visualizations()
+    analyzer = ResultsAnalyzer(args.dir, args.format, 100 if args.fast else args.dpi)
+    analyzer.generate_all_visualizations(args.force, args.jobs)
 
@@ -2,8 +2,8 @@
 """
 Application-level performance test for the file transfer application.
 
-This script measures end-to-end transfer time for a 5 MB test file
-under four scenarios:
+This script measures end-to-end transfer time for a 5 MB test file,
+over several runs kept as a latency histogram, under four scenarios:
 
 A. Baseline   (no VPN,  no SSL)  -> 127.0.0.1:9997
 B. VPN only   (VPN,    no SSL)   -> 10.8.0.1:9997
@@ -11,9 +11,14 @@ C. SSL only   (no VPN,  SSL)     -> 127.0.0.1:9999
 D. VPN + SSL  (VPN,     SSL)     -> 10.8.0.1:9999
 
 The script assumes that the corresponding file-transfer servers are
-already running in another terminal.
-
-Results are written to a JSON file for later analysis.
+already running in another terminal. With --emulate PRESET, the VPN
+scenarios (B and D) go to the local servers through `wan_emulator.py`
+instead, so no live tunnel is needed.
+
+Results are written to a JSON file for later analysis. With --trace, the
+client of each scenario also writes a Chrome trace of its last run to
+results/traces/<scenario>.client.json, which analyze_results.py breaks
+down by transfer phase.
 """
 
 import argparse
@@ -23,6 +28,9 @@ import subprocess
 import time
 from pathlib import Path
 
+from latency_histogram import LatencyHistogram
+from wan_emulator import LINK_PRESETS, start_emulator_process
+
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 FILE_TRANSFER_DIR = PROJECT_ROOT / "file-transfer"
@@ -50,26 +58,38 @@ def ensure_test_file(size_mb: int = 5) -> None:
     print("[+] Test file created.")
 
 
-def run_scenario(name: str, cmd: list[str]) -> dict:
-    """Run a single scenario and return a result dict."""
+def run_scenario(name: str, cmd: list[str], runs: int = 1) -> dict:
+    """Run a single scenario `runs` times and return a result dict."""
     print(f"\n=== Running scenario {name} ===")
     print("[+] Command:", " ".join(cmd))
 
-    start = time.perf_counter()
-    completed = subprocess.run(cmd)
-    elapsed = time.perf_counter() - start
-
-    success = completed.returncode == 0
-
-    print(f"[+] Scenario {name} finished with return code {completed.returncode}")
-    print(f"[+] Elapsed time: {elapsed:.3f} s")
+    times = LatencyHistogram()
+    return_code = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run(cmd)
+        elapsed = time.perf_counter() - start
+        # A failed run ends early, so it would only flatter the timings
+        if completed.returncode == 0:
+            times.record(elapsed * 1000)
+        else:
+            return_code = completed.returncode
+
+    success = return_code == 0
+
+    print(f"[+] Scenario {name} finished with return code {return_code}")
+    if times.count:
+        print(f"[+] Elapsed time: {times.mean() / 1000:.3f} s avg, "
+              f"p99 {times.percentile(99) / 1000:.3f} s over {times.count} runs")
     print(f"[+] Success: {success}")
 
     return {
         "name": name,
         "command": cmd,
-        "elapsed_seconds": elapsed,
-        "return_code": completed.returncode,
+        "elapsed_seconds": times.mean() / 1000,
+        "runs": runs,
+        "transfer_time": times.summary(),
+        "return_code": return_code,
         "success": success,
     }
 
@@ -83,10 +103,36 @@ def main() -> None:
         default="results/app_performance.json",
         help="Path to output JSON file (default: results/app_performance.json)",
     )
+    parser.add_argument(
+        "--emulate",
+        choices=sorted(LINK_PRESETS),
+        default=None,
+        help="Run the VPN scenarios over an emulated link to 127.0.0.1 instead of 10.8.0.1",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="Write a per-phase client trace of each scenario to results/traces/",
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=5,
+        help="Transfers per scenario (default: 5)",
+    )
     args = parser.parse_args()
 
     ensure_test_file(size_mb=5)
 
+    vpn_host, vpn_ports = "10.8.0.1", {9997: 9997, 9999: 9999}
+    emulators = []
+    if args.emulate:
+        vpn_host = "127.0.0.1"
+        for port in vpn_ports:
+            proc, vpn_ports[port] = start_emulator_process(port, args.emulate)
+            emulators.append(proc)
+        print(f"[+] VPN scenarios use the emulated '{args.emulate}' link")
+
     scenarios = [
         {
             "name": "A_baseline_no_vpn_no_ssl",
@@ -99,6 +145,7 @@ def main() -> None:
                 "9997",
                 "--file",
                 str(TEST_FILE),
+                "--no-progress",
             ],
         },
         {
@@ -107,11 +154,12 @@ def main() -> None:
                 "python3",
                 str(FILE_TRANSFER_DIR / "client" / "file_client.py"),
                 "--host",
-                "10.8.0.1",
+                vpn_host,
                 "--port",
-                "9997",
+                str(vpn_ports[9997]),
                 "--file",
                 str(TEST_FILE),
+                "--no-progress",
             ],
         },
         {
@@ -125,6 +173,7 @@ def main() -> None:
                 "9999",
                 "--file",
                 str(TEST_FILE),
+                "--no-progress",
             ],
         },
         {
@@ -133,29 +182,45 @@ def main() -> None:
                 "python3",
                 str(FILE_TRANSFER_DIR / "client" / "file_client_ssl.py"),
                 "--host",
-                "10.8.0.1",
+                vpn_host,
                 "--port",
-                "9999",
+                str(vpn_ports[9999]),
                 "--file",
                 str(TEST_FILE),
+                "--no-progress",
             ],
         },
     ]
 
+    if args.trace:
+        trace_dir = Path(args.output).parent / "traces"
+        trace_dir.mkdir(parents=True, exist_ok=True)
+        for scenario in scenarios:
+            scenario["cmd"] += ["--trace", str(trace_dir / f"{scenario['name']}.client.json")]
+
     results: list[dict] = []
 
     print("=== Application Performance Test ===")
     print(f"[+] Using test file: {TEST_FILE}")
 
-    for scenario in scenarios:
-        result = run_scenario(scenario["name"], scenario["cmd"])
-        results.append(result)
+    try:
+        for scenario in scenarios:
+            result = run_scenario(scenario["name"], scenario["cmd"], args.runs)
+            results.append(result)
+    finally:
+        for proc in emulators:
+            proc.terminate()
+            proc.wait()
 
     # Build output structure
     output_data = {
         "test_file": str(TEST_FILE),
         "file_size_bytes": TEST_FILE.stat().st_size,
+        "emulated_link": args.emulate,
         "scenarios": results,
+        "tests": {
+            "transfer_time": {r["name"]: r["transfer_time"] for r in results if r["success"]},
+        },
     }
 
     output_path = Path(args.output)
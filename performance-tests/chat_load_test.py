@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+Load test for the multi-client chat server.
+
+Starts a chat server on loopback, opens many simulated clients that speak
+the same line protocol as `ChatClient`, and has a subset of them send
+messages at a fixed rate. Every message carries its send time, so each
+receiving client can measure end-to-end broadcast latency.
+
+Clients are spread over several worker processes, each driving its share
+of sockets with a selector loop, so the load generator itself does not
+become the bottleneck. Server CPU and RSS are sampled from /proc while the
+test runs.
+
+With --emulate PRESET, clients reach the server through `wan_emulator.py`
+(e.g. the `vpn` preset), so the latency includes a modelled VPN link.
+
+With --profile FILE, the server's stack sampler runs while messages are
+sent (started and dumped through its control socket) and the folded
+stacks go to FILE. The sampler's own CPU overhead is recorded as
+`server_profile`; compare `server_resources` with a run without
+--profile to see the total cost.
+
+Results are written to a JSON file that `ResultsAnalyzer` picks up
+(any results file with "chat" in its name).
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import selectors
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from latency_histogram import LatencyHistogram
+from resource_sampler import ProcessReader
+from wan_emulator import LINK_PRESETS, start_emulator_process
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+CHAT_SERVER = PROJECT_ROOT / "chat" / "server" / "chat_server.py"
+
+# Messages look like "LT <monotonic send time in ns>"
+STAMP_MARKER = ": LT "
+
+
+def free_port() -> int:
+    """Ask the kernel for an unused loopback port."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def raise_fd_limit() -> None:
+    """Allow this process (and its children) to open thousands of sockets."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+class ServerMonitor(threading.Thread):
+    """Sample CPU% and RSS of the server process from /proc."""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples: list[dict] = []
+        self.stop_event = threading.Event()
+
+    def run(self) -> None:
+        try:
+            reader = ProcessReader(self.pid)
+        except OSError:
+            return
+        try:
+            last = reader.read()
+            last_time = time.monotonic()
+            while not self.stop_event.wait(self.interval):
+                current = reader.read()
+                now = time.monotonic()
+                rates = reader.rates(last, current, now - last_time)
+                self.samples.append({
+                    "time": now,
+                    "cpu_percent": rates["cpu_percent"],
+                    "rss_mb": rates["rss_mb"],
+                })
+                last, last_time = current, now
+        except OSError:
+            pass
+        finally:
+            reader.close()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        self.join()
+
+    def summary(self, start: float, end: float) -> dict:
+        window = [s for s in self.samples if start <= s["time"] <= end]
+        window = window or self.samples
+        if not window:
+            return {}
+        cpu = [s["cpu_percent"] for s in window]
+        rss = [s["rss_mb"] for s in window]
+        return {
+            "cpu_percent_avg": statistics.mean(cpu),
+            "cpu_percent_max": max(cpu),
+            "rss_mb_avg": statistics.mean(rss),
+            "rss_mb_max": max(rss),
+            "samples": len(window),
+        }
+
+
+def load_worker(worker_id: int, port: int, num_clients: int, num_senders: int,
+                rate: float, duration: float, drain: float,
+                barrier, results) -> None:
+    """Drive a shard of simulated clients and report what they observed."""
+    raise_fd_limit()
+    selector = selectors.DefaultSelector()
+    buffers: dict[socket.socket, bytearray] = {}
+    clients: list[socket.socket] = []
+    errors = 0
+
+    for i in range(num_clients):
+        try:
+            sock = socket.create_connection(("127.0.0.1", port), timeout=10)
+            sock.sendall(f"load{worker_id}_{i}\n".encode("utf-8"))
+            sock.setblocking(False)
+        except OSError:
+            errors += 1
+            continue
+        clients.append(sock)
+        buffers[sock] = bytearray()
+        selector.register(sock, selectors.EVENT_READ)
+
+    senders = clients[:num_senders]
+    latencies = LatencyHistogram()
+    delivered = 0
+    sent = 0
+
+    def drain_socket(sock: socket.socket, record: bool) -> None:
+        nonlocal delivered, errors
+        try:
+            data = sock.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            errors += 1
+            selector.unregister(sock)
+            return
+
+        buf = buffers[sock]
+        buf += data
+        if b"\n" not in data:
+            return
+        *lines, rest = buf.split(b"\n")
+        buffers[sock] = bytearray(rest)
+        if not record:
+            return
+
+        now = time.monotonic_ns()
+        for line in lines:
+            marker = line.rfind(STAMP_MARKER.encode())
+            if marker < 0:
+                continue
+            try:
+                sent_ns = int(line[marker + len(STAMP_MARKER):])
+            except ValueError:
+                continue
+            latencies.record((now - sent_ns) / 1e6)
+            delivered += 1
+
+    def poll(timeout: float, record: bool) -> None:
+        for key, _ in selector.select(timeout):
+            drain_socket(key.fileobj, record)
+
+    # Let join notifications settle, then start all workers together
+    settle_end = time.monotonic() + 1.0
+    while time.monotonic() < settle_end:
+        poll(0.05, record=False)
+    barrier.wait()
+
+    interval = 1.0 / rate if rate > 0 else None
+    start = time.monotonic()
+    end = start + duration
+    next_send = [start + (i / max(1, len(senders))) * (interval or 0)
+                 for i in range(len(senders))]
+
+    while True:
+        now = time.monotonic()
+        if now >= end:
+            break
+        if interval:
+            for i, sock in enumerate(senders):
+                if next_send[i] <= now:
+                    message = f"LT {time.monotonic_ns()}\n".encode("utf-8")
+                    try:
+                        sock.send(message)
+                        sent += 1
+                    except OSError:
+                        errors += 1
+                    next_send[i] += interval
+            timeout = max(0.0, min(next_send) - time.monotonic()) if senders else 0.05
+        else:
+            timeout = 0.05
+        poll(min(timeout, 0.05), record=True)
+
+    # Give in-flight broadcasts time to arrive
+    drain_end = time.monotonic() + drain
+    while time.monotonic() < drain_end:
+        poll(0.05, record=True)
+
+    for sock in clients:
+        sock.close()
+
+    results.put({
+        "worker": worker_id,
+        "clients": len(clients),
+        "senders": len(senders),
+        "sent": sent,
+        "delivered": delivered,
+        "errors": errors,
+        "latency_histogram": latencies.to_dict(),
+    })
+
+
+def profiler_command(path: str, command: str) -> str:
+    """Send one command to a server's profiler control socket"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(10)
+        sock.connect(path)
+        sock.sendall(command.encode() + b"\n")
+        reply = b""
+        while chunk := sock.recv(65536):
+            reply += chunk
+    return reply.decode()
+
+
+def run_load_test(clients: int, senders: int, rate: float, duration: float,
+                  processes: int, drain: float, emulate: str | None = None,
+                  profile: str | None = None) -> dict:
+    """Start a server, run all workers against it and aggregate results."""
+    raise_fd_limit()
+    port = free_port()
+
+    cmd = [sys.executable, str(CHAT_SERVER), "--host", "127.0.0.1",
+           "--port", str(port), "--join-replay", "0"]
+    control = None
+    if profile:
+        control = os.path.join(tempfile.mkdtemp(prefix="chat-profile-"), "control.sock")
+        cmd += ["--profile-control", control]
+
+    print(f"[+] Starting chat server on 127.0.0.1:{port}")
+    server = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    profile_status = None
+
+    emulator = None
+    try:
+        # Wait until the server accepts connections
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+
+        client_port = port
+        if emulate:
+            emulator, client_port = start_emulator_process(port, emulate)
+            print(f"[+] Clients connect through the emulated '{emulate}' link "
+                  f"on port {client_port}")
+
+        monitor = ServerMonitor(server.pid)
+        monitor.start()
+
+        ctx = multiprocessing.get_context("fork")
+        barrier = ctx.Barrier(processes + 1)
+        results = ctx.Queue()
+        workers = []
+        for w in range(processes):
+            shard_clients = clients // processes + (1 if w < clients % processes else 0)
+            shard_senders = senders // processes + (1 if w < senders % processes else 0)
+            proc = ctx.Process(
+                target=load_worker,
+                args=(w, client_port, shard_clients, shard_senders,
+                      rate, duration, drain, barrier, results),
+            )
+            proc.start()
+            workers.append(proc)
+
+        print(f"[+] Connecting {clients} clients over {processes} processes ...")
+        barrier.wait()
+        start = time.monotonic()
+        if control:
+            profiler_command(control, "start")
+        print(f"[+] Sending for {duration:.0f}s at {rate} msg/s per sender "
+              f"({senders} senders)")
+
+        worker_results = [results.get() for _ in workers]
+        for proc in workers:
+            proc.join()
+        end = start + duration
+        monitor.stop()
+        if control:
+            profile_status = dict(
+                field.split("=", 1) for field in profiler_command(control, "stop").split()
+            )
+            profiler_command(control, f"dump {Path(profile).resolve()}")
+    finally:
+        if emulator:
+            emulator.terminate()
+            emulator.wait()
+        server.terminate()
+        server.wait()
+
+    # Workers send histograms, so percentiles cover every worker's samples
+    latencies = LatencyHistogram()
+    for r in worker_results:
+        latencies.merge(LatencyHistogram.from_dict(r["latency_histogram"]))
+    connected = sum(r["clients"] for r in worker_results)
+    sent = sum(r["sent"] for r in worker_results)
+    delivered = sum(r["delivered"] for r in worker_results)
+    expected = sent * max(0, connected - 1)
+
+    tests: dict = {
+        "chat_throughput": {
+            "value": delivered / duration,
+            "unit": "msg/s",
+            "sent": sent,
+            "delivered": delivered,
+            "expected": expected,
+            "delivery_ratio": delivered / expected if expected else 0,
+        },
+        "server_resources": monitor.summary(start, end),
+    }
+
+    if latencies.count:
+        tests["chat_latency"] = latencies.summary()
+    if profile_status:
+        tests["server_profile"] = {
+            "value": float(profile_status["overhead_percent"]),
+            "unit": "% CPU",
+            "samples": int(profile_status["samples"]),
+            "achieved_hz": float(profile_status["achieved_hz"]),
+            "folded_stacks": str(profile),
+        }
+
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "target": f"127.0.0.1:{port}",
+        "config": {
+            "clients": clients,
+            "connected": connected,
+            "senders": senders,
+            "rate_per_sender": rate,
+            "duration": duration,
+            "processes": processes,
+            "emulated_link": emulate,
+        },
+        "tests": tests,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Load test for the chat server (loopback only)."
+    )
+    parser.add_argument("--clients", type=int, default=1000,
+                        help="Number of simulated clients (default: 1000)")
+    parser.add_argument("--senders", type=int, default=10,
+                        help="How many of the clients send messages (default: 10)")
+    parser.add_argument("--rate", type=float, default=5.0,
+                        help="Messages per second per sender (default: 5)")
+    parser.add_argument("--duration", type=float, default=20.0,
+                        help="Seconds of sending (default: 20)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="Load generator worker processes (default: CPU count)")
+    parser.add_argument("--drain", type=float, default=2.0,
+                        help="Seconds to wait for in-flight messages (default: 2)")
+    parser.add_argument(
+        "--output",
+        default="results/chat_load.json",
+        help="Path to output JSON file (default: results/chat_load.json)",
+    )
+    parser.add_argument("--emulate", choices=sorted(LINK_PRESETS), default=None,
+                        help="Connect through an emulated link, e.g. vpn (default: direct)")
+    parser.add_argument("--profile", metavar="FILE", default=None,
+                        help="Profile the server while sending; folded stacks to FILE")
+    args = parser.parse_args()
+
+    print("=== Chat Server Load Test ===")
+    output_data = run_load_test(
+        clients=args.clients,
+        senders=min(args.senders, args.clients),
+        rate=args.rate,
+        duration=args.duration,
+        processes=max(1, min(args.processes, args.clients)),
+        drain=args.drain,
+        emulate=args.emulate,
+        profile=args.profile,
+    )
+
+    tests = output_data["tests"]
+    tp = tests["chat_throughput"]
+    print(f"\n[+] Delivered {tp['delivered']}/{tp['expected']} messages "
+          f"({tp['value']:.0f} msg/s)")
+    if "chat_latency" in tests:
+        lat = tests["chat_latency"]
+        print(f"[+] Latency p50={lat['p50']:.2f} ms  p90={lat['p90']:.2f} ms  "
+              f"p99={lat['p99']:.2f} ms  max={lat['max']:.2f} ms")
+    res = tests["server_resources"]
+    if res:
+        print(f"[+] Server CPU avg={res['cpu_percent_avg']:.0f}%  "
+              f"RSS max={res['rss_mb_max']:.1f} MB")
+    if "server_profile" in tests:
+        prof = tests["server_profile"]
+        print(f"[+] Profiler: {prof['samples']} samples at {prof['achieved_hz']:.0f} Hz, "
+              f"{prof['value']:.2f}% CPU overhead; stacks in {prof['folded_stacks']}")
+
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with output_path.open("w", encoding="utf-8") as f:
+        json.dump(output_data, f, indent=2)
+
+    print(f"\n[+] Chat load results saved to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
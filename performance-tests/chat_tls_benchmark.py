@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+TLS benchmark for the chat server.
+
+Starts a plain `ChatServer` and a `ChatServerSSL` on loopback and measures:
+
+  - full TLS handshakes per second (no session)
+  - resumed TLS handshakes per second (session ticket from a prior connection)
+  - broadcast latency between two clients, plain vs TLS, to show the
+    per-message cost TLS adds
+
+A throwaway self-signed certificate is generated with the openssl CLI.
+Results are written to a JSON file that `ResultsAnalyzer` picks up.
+"""
+
+import argparse
+import json
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from chat_load_test import STAMP_MARKER, free_port
+from latency_histogram import LatencyHistogram
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+CHAT_DIR = PROJECT_ROOT / "chat"
+sys.path.insert(0, str(CHAT_DIR))
+
+from shared.tls import CIPHER_PROFILES, client_context  # noqa: E402
+
+
+def make_certificate(directory: Path) -> tuple[Path, Path]:
+    """Create a self-signed EC certificate for localhost."""
+    certfile = directory / "server.crt"
+    keyfile = directory / "server.key"
+    cmd = [
+        "openssl", "req", "-x509", "-nodes", "-days", "1",
+        "-newkey", "ec", "-pkeyopt", "ec_paramgen_curve:prime256v1",
+        "-keyout", str(keyfile), "-out", str(certfile),
+        "-subj", "/CN=localhost",
+    ]
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return certfile, keyfile
+
+
+def start_server(script: str, port: int, extra: list[str]) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, str(CHAT_DIR / "server" / script),
+         "--host", "127.0.0.1", "--port", str(port), *extra],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError(f"{script} did not start")
+
+
+def open_client(port: int, name: str, context: ssl.SSLContext | None,
+                session=None) -> socket.socket:
+    """Connect like ChatClient/ChatClientSSL and read the welcome text."""
+    sock = socket.create_connection(("127.0.0.1", port))
+    if context is not None:
+        sock = context.wrap_socket(sock, server_hostname="localhost", session=session)
+    sock.sendall(f"{name}\n".encode("utf-8"))
+    sock.recv(4096)
+    return sock
+
+
+def measure_handshakes(port: int, context: ssl.SSLContext, count: int,
+                       resume: bool) -> dict:
+    """Time `count` TLS handshakes, optionally resuming one session."""
+    session = None
+    if resume:
+        # TLS 1.3 tickets arrive after the handshake, so read something first
+        first = open_client(port, "hs_seed", context)
+        session = first.session
+        first.close()
+
+    reused = 0
+    start = time.perf_counter()
+    for _ in range(count):
+        raw = socket.create_connection(("127.0.0.1", port))
+        tls = context.wrap_socket(raw, server_hostname="localhost", session=session)
+        reused += tls.session_reused
+        tls.close()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "per_sec": count / elapsed,
+        "avg_ms": elapsed / count * 1000,
+        "count": count,
+        "reused": reused,
+    }
+
+
+def measure_broadcast_latency(port: int, context: ssl.SSLContext | None,
+                              count: int, tag: str) -> LatencyHistogram:
+    """Send `count` stamped messages from one client to another."""
+    sender = open_client(port, f"{tag}_sender", context)
+    receiver = open_client(port, f"{tag}_receiver", context)
+    time.sleep(1.5)  # let the batched join notice go out
+    receiver.settimeout(0.1)
+    try:
+        while receiver.recv(65536):
+            pass
+    except (socket.timeout, ssl.SSLError):
+        pass
+    receiver.settimeout(5)
+
+    latencies = LatencyHistogram()
+    buffer = b""
+    for _ in range(count):
+        sender.sendall(f"LT {time.monotonic_ns()}\n".encode("utf-8"))
+        while b"\n" not in buffer:
+            buffer += receiver.recv(4096)
+        line, buffer = buffer.split(b"\n", 1)
+        marker = line.rfind(STAMP_MARKER.encode())
+        if marker >= 0:
+            sent_ns = int(line[marker + len(STAMP_MARKER):])
+            latencies.record((time.monotonic_ns() - sent_ns) / 1e6)
+
+    sender.close()
+    receiver.close()
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="TLS handshake and per-message latency benchmark for chat."
+    )
+    parser.add_argument("--handshakes", type=int, default=500,
+                        help="Handshakes per measurement (default: 500)")
+    parser.add_argument("--messages", type=int, default=2000,
+                        help="Messages for the latency comparison (default: 2000)")
+    parser.add_argument("--ciphers", default="default", choices=sorted(CIPHER_PROFILES),
+                        help="TLS 1.2 cipher profile for server and client")
+    parser.add_argument(
+        "--output",
+        default="results/chat_tls.json",
+        help="Path to output JSON file (default: results/chat_tls.json)",
+    )
+    args = parser.parse_args()
+
+    print("=== Chat TLS Benchmark ===")
+    plain_port = free_port()
+    tls_port = free_port()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        certfile, keyfile = make_certificate(Path(tmp))
+        plain = start_server("chat_server.py", plain_port, [])
+        secure = start_server(
+            "chat_server_ssl.py", tls_port,
+            ["--certfile", str(certfile), "--keyfile", str(keyfile),
+             "--ciphers", args.ciphers],
+        )
+
+        try:
+            context = client_context(args.ciphers)
+
+            print(f"[+] Measuring {args.handshakes} full handshakes ...")
+            full = measure_handshakes(tls_port, context, args.handshakes, resume=False)
+            print(f"    {full['per_sec']:.0f} handshakes/s ({full['avg_ms']:.2f} ms each)")
+
+            print(f"[+] Measuring {args.handshakes} resumed handshakes ...")
+            resumed = measure_handshakes(tls_port, context, args.handshakes, resume=True)
+            print(f"    {resumed['per_sec']:.0f} handshakes/s ({resumed['avg_ms']:.2f} ms each, "
+                  f"{resumed['reused']}/{resumed['count']} resumed)")
+
+            probe = open_client(tls_port, "cipher_probe", context)
+            cipher, version, _ = probe.cipher()
+            probe.close()
+
+            print(f"[+] Measuring broadcast latency over {args.messages} messages ...")
+            plain_lat = measure_broadcast_latency(plain_port, None, args.messages, "plain")
+            tls_lat = measure_broadcast_latency(tls_port, context, args.messages, "tls")
+        finally:
+            plain.terminate()
+            secure.terminate()
+            plain.wait()
+            secure.wait()
+
+    plain_stats = plain_lat.summary()
+    tls_stats = tls_lat.summary()
+    added = {
+        p: tls_stats[p] - plain_stats[p] for p in ("p50", "p90", "p99", "avg")
+    }
+    print(f"    plain p50={plain_stats['p50']:.3f} ms  TLS p50={tls_stats['p50']:.3f} ms  "
+          f"added={added['p50']:.3f} ms")
+
+    output_data = {
+        "timestamp": datetime.now().isoformat(),
+        "target": "127.0.0.1",
+        "config": {
+            "cipher_profile": args.ciphers,
+            "negotiated_cipher": cipher,
+            "tls_version": version,
+        },
+        "tests": {
+            "tls_handshake": {
+                "full_per_sec": full["per_sec"],
+                "full_avg_ms": full["avg_ms"],
+                "resumed_per_sec": resumed["per_sec"],
+                "resumed_avg_ms": resumed["avg_ms"],
+                "resumed_count": resumed["reused"],
+                "samples": args.handshakes,
+            },
+            "chat_latency": tls_stats,
+            "chat_latency_plain": plain_stats,
+            "tls_added_latency": dict(added, unit="ms"),
+        },
+    }
+
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with output_path.open("w", encoding="utf-8") as f:
+        json.dump(output_data, f, indent=2)
+
+    print(f"\n[+] Chat TLS results saved to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark for the file-transfer client CLI.
+
+`application_performance.py` starts a fresh client process per scenario,
+so interpreter start-up and module imports are part of every measured
+transfer. This script measures that fixed cost:
+
+  - a bare interpreter (`python -c pass`) as the floor
+  - `file_client.py --help`, which imports everything the client needs
+    and exits before touching the network
+  - the same with `-X importtime`, broken down into the slowest
+    top-level imports
+
+Results are written to a JSON file that `ResultsAnalyzer` can pick up.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+CLIENTS = {
+    "file_client": PROJECT_ROOT / "file-transfer" / "client" / "file_client.py",
+    "file_client_ssl": PROJECT_ROOT / "file-transfer" / "client" / "file_client_ssl.py",
+}
+
+
+def time_command(cmd: list[str], runs: int) -> dict:
+    """Wall-clock time of a command over several runs, in ms."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        "median_ms": statistics.median(times),
+        "min_ms": min(times),
+        "max_ms": max(times),
+        "runs": runs,
+    }
+
+
+def import_breakdown(script: Path, top: int) -> dict:
+    """Parse `-X importtime` output into total and slowest top-level imports."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", str(script), "--help"],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    modules = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:   self |   cumulative |   <2 spaces per level>name"
+        head, cumulative_us, name = line.split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append({"module": name.strip(),
+                        "self_us": int(head.split(":")[1]),
+                        "cumulative_us": int(cumulative_us), "depth": depth})
+
+    top_level = [m for m in modules if m["depth"] == 0]
+    top_level.sort(key=lambda m: m["cumulative_us"], reverse=True)
+    return {
+        "total_import_ms": sum(m["cumulative_us"] for m in top_level) / 1000,
+        "modules_imported": len(modules),
+        "slowest": top_level[:top],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="File client startup benchmark.")
+    parser.add_argument("--runs", type=int, default=20,
+                        help="Process launches per measurement (default: 20)")
+    parser.add_argument("--top", type=int, default=10,
+                        help="Slowest top-level imports to report (default: 10)")
+    parser.add_argument(
+        "--output",
+        default="results/client_startup.json",
+        help="Path to output JSON file (default: results/client_startup.json)",
+    )
+    args = parser.parse_args()
+
+    print("=== File Client Startup Benchmark ===")
+    interpreter = time_command([sys.executable, "-c", "pass"], args.runs)
+    print(f"[+] bare interpreter: {interpreter['median_ms']:.1f} ms")
+
+    clients = {}
+    for name, script in CLIENTS.items():
+        launch = time_command([sys.executable, str(script), "--help"], args.runs)
+        imports = import_breakdown(script, args.top)
+        clients[name] = {
+            "startup": launch,
+            "overhead_ms": launch["median_ms"] - interpreter["median_ms"],
+            "imports": imports,
+        }
+        print(f"[+] {name}: {launch['median_ms']:.1f} ms "
+              f"(+{clients[name]['overhead_ms']:.1f} ms over the interpreter, "
+              f"{imports['total_import_ms']:.1f} ms in imports)")
+        for module in imports["slowest"][:5]:
+            print(f"      {module['cumulative_us'] / 1000:7.2f} ms  {module['module']}")
+
+    output_data = {
+        "timestamp": datetime.now().isoformat(),
+        "target": "local",
+        "config": {"python": sys.version.split()[0], "runs": args.runs},
+        "tests": {
+            "client_startup": {
+                "interpreter": interpreter,
+                "clients": clients,
+            },
+        },
+    }
+
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with output_path.open("w", encoding="utf-8") as f:
+        json.dump(output_data, f, indent=2)
+    print(f"\n[+] Startup results saved to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Disk write benchmark for the file-transfer server's upload path.
+
+Feeds protocol-sized chunks (4 KB, as sent by the client) into the
+server's `DiskWriter` under each durability mode and reports throughput,
+next to a baseline of one plain write() per chunk. Run it with --dir on
+the filesystem that will hold the server's storage directory; results
+depend heavily on the disk and filesystem.
+
+    none   - no syncing; data reaches disk when the OS flushes it
+    fsync  - one fsync when the upload completes
+    dsync  - O_DSYNC, every (1 MB, write-behind) write is synchronous
+
+Results are written to a JSON file that `ResultsAnalyzer` can pick up.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "file-transfer" / "server"))
+
+from disk_writer import DURABILITY_MODES, DiskWriter, WRITE_BUFFER_SIZE  # noqa: E402
+
+
+def small_writes(path: Path, chunk: bytes, count: int) -> None:
+    """Baseline: one unbuffered write() per received chunk."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        for _ in range(count):
+            os.write(fd, chunk)
+    finally:
+        os.close(fd)
+
+
+def disk_writer(path: Path, chunk: bytes, count: int, mode: str, buffer_size: int) -> None:
+    writer = DiskWriter(str(path) + ".part", len(chunk) * count, mode, buffer_size)
+    for _ in range(count):
+        writer.write(chunk)
+    writer.commit(str(path))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Server disk write benchmark.")
+    parser.add_argument("--size-mb", type=int, default=256,
+                        help="Bytes written per run in MB (default: 256)")
+    parser.add_argument("--chunk-kb", type=int, default=4,
+                        help="Size of each incoming chunk in KB (default: 4)")
+    parser.add_argument("--buffer-kb", type=int, default=WRITE_BUFFER_SIZE // 1024,
+                        help=f"Write-behind buffer in KB (default: {WRITE_BUFFER_SIZE // 1024})")
+    parser.add_argument("--runs", type=int, default=3,
+                        help="Runs per mode, best is kept (default: 3)")
+    parser.add_argument("--dir", default=None,
+                        help="Directory on the filesystem to test (default: system temp dir)")
+    parser.add_argument(
+        "--output",
+        default="results/disk_write.json",
+        help="Path to output JSON file (default: results/disk_write.json)",
+    )
+    args = parser.parse_args()
+
+    chunk = os.urandom(args.chunk_kb * 1024)
+    count = args.size_mb * 1024 // args.chunk_kb
+    buffer_size = args.buffer_kb * 1024
+
+    cases = {"small_writes": lambda p: small_writes(p, chunk, count)}
+    for mode in DURABILITY_MODES:
+        cases[mode] = lambda p, m=mode: disk_writer(p, chunk, count, m, buffer_size)
+
+    print("=== Disk Write Benchmark ===")
+    print(f"[+] {args.size_mb} MB in {args.chunk_kb} KB chunks, "
+          f"{args.buffer_kb} KB write-behind buffer")
+
+    results = {}
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        for name, run in cases.items():
+            best = None
+            for i in range(args.runs):
+                path = Path(tmp) / f"{name}_{i}.bin"
+                start = time.perf_counter()
+                run(path)
+                elapsed = time.perf_counter() - start
+                path.unlink()
+                best = elapsed if best is None else min(best, elapsed)
+            results[name] = {"seconds": best, "mb_per_sec": args.size_mb / best}
+            print(f"[+] {name:>12}: {best:.3f}s ({args.size_mb / best:.0f} MB/s)")
+
+    output_data = {
+        "timestamp": datetime.now().isoformat(),
+        "target": args.dir or tempfile.gettempdir(),
+        "config": vars(args),
+        "tests": {"disk_write": results},
+    }
+
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with output_path.open("w", encoding="utf-8") as f:
+        json.dump(output_data, f, indent=2)
+    print(f"\n[+] Disk write results saved to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Checksum benchmark for the file-transfer app.
+
+Compares the whole-file SHA-256 the client has always used
+(`FileTransferProtocol.calculate_checksum` over the file's bytes) with the
+tree hash from `shared.treehash` at 1, 2, 4 and 8 worker threads, on a
+temporary file of random data. Each measurement is the best of a few
+runs, after one warm-up run so the file is in the page cache and disk
+speed does not dominate.
+
+Results are written to a JSON file that `ResultsAnalyzer` can pick up.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "file-transfer"))
+
+from shared.protocol import FileTransferProtocol  # noqa: E402
+from shared.treehash import TREE_BLOCK_SIZE, hash_file  # noqa: E402
+
+
+def best_of(runs: int, func) -> float:
+    """Fastest wall-clock time of several calls."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def single_stream(path: Path) -> str:
+    with path.open("rb") as f:
+        return FileTransferProtocol.calculate_checksum(f.read())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="SHA-256 vs tree hash benchmark.")
+    parser.add_argument("--size-mb", type=int, default=512,
+                        help="Size of the test file in MB (default: 512)")
+    parser.add_argument("--block-kb", type=int, default=TREE_BLOCK_SIZE // 1024,
+                        help=f"Tree block size in KB (default: {TREE_BLOCK_SIZE // 1024})")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="Worker counts to test (default: 1 2 4 8)")
+    parser.add_argument("--runs", type=int, default=3,
+                        help="Runs per measurement, best is kept (default: 3)")
+    parser.add_argument(
+        "--output",
+        default="results/hash_benchmark.json",
+        help="Path to output JSON file (default: results/hash_benchmark.json)",
+    )
+    args = parser.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+    block_size = args.block_kb * 1024
+    print("=== Checksum Benchmark ===")
+    print(f"[+] {args.size_mb} MB file, {args.block_kb} KB blocks, {os.cpu_count()} CPUs")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "payload.bin"
+        with path.open("wb") as f:
+            for _ in range(0, size, 16 * 1024 * 1024):
+                f.write(os.urandom(min(16 * 1024 * 1024, size - f.tell())))
+
+        single_stream(path)  # warm the page cache
+        baseline = best_of(args.runs, lambda: single_stream(path))
+        print(f"[+] single-stream SHA-256: {baseline:.3f}s "
+              f"({args.size_mb / baseline:.0f} MB/s)")
+
+        tree = {}
+        for workers in args.workers:
+            elapsed = best_of(args.runs, lambda: hash_file(path, block_size, workers))
+            tree[str(workers)] = {
+                "seconds": elapsed,
+                "mb_per_sec": args.size_mb / elapsed,
+                "speedup": baseline / elapsed,
+            }
+            print(f"[+] tree hash, {workers} workers: {elapsed:.3f}s "
+                  f"({args.size_mb / elapsed:.0f} MB/s, {baseline / elapsed:.2f}x)")
+
+    output_data = {
+        "timestamp": datetime.now().isoformat(),
+        "target": "local",
+        "config": {
+            "size_mb": args.size_mb,
+            "block_kb": args.block_kb,
+            "cpus": os.cpu_count(),
+            "runs": args.runs,
+        },
+        "tests": {
+            "checksum": {
+                "single_stream": {
+                    "seconds": baseline,
+                    "mb_per_sec": args.size_mb / baseline,
+                },
+                "tree": tree,
+            },
+        },
+    }
+
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with output_path.open("w", encoding="utf-8") as f:
+        json.dump(output_data, f, indent=2)
+    print(f"\n[+] Checksum results saved to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Log-bucketed latency histograms for the performance tests.
+
+Values are kept in microseconds, in buckets that grow with the value (the
+HdrHistogram layout): below 2**SUB_BUCKET_BITS every microsecond has its
+own bucket, above that each power of two is split into 2**(SUB_BUCKET_BITS
+- 1) equal buckets. Every value is kept to within 1/128 (0.8%) at any
+scale, in at most 128 sparse buckets per power of two, however many
+samples there are.
+
+Histograms merge by adding bucket counts, so percentiles of several
+workers, processes or runs are computed from all their samples, not by
+averaging each one's percentiles. `summary()` gives the latency dict the
+results files use (min, max, avg, stdev, p50/p90/p99/p999 in ms) with the
+histogram itself under "histogram"; `from_dict()` reads it back.
+
+Merge the histograms of earlier results files:
+
+    python3 latency_histogram.py results/run1.json results/run2.json --key chat_latency
+"""
+
+import json
+import math
+from pathlib import Path
+
+SUB_BUCKET_BITS = 8
+PERCENTILES = {"p50": 50, "p90": 90, "p99": 99, "p999": 99.9}
+
+
+class LatencyHistogram:
+    def __init__(self, sub_bucket_bits: int = SUB_BUCKET_BITS):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.counts: dict[int, int] = {}
+        self.count = 0
+        self.min_us = None
+        self.max_us = None
+        self.sum_us = 0
+        self.sum_squares = 0
+
+    @classmethod
+    def of(cls, values_ms) -> "LatencyHistogram":
+        histogram = cls()
+        for value in values_ms:
+            histogram.record(value)
+        return histogram
+
+    def bucket_index(self, value_us: int) -> int:
+        exponent = value_us.bit_length() - self.sub_bucket_bits
+        if exponent <= 0:
+            return value_us
+        return (exponent << (self.sub_bucket_bits - 1)) + (value_us >> exponent)
+
+    def bucket_range(self, index: int) -> tuple[int, int]:
+        """Lowest value and width (us) of a bucket"""
+        if index < 1 << self.sub_bucket_bits:
+            return index, 1
+        half = 1 << (self.sub_bucket_bits - 1)
+        exponent = index // half - 1
+        return (index - exponent * half) << exponent, 1 << exponent
+
+    def record(self, value_ms: float, count: int = 1) -> None:
+        value_us = max(0, round(value_ms * 1000))
+        index = self.bucket_index(value_us)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.count += count
+        self.sum_us += value_us * count
+        self.sum_squares += value_us * value_us * count
+        self.min_us = value_us if self.min_us is None else min(self.min_us, value_us)
+        self.max_us = value_us if self.max_us is None else max(self.max_us, value_us)
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        if other.sub_bucket_bits != self.sub_bucket_bits:
+            raise ValueError("Cannot merge histograms with different bucket layouts")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.sum_us += other.sum_us
+        self.sum_squares += other.sum_squares
+        for value in (other.min_us, other.max_us):
+            if value is not None:
+                self.min_us = value if self.min_us is None else min(self.min_us, value)
+                self.max_us = value if self.max_us is None else max(self.max_us, value)
+        return self
+
+    def percentile(self, pct: float) -> float:
+        """Nearest-rank percentile in ms, to bucket precision"""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(pct / 100 * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                low, width = self.bucket_range(index)
+                value = low + (width - 1) / 2
+                return min(max(value, self.min_us), self.max_us) / 1000
+        return self.max_us / 1000
+
+    def mean(self) -> float:
+        return self.sum_us / self.count / 1000 if self.count else 0.0
+
+    def stdev(self) -> float:
+        """Sample standard deviation in ms"""
+        if self.count < 2:
+            return 0.0
+        variance = (self.sum_squares - self.sum_us ** 2 / self.count) / (self.count - 1)
+        return math.sqrt(max(0.0, variance)) / 1000
+
+    def cdf(self) -> list[tuple[float, float]]:
+        """(upper bound of each bucket in ms, fraction of samples at or below)"""
+        points, seen = [], 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            low, width = self.bucket_range(index)
+            points.append((min(low + width - 1, self.max_us) / 1000, seen / self.count))
+        return points
+
+    def summary(self) -> dict:
+        result = {
+            "min": (self.min_us or 0) / 1000,
+            "max": (self.max_us or 0) / 1000,
+            "avg": self.mean(),
+            "stdev": self.stdev(),
+        }
+        for name, pct in PERCENTILES.items():
+            result[name] = self.percentile(pct)
+        result.update({"unit": "ms", "samples": self.count, "histogram": self.to_dict()})
+        return result
+
+    def to_dict(self) -> dict:
+        return {
+            "unit": "us",
+            "sub_bucket_bits": self.sub_bucket_bits,
+            "min": self.min_us,
+            "max": self.max_us,
+            "sum": self.sum_us,
+            "sum_squares": self.sum_squares,
+            # JSON keys are strings; sorted so files diff cleanly
+            "counts": {str(i): self.counts[i] for i in sorted(self.counts)},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LatencyHistogram":
+        histogram = cls(data["sub_bucket_bits"])
+        histogram.counts = {int(i): c for i, c in data["counts"].items()}
+        histogram.count = sum(histogram.counts.values())
+        histogram.min_us = data["min"]
+        histogram.max_us = data["max"]
+        histogram.sum_us = data["sum"]
+        histogram.sum_squares = data["sum_squares"]
+        return histogram
+
+
+def find_histograms(tests: dict) -> dict[str, dict]:
+    """Latency dicts with a histogram in a results file's `tests`, by name.
+
+    Looks one level down as well, for tests that hold one latency dict per
+    scenario (e.g. application_performance's transfer times).
+    """
+    found = {}
+    for key, value in tests.items():
+        if not isinstance(value, dict):
+            continue
+        if "histogram" in value:
+            found[key] = value
+            continue
+        for name, inner in value.items():
+            if isinstance(inner, dict) and "histogram" in inner:
+                found[f"{key}/{name}"] = inner
+    return found
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Merge latency histograms of results files.")
+    parser.add_argument("files", nargs="+", help="Results JSON files")
+    parser.add_argument("--key", default="latency",
+                        help="Test to merge, e.g. chat_latency (default: latency)")
+    args = parser.parse_args()
+
+    merged = LatencyHistogram()
+    for path in args.files:
+        with Path(path).open(encoding="utf-8") as f:
+            tests = json.load(f).get("tests", {})
+        found = find_histograms(tests)
+        if args.key not in found:
+            print(f"[!] {path}: no '{args.key}' histogram, skipped")
+            continue
+        merged.merge(LatencyHistogram.from_dict(found[args.key]["histogram"]))
+
+    if not merged.count:
+        raise SystemExit("[!] Nothing to merge")
+    summary = merged.summary()
+    print(f"[+] {args.key}: {summary['samples']} samples from {len(args.files)} files")
+    print("    " + "  ".join(f"{name}={summary[name]:.3f} ms"
+                              for name in ("min", *PERCENTILES, "max")))
+
+
+if __name__ == "__main__":
+    main()
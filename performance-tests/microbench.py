@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the protocol hot paths, with baseline gating.
+
+Times the primitives every upload chunk and chat message goes through,
+without a network: socketpairs where a real kernel copy matters, and
+in-memory fake sockets everywhere else.
+
+  file-transfer  FileTransferProtocol.create_header, parse_header,
+                 calculate_checksum, send_message, receive_message and a
+                 send + receive round trip over a socketpair
+  chat           ChatServer.broadcast fan-out to 10, 100 and 1000 clients
+                 through each client's outbox
+
+Like pytest-benchmark, each benchmark is calibrated so one round takes at
+least --min-round-ms, then timed over --rounds rounds with the garbage
+collector off. The median time per call is reported; the fastest
+round is what gets compared, since noise from other processes only ever
+adds time (on a shared or single-CPU box medians drift by 10-30% between
+identical runs, the minimum by well under 10%).
+
+--save-baseline stores the results as the baseline (JSON, with the
+machine they were taken on). --compare checks the results against it
+and exits 1 when any benchmark's fastest round is more than --threshold
+percent slower, or 3 when there is no baseline to compare against (so a
+gate never passes by default). Both apps import their helpers as
+`shared`, so each app's benchmarks run in a subprocess of their own.
+
+    python3 microbench.py --save-baseline          # on the base commit
+    python3 microbench.py --compare --threshold 15 # after a change
+
+Results are written to a JSON file that `ResultsAnalyzer` can pick up.
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+APP_PATHS = {
+    "file-transfer": [PROJECT_ROOT / "file-transfer"],
+    "chat": [PROJECT_ROOT / "chat", PROJECT_ROOT / "chat" / "server"],
+}
+BASELINE_DIR = Path(__file__).resolve().parent / "results" / "baselines"
+DEFAULT_BASELINE = BASELINE_DIR / "microbench.json"
+# --compare without a baseline; regressions exit 1
+EXIT_NO_BASELINE = 3
+
+BENCHMARKS: dict[str, list] = {app: [] for app in APP_PATHS}
+
+
+def benchmark(app: str, name: str):
+    """Register a setup function; it returns the callable to time."""
+    def register(setup):
+        BENCHMARKS[app].append((name, setup))
+        return setup
+    return register
+
+
+class FakeSocket:
+    """In-memory socket: sends are counted, recv replays a fixed byte string."""
+
+    def __init__(self, incoming: bytes = b""):
+        self.incoming = memoryview(incoming)
+        self.pos = 0
+        self.sent = 0
+
+    def sendall(self, data) -> None:
+        self.sent += len(data)
+
+    def send(self, data, flags: int = 0) -> int:
+        self.sent += len(data)
+        return len(data)
+
+    def sendmsg(self, buffers) -> int:
+        n = sum(len(b) for b in buffers)
+        self.sent += n
+        return n
+
+    def recv(self, size: int) -> bytes:
+        chunk = self.incoming[self.pos:self.pos + size]
+        self.pos += len(chunk)
+        return bytes(chunk)
+
+    def rewind(self) -> None:
+        self.pos = 0
+
+
+# --- file-transfer --------------------------------------------------------
+
+FILE_HEADER_METADATA = {
+    "filename": "test_app.bin",
+    "filesize": 5 * 1024 * 1024,
+    "checksum": "26389698fd34dac9b737f79ce4c54e260acdc940bc3f43dc74ed109175691281",
+}
+
+
+@benchmark("file-transfer", "create_header/chunk")
+def bench_create_header(stack):
+    from shared.protocol import FileTransferProtocol, MSG_FILE_CHUNK
+    return lambda: FileTransferProtocol.create_header(MSG_FILE_CHUNK, 4096)
+
+
+@benchmark("file-transfer", "create_header/file_header")
+def bench_create_file_header(stack):
+    from shared.protocol import FileTransferProtocol, MSG_FILE_HEADER
+    return lambda: FileTransferProtocol.create_header(MSG_FILE_HEADER, 0, FILE_HEADER_METADATA)
+
+
+@benchmark("file-transfer", "parse_header/file_header")
+def bench_parse_header(stack):
+    from shared.protocol import FileTransferProtocol, MSG_FILE_HEADER
+    header = FileTransferProtocol.create_header(MSG_FILE_HEADER, 0, FILE_HEADER_METADATA)
+    return lambda: FileTransferProtocol.parse_header(header)
+
+
+@benchmark("file-transfer", "calculate_checksum/4KB")
+def bench_checksum_small(stack):
+    from shared.protocol import FileTransferProtocol
+    data = os.urandom(4096)
+    return lambda: FileTransferProtocol.calculate_checksum(data)
+
+
+@benchmark("file-transfer", "calculate_checksum/1MB")
+def bench_checksum_large(stack):
+    from shared.protocol import FileTransferProtocol
+    data = os.urandom(1024 * 1024)
+    return lambda: FileTransferProtocol.calculate_checksum(data)
+
+
+@benchmark("file-transfer", "send_message/4KB_fake")
+def bench_send_message(stack):
+    from shared.protocol import FileTransferProtocol, MSG_FILE_CHUNK
+    sock = FakeSocket()
+    chunk = os.urandom(4096)
+    return lambda: FileTransferProtocol.send_message(sock, MSG_FILE_CHUNK, chunk)
+
+
+@benchmark("file-transfer", "receive_message/4KB_fake")
+def bench_receive_message(stack):
+    from shared.protocol import FileTransferProtocol, MSG_FILE_CHUNK
+    message = FileTransferProtocol.create_header(MSG_FILE_CHUNK, 4096) + os.urandom(4096)
+    sock = FakeSocket(message)
+
+    def receive():
+        sock.rewind()
+        FileTransferProtocol.receive_message(sock)
+    return receive
+
+
+@benchmark("file-transfer", "round_trip/4KB_socketpair")
+def bench_round_trip(stack):
+    from shared.protocol import FileTransferProtocol, MSG_FILE_CHUNK
+    sender, receiver = socket.socketpair()
+    stack.callback(sender.close)
+    stack.callback(receiver.close)
+    chunk = os.urandom(4096)
+
+    def round_trip():
+        FileTransferProtocol.send_message(sender, MSG_FILE_CHUNK, chunk)
+        FileTransferProtocol.receive_message(receiver)
+    return round_trip
+
+
+# --- chat -----------------------------------------------------------------
+
+def broadcast_setup(stack, clients: int):
+    from chat_server import ChatServer
+    server = ChatServer(presence_interval=0)
+    stack.callback(server.history.close)
+    with server.clients_lock:
+        for i in range(clients):
+            client_socket = FakeSocket()
+            server.clients.add(client_socket, f"user{i}")
+            server.attach(client_socket)
+    stack.callback(lambda: [outbox.close() for outbox in server.outboxes.values()])
+    message = "[12:00:00] alice: " + "x" * 80
+    return lambda: server.broadcast(message)
+
+
+@benchmark("chat", "broadcast/10_clients")
+def bench_broadcast_10(stack):
+    return broadcast_setup(stack, 10)
+
+
+@benchmark("chat", "broadcast/100_clients")
+def bench_broadcast_100(stack):
+    return broadcast_setup(stack, 100)
+
+
+@benchmark("chat", "broadcast/1000_clients")
+def bench_broadcast_1000(stack):
+    return broadcast_setup(stack, 1000)
+
+
+# --- harness --------------------------------------------------------------
+
+def timed(func, iterations: int) -> int:
+    start = time.perf_counter_ns()
+    for _ in range(iterations):
+        func()
+    return time.perf_counter_ns() - start
+
+
+def measure(func, rounds: int, min_round_ns: int) -> dict:
+    """Calibrate iterations per round, then time `rounds` rounds (us per call)."""
+    iterations = 1
+    while True:
+        elapsed = timed(func, iterations)
+        if elapsed >= min_round_ns:
+            break
+        # Aim a little past the target so calibration ends in few steps
+        iterations = max(iterations * 2,
+                         int(iterations * min_round_ns * 1.2 / max(elapsed, 1)))
+
+    gc.collect()
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        per_call = [timed(func, iterations) / iterations / 1000 for _ in range(rounds)]
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return {
+        "median_us": statistics.median(per_call),
+        "min_us": min(per_call),
+        "mean_us": statistics.fmean(per_call),
+        "stdev_us": statistics.stdev(per_call) if rounds > 1 else 0.0,
+        "ops_per_sec": 1e6 / statistics.median(per_call),
+        "rounds": rounds,
+        "iterations": iterations,
+    }
+
+
+def run_app(app: str, rounds: int, min_round_ms: float, pattern: str) -> dict:
+    """Run one app's benchmarks in this process."""
+    for path in APP_PATHS[app]:
+        sys.path.insert(0, str(path))
+    results = {}
+    for name, setup in BENCHMARKS[app]:
+        if pattern and pattern not in name:
+            continue
+        with contextlib.ExitStack() as stack:
+            func = setup(stack)
+            func()  # warm-up, and fail early if the setup is broken
+            results[name] = measure(func, rounds, int(min_round_ms * 1e6))
+    return results
+
+
+def run_all(rounds: int, min_round_ms: float, pattern: str) -> dict:
+    """Run each app's benchmarks in a subprocess and collect the results."""
+    results = {}
+    for app in APP_PATHS:
+        completed = subprocess.run(
+            [sys.executable, __file__, "--worker", app, "--rounds", str(rounds),
+             "--min-round-ms", str(min_round_ms), "--filter", pattern],
+            check=True, stdout=subprocess.PIPE, text=True,
+        )
+        for name, result in json.loads(completed.stdout).items():
+            results[f"{app}/{name}"] = result
+    return results
+
+
+def machine_info() -> dict:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "node": platform.node(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[dict]:
+    """Benchmarks whose fastest round got more than threshold % slower."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline["benchmarks"].get(name)
+        if base is None:
+            continue
+        change = (result["min_us"] / base["min_us"] - 1) * 100
+        result["baseline_min_us"] = base["min_us"]
+        result["baseline_median_us"] = base["median_us"]
+        result["change_percent"] = change
+        if change > threshold:
+            regressions.append({"name": name, "change_percent": change})
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Protocol microbenchmarks with baselines.")
+    parser.add_argument("--rounds", type=int, default=15,
+                        help="Timed rounds per benchmark (default: 15)")
+    parser.add_argument("--min-round-ms", type=float, default=20.0,
+                        help="Minimum duration of one round in ms (default: 20)")
+    parser.add_argument("--filter", default="",
+                        help="Only run benchmarks whose name contains this")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                        help=f"Baseline JSON file (default: {DEFAULT_BASELINE})")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Store these results as the baseline")
+    parser.add_argument("--compare", action="store_true",
+                        help="Exit 1 if a benchmark regressed against the baseline, "
+                             f"{EXIT_NO_BASELINE} if there is no baseline")
+    parser.add_argument("--threshold", type=float, default=15.0,
+                        help="Allowed slowdown of the fastest round in percent (default: 15)")
+    parser.add_argument(
+        "--output",
+        default="results/microbench.json",
+        help="Path to output JSON file (default: results/microbench.json)",
+    )
+    parser.add_argument("--worker", choices=sorted(APP_PATHS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        json.dump(run_app(args.worker, args.rounds, args.min_round_ms, args.filter),
+                  sys.stdout)
+        return
+
+    print("=== Protocol Microbenchmarks ===")
+    results = run_all(args.rounds, args.min_round_ms, args.filter)
+
+    baseline_path = Path(args.baseline)
+    baseline = None
+    if baseline_path.exists():
+        with baseline_path.open(encoding="utf-8") as f:
+            baseline = json.load(f)
+    regressions = []
+    if args.compare and baseline:
+        if baseline["machine"] != machine_info():
+            print(f"[!] Baseline was taken on {baseline['machine']}; "
+                  "differences may not be regressions")
+        regressions = compare(results, baseline, args.threshold)
+    elif args.compare:
+        print(f"[!] No baseline at {baseline_path}; run with --save-baseline first")
+
+    print(f"\n{'benchmark':<46} {'median':>10} {'min':>10} {'stdev':>8} "
+          f"{'ops/s':>12} {'change':>8}")
+    for name, r in results.items():
+        change = f"{r['change_percent']:+.1f}%" if "change_percent" in r else ""
+        print(f"{name:<46} {r['median_us']:>8.2f}us {r['min_us']:>8.2f}us {r['stdev_us']:>6.2f}us "
+              f"{r['ops_per_sec']:>12,.0f} {change:>8}")
+
+    output_data = {
+        "timestamp": datetime.now().isoformat(),
+        "target": "local",
+        "config": {
+            "rounds": args.rounds,
+            "min_round_ms": args.min_round_ms,
+            "threshold_percent": args.threshold,
+            "machine": machine_info(),
+        },
+        "tests": {"microbench": results},
+    }
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with output_path.open("w", encoding="utf-8") as f:
+        json.dump(output_data, f, indent=2)
+    print(f"\n[+] Microbenchmark results saved to {output_path}")
+
+    if args.save_baseline:
+        # A filtered run only replaces the benchmarks it ran
+        stored = baseline["benchmarks"] if baseline and args.filter else {}
+        stored.update({name: {"median_us": r["median_us"], "min_us": r["min_us"],
+                               "stdev_us": r["stdev_us"]}
+                       for name, r in results.items()})
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        with baseline_path.open("w", encoding="utf-8") as f:
+            json.dump({"timestamp": output_data["timestamp"], "machine": machine_info(),
+                       "benchmarks": stored}, f, indent=2)
+        print(f"[+] Baseline saved to {baseline_path}")
+
+    if regressions:
+        for r in regressions:
+            print(f"[!] {r['name']}: {r['change_percent']:+.1f}% slower than baseline "
+                  f"(threshold {args.threshold:g}%)")
+        sys.exit(1)
+    if args.compare and not baseline:
+        sys.exit(EXIT_NO_BASELINE)
+    if args.compare:
+        print(f"[+] No benchmark regressed by more than {args.threshold:g}%")
+
+
+if __name__ == "__main__":
+    main()
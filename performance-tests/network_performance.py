@@ -3,88 +3,278 @@
 Network Performance Testing
 
 COSC 450 Final Project - Longyu Tang
+
+TCP probes measured the way the chat and file-transfer apps see the
+network, with no ping or iperf3 needed:
+
+  - connect time: TCP handshakes to the target port; works against any
+    listening TCP port (e.g. 443 on a public host)
+  - latency: request/response round trips on one connection, echoed by
+    the probe server (falls back to connect times without one)
+  - throughput: several parallel bulk streams into the probe server,
+    counted by the receiver, with RTT probes running alongside to show
+    latency under load
+  - packet loss: TCP retransmissions of the bulk streams (TCP_INFO), as
+    TCP hides lost packets from the application
+
+Each latency is kept as a log-bucketed histogram (`latency_histogram.py`)
+with p50 to p999.
+
+Start the probe server on the target first:
+
+    python3 network_performance.py --serve --port 5201
+
+Results keep the `tests` layout `ResultsAnalyzer` reads (`latency`,
+`throughput`, `packet_loss`), with extra fields added.
 """
 
-import subprocess
 import json
-import statistics
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from latency_histogram import LatencyHistogram
+
+PROBE_PORT = 5201
+MODE_ECHO = b"E"
+MODE_SINK = b"S"
+ECHO_SIZE = 64
+STREAM_CHUNK = 128 * 1024
+COUNT_FORMAT = "!Q"
+
+# struct tcp_info offsets (Linux): tcpi_total_retrans, tcpi_segs_out
+TCP_INFO_TOTAL_RETRANS = 100
+TCP_INFO_SEGS_OUT = 136
+
+
+def recv_exactly(sock, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed by probe server")
+        data += chunk
+    return data
+
+
+def tcp_counters(sock):
+    """(retransmitted, sent) segments of a socket, or None off Linux"""
+    if not hasattr(socket, "TCP_INFO"):
+        return None
+    info = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, 256)
+    if len(info) < TCP_INFO_SEGS_OUT + 4:
+        return None
+    return (struct.unpack_from("I", info, TCP_INFO_TOTAL_RETRANS)[0],
+            struct.unpack_from("I", info, TCP_INFO_SEGS_OUT)[0])
+
+
+class ProbeServer:
+    """Echo and sink endpoint for the probes (replaces `iperf3 -s`)"""
+
+    def __init__(self, host="0.0.0.0", port=PROBE_PORT):
+        self.host = host
+        self.port = port
+        self.server_socket = None
+
+    def start(self, background=False):
+        self.server_socket = socket.create_server((self.host, self.port), backlog=128)
+        self.port = self.server_socket.getsockname()[1]
+        if background:
+            threading.Thread(target=self.serve, daemon=True).start()
+        else:
+            print(f"[+] Probe server listening on {self.host}:{self.port}")
+            self.serve()
+        return self
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.server_socket.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    def handle(self, conn):
+        with conn:
+            try:
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                mode = conn.recv(1)
+                if mode == MODE_ECHO:
+                    while True:
+                        data = conn.recv(65536)
+                        if not data:
+                            return
+                        conn.sendall(data)
+                elif mode == MODE_SINK:
+                    buffer = bytearray(STREAM_CHUNK)
+                    total = 0
+                    while True:
+                        n = conn.recv_into(buffer)
+                        if not n:
+                            break
+                        total += n
+                    conn.sendall(struct.pack(COUNT_FORMAT, total))
+            except OSError:
+                pass
+
+    def close(self):
+        if self.server_socket:
+            self.server_socket.close()
+
 
 class NetworkPerformanceTester:
-    def __init__(self, target_host):
+    def __init__(self, target_host, port=PROBE_PORT, connect_port=None, timeout=5.0):
         self.target_host = target_host
+        self.port = port
+        self.connect_port = connect_port or port
+        self.timeout = timeout
         self.results = {
             "timestamp": datetime.now().isoformat(),
             "target": target_host,
             "tests": {}
         }
 
-    def test_latency(self, count=50):
-        """Test latency using ping"""
-        print(f"[+] Testing latency to {self.target_host}...")
+    def open_probe(self, mode):
+        sock = socket.create_connection((self.target_host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.sendall(mode)
+        return sock
 
-        cmd = ["ping", "-c", str(count), self.target_host]
-        result = subprocess.run(cmd, capture_output=True, text=True)
+    def probe_server_available(self):
+        try:
+            with self.open_probe(MODE_ECHO) as sock:
+                sock.sendall(b"x")
+                return recv_exactly(sock, 1) == b"x"
+        except OSError:
+            return False
+
+    def measure_connect_times(self, count, interval):
+        """Time full TCP handshakes; failures count as lost"""
+        times, failures = [], 0
+        for _ in range(count):
+            start = time.perf_counter()
+            try:
+                socket.create_connection(
+                    (self.target_host, self.connect_port), timeout=self.timeout
+                ).close()
+                times.append((time.perf_counter() - start) * 1000)
+            except OSError:
+                failures += 1
+            time.sleep(interval)
+        return times, failures
 
-        latencies = []
-        for line in result.stdout.splitlines():
-            if "time=" in line:
+    def measure_round_trips(self, count, interval, stop=None, timeout=None):
+        """Request/response RTTs on one connection, until count, stop or a timeout"""
+        rtts = []
+        payload = b"\x00" * ECHO_SIZE
+        with self.open_probe(MODE_ECHO) as sock:
+            sock.settimeout(timeout or self.timeout)
+            for _ in range(count):
+                if stop is not None and stop.is_set():
+                    break
+                start = time.perf_counter()
                 try:
-                    time_str = line.split("time=")[1].split()[0]
-                    latencies.append(float(time_str))
-                except:
-                    continue
-
-        if latencies:
-            self.results["tests"]["latency"] = {
-                "min": min(latencies),
-                "max": max(latencies),
-                "avg": statistics.mean(latencies),
-                "stdev": statistics.stdev(latencies) if len(latencies) > 1 else 0,
-                "unit": "ms",
-                "samples": len(latencies)
-            }
+                    sock.sendall(payload)
+                    recv_exactly(sock, ECHO_SIZE)
+                except socket.timeout:
+                    print(f"    [!] Round trip timed out after {sock.gettimeout():g} s")
+                    break
+                rtts.append((time.perf_counter() - start) * 1000)
+                time.sleep(interval)
+        return rtts
+
+    def run_stream(self, duration, start_barrier):
+        """One bulk stream; returns bytes the server received and TCP counters"""
+        chunk = b"\x00" * STREAM_CHUNK
+        with self.open_probe(MODE_SINK) as sock:
+            sock.settimeout(duration + self.timeout * 2)
+            start_barrier.wait()
+            deadline = time.monotonic() + duration
+            while time.monotonic() < deadline:
+                sock.sendall(chunk)
+            counters = tcp_counters(sock)
+            sock.shutdown(socket.SHUT_WR)
+            received = struct.unpack(COUNT_FORMAT, recv_exactly(sock, 8))[0]
+        return received, counters
 
-            print(f"    Avg latency: {statistics.mean(latencies):.2f} ms")
+    def test_latency(self, count=50, interval=0.02):
+        """Connect times and request/response RTTs, measured concurrently"""
+        print(f"[+] Testing latency to {self.target_host}...")
+        echo = self.probe_server_available()
 
-    def test_throughput(self, duration=10):
-        """Test throughput using iperf3"""
-        print(f"[+] Testing throughput to {self.target_host}...")
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            connects = pool.submit(self.measure_connect_times, count, interval)
+            rtts = pool.submit(self.measure_round_trips, count, interval) if echo else None
+            connect_times, failures = connects.result()
+            round_trips = rtts.result() if rtts else []
 
-        cmd = ["iperf3", "-c", self.target_host, "-t", str(duration), "-J"]
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        tests = self.results["tests"]
+        if connect_times:
+            tests["connect_time"] = LatencyHistogram.of(connect_times).summary()
+            tests["connect_time"]["failures"] = failures
+            print(f"    Avg connect time: {tests['connect_time']['avg']:.2f} ms")
 
-        try:
-            data = json.loads(result.stdout)
-            bps = data["end"]["sum_sent"]["bits_per_second"]
-            mbps = bps / 1_000_000
-
-            self.results["tests"]["throughput"] = {
-                "value": mbps,
-                "unit": "Mbps",
-                "duration": duration
-            }
+        samples = round_trips or connect_times
+        if samples:
+            tests["latency"] = LatencyHistogram.of(samples).summary()
+            tests["latency"]["method"] = "tcp_echo" if round_trips else "tcp_connect"
+            print(f"    Avg latency: {tests['latency']['avg']:.2f} ms "
+                  f"(p99 {tests['latency']['p99']:.2f} ms, {tests['latency']['method']})")
+        if not echo:
+            print(f"    [!] No probe server on port {self.port}; latency is from connect times")
+
+    def test_throughput(self, duration=10, streams=4):
+        """Parallel bulk streams, with RTT probes alongside"""
+        print(f"[+] Testing throughput to {self.target_host} ({streams} streams)...")
+        if not self.probe_server_available():
+            print(f"    [!] No probe server on port {self.port}, skipping throughput")
+            return
 
-            print(f"    Throughput: {mbps:.2f} Mbps")
-        except:
-            print("    [!] iperf3 parsing failed")
+        barrier = threading.Barrier(streams + 1)
+        stop = threading.Event()
+        with ThreadPoolExecutor(max_workers=streams + 1) as pool:
+            futures = [pool.submit(self.run_stream, duration, barrier) for _ in range(streams)]
+            # Queues fill under load, so allow round trips as long as the run
+            loaded = pool.submit(self.measure_round_trips, 10 ** 9, 0.05, stop,
+                                 duration + self.timeout)
+            barrier.wait()
+            start = time.perf_counter()
+            results = [f.result() for f in futures]
+            elapsed = time.perf_counter() - start
+            stop.set()
+            loaded_rtts = loaded.result()
 
-    def test_packet_loss(self, count=100):
-        """Test packet loss using ping"""
-        print(f"[+] Testing packet loss to {self.target_host}...")
+        received = [r[0] for r in results]
+        mbps = sum(received) * 8 / elapsed / 1_000_000
+        tests = self.results["tests"]
+        tests["throughput"] = {
+            "value": mbps,
+            "unit": "Mbps",
+            "duration": duration,
+            "streams": streams,
+            "per_stream_mbps": [b * 8 / elapsed / 1_000_000 for b in received],
+        }
+        print(f"    Throughput: {mbps:.2f} Mbps")
 
-        cmd = ["ping", "-c", str(count), self.target_host]
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        if loaded_rtts:
+            tests["latency_under_load"] = LatencyHistogram.of(loaded_rtts).summary()
+            print(f"    Latency under load: {tests['latency_under_load']['avg']:.2f} ms avg")
 
-        for line in result.stdout.splitlines():
-            if "packet loss" in line:
-                loss = line.split(",")[2].split("%")[0].strip()
-                self.results["tests"]["packet_loss"] = {
-                    "value": float(loss),
-                    "unit": "%"
-                }
-                print(f"    Packet loss: {loss}%")
+        counters = [r[1] for r in results if r[1]]
+        if counters:
+            retransmits = sum(c[0] for c in counters)
+            segments = sum(c[1] for c in counters)
+            tests["packet_loss"] = {
+                "value": retransmits / segments * 100 if segments else 0.0,
+                "unit": "%",
+                "method": "tcp_retransmits",
+                "retransmits": retransmits,
+                "segments": segments,
+            }
+            print(f"    Packet loss (TCP retransmits): {tests['packet_loss']['value']:.3f}%")
 
     def save_results(self, filename):
         with open(filename, "w") as f:
@@ -92,11 +282,10 @@ class NetworkPerformanceTester:
 
         print(f"[+] Results saved to {filename}")
 
-    def run_all(self):
+    def run_all(self, count=50, duration=10, streams=4):
         print("\n=== Network Performance Test ===\n")
-        self.test_latency()
-        self.test_throughput()
-        self.test_packet_loss()
+        self.test_latency(count)
+        self.test_throughput(duration, streams)
         print()
 
 
@@ -104,11 +293,34 @@ if __name__ == "__main__":
     import argparse
 
     parser = argparse.ArgumentParser(description="Network performance test")
-    parser.add_argument("--host", required=True, help="Target host")
+    parser.add_argument("--host", help="Target host")
+    parser.add_argument("--port", type=int, default=PROBE_PORT,
+                        help=f"Probe server port (default: {PROBE_PORT})")
+    parser.add_argument("--connect-port", type=int, default=None,
+                        help="Port for connect-time probes (default: --port)")
+    parser.add_argument("--count", type=int, default=50, help="Latency samples (default: 50)")
+    parser.add_argument("--duration", type=float, default=10,
+                        help="Throughput test seconds (default: 10)")
+    parser.add_argument("--streams", type=int, default=4,
+                        help="Parallel throughput streams (default: 4)")
+    parser.add_argument("--serve", action="store_true",
+                        help="Run the probe server instead of the tests")
+    parser.add_argument("--local-server", action="store_true",
+                        help="Start a probe server in this process on a free port (loopback tests)")
     parser.add_argument("--output", default="results.json", help="Output file")
     args = parser.parse_args()
 
-    tester = NetworkPerformanceTester(args.host)
-    tester.run_all()
-    tester.save_results(args.output)
-
+    if args.serve:
+        try:
+            ProbeServer(args.host or "0.0.0.0", args.port).start()
+        except KeyboardInterrupt:
+            print("\n[!] Probe server stopped")
+    else:
+        if not args.host:
+            parser.error("--host is required unless --serve is given")
+        port = args.port
+        if args.local_server:
+            port = ProbeServer(args.host, 0).start(background=True).port
+        tester = NetworkPerformanceTester(args.host, port, args.connect_port)
+        tester.run_all(args.count, args.duration, args.streams)
+        tester.save_results(args.output)
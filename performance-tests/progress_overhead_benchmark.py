@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Progress-reporting overhead benchmark for the file-transfer client.
+
+Uploads a test file with `FileTransferClient.send_file` to a discard-only
+sink on loopback (see `sender_rss_check.py`), once per progress mode
+(`none`, `bar`, `json`), with output sent to /dev/null. Runs of the modes
+are interleaved and the best time per mode is kept, so the comparison is
+not skewed by the machine warming up.
+
+End-to-end times on a busy or single-core machine vary by more than the
+effect being measured, so the pass/fail check uses a cost model instead:
+the measured cost of one `Progress.add` per chunk plus one rendered
+report per tick, as a share of the time the transfer itself takes per
+second (from the chunk rate of the `none` runs). The check fails
+(non-zero exit) if that exceeds --max-overhead percent for any mode.
+For comparison it also reports the old per-chunk `tqdm.update` cost when
+tqdm is installed.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from sender_rss_check import run_sink, write_test_file
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "file-transfer" / "client"))
+
+from file_client import FileTransferClient  # noqa: E402
+from shared.progress import Progress, ProgressTicker  # noqa: E402
+from shared.protocol import BUFFER_SIZE  # noqa: E402
+
+MODES = ("none", "bar", "json")
+
+
+def timed_upload(path: Path, mode: str) -> float:
+    server = socket.create_server(("127.0.0.1", 0))
+    sink = threading.Thread(target=run_sink, args=(server,), daemon=True)
+    sink.start()
+
+    client = FileTransferClient("127.0.0.1", server.getsockname()[1],
+                                heartbeat_interval=0, progress=mode)
+    with open(os.devnull, "w") as devnull, \
+            contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        client.connect()
+        start = time.perf_counter()
+        ok = client.send_file(str(path))
+        elapsed = time.perf_counter() - start
+        client.disconnect()
+
+    sink.join()
+    server.close()
+    if not ok:
+        raise RuntimeError(f"Upload failed in mode {mode}")
+    return elapsed
+
+
+def per_call_ns(func, calls: int) -> float:
+    start = time.perf_counter_ns()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter_ns() - start) / calls
+
+
+def hot_path_costs(calls: int = 1_000_000) -> dict:
+    """Cost of counting one chunk and of rendering one report, in ns."""
+    progress = Progress(1 << 40, "payload.bin")
+    costs = {"add_ns": per_call_ns(lambda: progress.add(BUFFER_SIZE), calls)}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for mode in ("bar", "json"):
+            ticker = ProgressTicker(mode, stream=devnull)
+            costs[f"report_{mode}_ns"] = per_call_ns(
+                lambda: ticker.report(progress), calls // 100)
+        try:
+            from tqdm import tqdm
+        except ImportError:
+            pass
+        else:
+            bar = tqdm(total=1 << 40, file=devnull)
+            costs["tqdm_update_ns"] = per_call_ns(lambda: bar.update(BUFFER_SIZE), calls)
+            bar.close()
+    return costs
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Progress reporting overhead benchmark.")
+    parser.add_argument("--size-mb", type=int, default=256,
+                        help="Size of the uploaded file in MB (default: 256)")
+    parser.add_argument("--runs", type=int, default=5,
+                        help="Uploads per mode, best is kept (default: 5)")
+    parser.add_argument("--max-overhead", type=float, default=1.0,
+                        help="Allowed overhead over no progress, in percent (default: 1)")
+    parser.add_argument(
+        "--output",
+        default="results/progress_overhead.json",
+        help="Path to output JSON file (default: results/progress_overhead.json)",
+    )
+    args = parser.parse_args()
+
+    print("=== Progress Overhead Benchmark ===")
+    times: dict[str, list[float]] = {mode: [] for mode in MODES}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "payload.bin"
+        write_test_file(path, args.size_mb * 1024 * 1024)
+        timed_upload(path, "none")  # warm-up
+
+        for run in range(args.runs):
+            for mode in MODES:
+                times[mode].append(timed_upload(path, mode))
+            print(f"[+] run {run + 1}/{args.runs}: " +
+                  "  ".join(f"{m}={times[m][-1]:.3f}s" for m in MODES))
+
+    best = {mode: min(t) for mode, t in times.items()}
+    results = {}
+    for mode in MODES:
+        results[mode] = {
+            "best_seconds": best[mode],
+            "mb_per_sec": args.size_mb / best[mode],
+            "measured_overhead_pct": (best[mode] / best["none"] - 1) * 100,
+            "samples": times[mode],
+        }
+        print(f"[+] {mode:>5}: {best[mode]:.3f}s ({args.size_mb / best[mode]:.0f} MB/s, "
+              f"{results[mode]['measured_overhead_pct']:+.2f}% end to end)")
+
+    costs = hot_path_costs()
+    chunks_per_sec = args.size_mb * 1024 * 1024 / BUFFER_SIZE / best["none"]
+    ticks_per_sec = 1 / ProgressTicker().interval
+    print(f"[+] Progress.add: {costs['add_ns']:.0f} ns/chunk at "
+          f"{chunks_per_sec:.0f} chunks/s")
+    for mode in MODES:
+        report_ns = costs.get(f"report_{mode}_ns", 0.0)
+        overhead = (costs["add_ns"] * chunks_per_sec + report_ns * ticks_per_sec) / 1e7
+        results[mode]["overhead_pct"] = overhead
+        print(f"[+] {mode:>5}: modelled overhead {overhead:.3f}%")
+    if "tqdm_update_ns" in costs:
+        print(f"[+] per-chunk tqdm.update (old client): {costs['tqdm_update_ns']:.0f} ns/chunk, "
+              f"{costs['tqdm_update_ns'] * chunks_per_sec / 1e7:.2f}%")
+
+    passed = all(r["overhead_pct"] <= args.max_overhead for r in results.values())
+    print(f"[{'+' if passed else '!'}] {'PASS' if passed else 'FAIL'}: "
+          f"overhead limit {args.max_overhead}%")
+
+    output_data = {
+        "timestamp": datetime.now().isoformat(),
+        "target": "127.0.0.1",
+        "config": vars(args),
+        "tests": {"progress_overhead": results, "progress_costs": costs},
+        "passed": passed,
+    }
+
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with output_path.open("w", encoding="utf-8") as f:
+        json.dump(output_data, f, indent=2)
+    print(f"\n[+] Progress overhead results saved to {output_path}")
+
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Resource sampler for the chat and file-transfer servers.
+
+Reads /proc and /sys/class/net directly instead of forking top, free and
+friends every second (what scripts/monitor_resources.sh used to do). Each
+process and interface keeps its files open and re-reads them with one
+pread per file per sample, so sampling costs a handful of system calls.
+
+Per process (found by PID or by a pattern in its script name):
+CPU %, RSS, threads, open fds and voluntary/involuntary context switches
+per second. Per interface: bytes and packets per second and drops each
+way.
+
+Rows go to a CSV file, one per process or interface per sample, with the
+wall-clock time so ResultsAnalyzer can line them up against the test
+timeline (results/logs/timeline.json, written by run_all_tests.py):
+
+    time,source,cpu_percent,rss_mb,threads,fds,ctx_voluntary_s,...
+
+    python3 resource_sampler.py --match chat_server file_server --interfaces tun0 lo
+"""
+
+import csv
+import os
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_MATCH = ["chat_server", "file_server"]
+# Seconds between scans of /proc for new matching processes; a scan reads
+# two small files per process, about 1 ms on a quiet machine
+RESCAN_SECONDS = 1.0
+
+CSV_COLUMNS = [
+    "time", "source",
+    "cpu_percent", "rss_mb", "threads", "fds", "ctx_voluntary_s", "ctx_involuntary_s",
+    "rx_bytes_s", "tx_bytes_s", "rx_packets_s", "tx_packets_s", "rx_dropped", "tx_dropped",
+]
+NET_COUNTERS = ["rx_bytes", "tx_bytes", "rx_packets", "tx_packets", "rx_dropped", "tx_dropped"]
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def process_label(pid: int) -> str:
+    """Script name for Python processes (e.g. chat_server.py), else the command"""
+    with open(f"/proc/{pid}/comm") as f:
+        command = f.read().strip()
+    if not command.startswith("python"):
+        return command
+    with open(f"/proc/{pid}/cmdline", "rb") as f:
+        args = f.read().decode("utf-8", "replace").split("\0")
+    for arg in args[1:]:
+        if arg.endswith(".py"):
+            return os.path.basename(arg)
+    return command
+
+
+def pread_text(fd: int, size: int = 4096) -> str:
+    return os.pread(fd, size, 0).decode("ascii", "replace")
+
+
+class ProcessReader:
+    """Counters of one process from /proc/<pid>/stat, status and fd"""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.name = f"{process_label(pid)}:{pid}"
+        self.stat_fd = os.open(f"/proc/{pid}/stat", os.O_RDONLY)
+        self.status_fd = os.open(f"/proc/{pid}/status", os.O_RDONLY)
+
+    def read(self) -> dict:
+        # Fields after "(comm)" start at field 3: utime 14, stime 15,
+        # num_threads 20, rss 24 (in pages)
+        fields = pread_text(self.stat_fd).rsplit(")", 1)[1].split()
+        counters = {
+            "cpu_ticks": int(fields[11]) + int(fields[12]),
+            "threads": int(fields[17]),
+            "rss_mb": int(fields[21]) * PAGE_SIZE / (1024 * 1024),
+            "fds": len(os.listdir(f"/proc/{self.pid}/fd")),
+        }
+        for line in pread_text(self.status_fd, 8192).splitlines():
+            if line.startswith("voluntary_ctxt_switches:"):
+                counters["ctx_voluntary"] = int(line.split()[1])
+            elif line.startswith("nonvoluntary_ctxt_switches:"):
+                counters["ctx_involuntary"] = int(line.split()[1])
+        return counters
+
+    @staticmethod
+    def rates(previous: dict, current: dict, seconds: float) -> dict:
+        return {
+            "cpu_percent": (current["cpu_ticks"] - previous["cpu_ticks"])
+            / CLOCK_TICKS / seconds * 100,
+            "rss_mb": current["rss_mb"],
+            "threads": current["threads"],
+            "fds": current["fds"],
+            "ctx_voluntary_s": (current["ctx_voluntary"] - previous["ctx_voluntary"]) / seconds,
+            "ctx_involuntary_s": (current["ctx_involuntary"]
+                                  - previous["ctx_involuntary"]) / seconds,
+        }
+
+    def close(self) -> None:
+        os.close(self.stat_fd)
+        os.close(self.status_fd)
+
+
+class InterfaceReader:
+    """Counters of one interface from /sys/class/net/<name>/statistics"""
+
+    def __init__(self, name: str):
+        self.name = f"net:{name}"
+        base = Path("/sys/class/net") / name / "statistics"
+        self.fds = {c: os.open(base / c, os.O_RDONLY) for c in NET_COUNTERS}
+
+    def read(self) -> dict:
+        return {c: int(os.pread(fd, 32, 0)) for c, fd in self.fds.items()}
+
+    @staticmethod
+    def rates(previous: dict, current: dict, seconds: float) -> dict:
+        rates = {f"{c}_s": (current[c] - previous[c]) / seconds for c in NET_COUNTERS[:4]}
+        for c in NET_COUNTERS[4:]:
+            rates[c] = current[c] - previous[c]
+        return rates
+
+    def close(self) -> None:
+        for fd in self.fds.values():
+            os.close(fd)
+
+
+def find_processes(patterns: list[str]) -> list[int]:
+    """PIDs whose label (see process_label) contains any of the patterns"""
+    pids = []
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit() or int(entry.name) == os.getpid():
+            continue
+        try:
+            label = process_label(int(entry.name))
+        except OSError:
+            continue
+        if any(p in label for p in patterns):
+            pids.append(int(entry.name))
+    return pids
+
+
+class ResourceSampler(threading.Thread):
+    """Sample processes and interfaces into a CSV file until stopped"""
+
+    def __init__(self, output, pids=(), match=(), interfaces=None, interval: float = 1.0):
+        super().__init__(daemon=True)
+        self.output = Path(output)
+        self.pids = list(pids)
+        self.match = list(match)
+        self.interfaces = interfaces if interfaces is not None else sorted(
+            os.listdir("/sys/class/net"))
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.readers: dict[str, object] = {}
+        self.previous: dict[str, dict] = {}
+        self.rows = 0
+
+    def add_process(self, pid: int) -> None:
+        try:
+            reader = ProcessReader(pid)
+        except OSError:
+            return
+        if reader.name in self.readers:
+            reader.close()
+        else:
+            self.readers[reader.name] = reader
+
+    def refresh_processes(self) -> None:
+        known = {r.pid for r in self.readers.values() if isinstance(r, ProcessReader)}
+        for pid in set(self.pids + find_processes(self.match) if self.match else self.pids):
+            if pid not in known:
+                self.add_process(pid)
+
+    def sample(self, writer: csv.DictWriter, elapsed: float) -> None:
+        stamp = time.time()
+        for name, reader in list(self.readers.items()):
+            try:
+                current = reader.read()
+            except OSError:
+                # The process exited or the interface went away
+                reader.close()
+                del self.readers[name]
+                self.previous.pop(name, None)
+                continue
+            previous = self.previous.get(name)
+            self.previous[name] = current
+            if previous is None or elapsed <= 0:
+                continue
+            row = reader.rates(previous, current, elapsed)
+            row.update(time=f"{stamp:.3f}", source=name)
+            writer.writerow({k: round(v, 3) if isinstance(v, float) else v
+                             for k, v in row.items()})
+            self.rows += 1
+
+    def run(self) -> None:
+        for name in self.interfaces:
+            try:
+                reader = InterfaceReader(name)
+                self.readers[reader.name] = reader
+            except OSError:
+                print(f"[!] No interface {name}, not sampled")
+        self.refresh_processes()
+
+        self.output.parent.mkdir(parents=True, exist_ok=True)
+        with self.output.open("w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+            writer.writeheader()
+            last = time.monotonic()
+            self.sample(writer, 0)
+            last_scan = last
+            # Sample on a fixed schedule so slow samples do not drift the rate
+            next_sample = last + self.interval
+            while not self.stop_event.wait(max(0.0, next_sample - time.monotonic())):
+                now = time.monotonic()
+                self.sample(writer, now - last)
+                f.flush()
+                last = now
+                next_sample += self.interval
+                if self.match and now - last_scan >= RESCAN_SECONDS:
+                    self.refresh_processes()
+                    last_scan = now
+            # A last, shorter interval up to the moment we were stopped
+            self.sample(writer, time.monotonic() - last)
+
+        for reader in self.readers.values():
+            reader.close()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        self.join()
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sample server processes and interfaces.")
+    parser.add_argument("--pid", type=int, action="append", default=[],
+                        help="Process to sample (repeatable)")
+    parser.add_argument("--match", nargs="*", default=None,
+                        help="Sample processes whose script name contains any of these "
+                             f"(default: {' '.join(DEFAULT_MATCH)}, unless --pid is given)")
+    parser.add_argument("--interfaces", nargs="*", default=None,
+                        help="Interfaces to sample (default: all)")
+    parser.add_argument("--interval", type=float, default=1.0,
+                        help="Seconds between samples (default: 1)")
+    parser.add_argument("--duration", type=float, default=0,
+                        help="Seconds to sample, 0 until interrupted (default: 0)")
+    parser.add_argument("--output", default="results/resources.csv",
+                        help="CSV file (default: results/resources.csv)")
+    args = parser.parse_args()
+
+    match = args.match if args.match is not None else ([] if args.pid else DEFAULT_MATCH)
+    sampler = ResourceSampler(args.output, args.pid, match, args.interfaces, args.interval)
+    start_cpu = time.process_time()
+    start = time.monotonic()
+    sampler.start()
+    print(f"[+] Sampling every {args.interval:g}s into {args.output}"
+          + (f" for {args.duration:g}s" if args.duration else " (Ctrl-C to stop)"))
+    try:
+        if args.duration:
+            time.sleep(args.duration)
+        else:
+            while True:
+                time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    sampler.stop()
+
+    elapsed = time.monotonic() - start
+    overhead = (time.process_time() - start_cpu) / elapsed * 100 if elapsed else 0
+    print(f"[+] Wrote {sampler.rows} rows; sampler used {overhead:.2f}% of a CPU")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Results store for the performance tests.
+
+An append-only SQLite database (WAL mode, `results/results.sqlite3` by
+default) that keeps every run the tests have written. `ingest()` compares
+the results directory against the stored (file, size, mtime) of every run
+and parses only files that are new or were rewritten since, so a nightly
+run adds its files without reloading the history. A rewritten file is a
+new run; older runs are never changed.
+
+For each run it stores:
+
+  - the document itself (zlib-compressed JSON), so the analyzer can read
+    the latest run of each scenario without loading the rest
+  - every numeric value under `tests` as a metric row (test, name, value),
+    e.g. ("throughput", "value") or ("chat_latency", "p99")
+  - latency histogram buckets (see latency_histogram.py), with their
+    percentiles computed once at ingest time with NumPy and cached
+
+`regressions()` compares each throughput metric's latest run with the
+median of the runs before it and flags drops larger than a threshold or
+the series' own noise (scaled median absolute deviation), whichever is
+larger.
+
+    python3 results_store.py --dir results                 # ingest new files
+    python3 results_store.py --trend throughput/value      # one metric by run
+    python3 results_store.py --regressions                 # exit 1 on a drop
+"""
+
+import json
+import sqlite3
+import subprocess
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from latency_histogram import PERCENTILES, find_histograms
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+STORE_NAME = "results.sqlite3"
+
+# Earlier runs a regression is judged against, and how many are needed
+BASELINE_RUNS = 5
+MIN_BASELINE_RUNS = 3
+# Minimum relative drop flagged, and how many noise widths a drop must exceed
+DROP_THRESHOLD = 0.05
+NOISE_WIDTHS = 3.0
+# MAD to standard deviation for normally distributed noise
+MAD_SCALE = 1.4826
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id    INTEGER PRIMARY KEY,
+    scenario  TEXT NOT NULL,
+    source    TEXT NOT NULL,
+    size      INTEGER NOT NULL,
+    mtime_ns  INTEGER NOT NULL,
+    timestamp TEXT,
+    build     TEXT,
+    document  BLOB NOT NULL,
+    UNIQUE (source, size, mtime_ns)
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs,
+    test   TEXT NOT NULL,
+    name   TEXT NOT NULL,
+    value  REAL NOT NULL,
+    unit   TEXT
+);
+CREATE INDEX IF NOT EXISTS metrics_series ON metrics (test, name, run_id);
+CREATE TABLE IF NOT EXISTS buckets (
+    run_id INTEGER NOT NULL REFERENCES runs,
+    test   TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    count  INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS buckets_run ON buckets (run_id, test);
+CREATE TABLE IF NOT EXISTS aggregates (
+    run_id          INTEGER NOT NULL REFERENCES runs,
+    test            TEXT NOT NULL,
+    sub_bucket_bits INTEGER NOT NULL,
+    samples         INTEGER NOT NULL,
+    min             REAL,
+    max             REAL,
+    mean            REAL,
+    p50             REAL,
+    p90             REAL,
+    p99             REAL,
+    p999            REAL,
+    PRIMARY KEY (run_id, test)
+);
+CREATE TABLE IF NOT EXISTS state (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def current_build() -> str:
+    """Short commit hash of the checkout, or "unknown" outside git"""
+    try:
+        completed = subprocess.run(
+            ["git", "-C", str(PROJECT_ROOT), "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        )
+        return completed.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def flatten_metrics(tests: dict) -> list[tuple[str, str, float, str | None]]:
+    """(test, name, value, unit) for every number under `tests`.
+
+    Nested keys and list positions are joined with "/"; histograms are
+    stored as buckets instead, so they are skipped here.
+    """
+    rows = []
+
+    def walk(test: str, path: list[str], value, unit: str | None) -> None:
+        if isinstance(value, dict):
+            unit = value.get("unit", unit) if isinstance(value.get("unit"), str) else unit
+            for key, inner in value.items():
+                if key != "histogram":
+                    walk(test, path + [str(key)], inner, unit)
+        elif isinstance(value, list):
+            for i, inner in enumerate(value):
+                walk(test, path + [str(i)], inner, unit)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            rows.append((test, "/".join(path), float(value), unit))
+
+    for test, value in tests.items():
+        walk(test, [], value, None)
+    return rows
+
+
+def bucket_values(buckets: np.ndarray, sub_bucket_bits: int) -> np.ndarray:
+    """Middle of each bucket in us (LatencyHistogram.bucket_range, vectorized)"""
+    half = 1 << (sub_bucket_bits - 1)
+    exponent = np.maximum(buckets // half - 1, 0)
+    linear = buckets < (1 << sub_bucket_bits)
+    low = np.where(linear, buckets, (buckets - exponent * half) << exponent)
+    width = np.where(linear, 1, 1 << exponent)
+    return low + (width - 1) / 2
+
+
+def bucket_percentiles(buckets: np.ndarray, counts: np.ndarray, sub_bucket_bits: int,
+                       lowest: float, highest: float) -> dict[str, float]:
+    """Nearest-rank percentiles in ms from sorted bucket indices and counts"""
+    cumulative = np.cumsum(counts)
+    ranks = np.maximum(1, np.ceil(np.array(list(PERCENTILES.values())) / 100
+                                  * cumulative[-1]))
+    positions = np.searchsorted(cumulative, ranks)
+    values = np.clip(bucket_values(buckets[positions], sub_bucket_bits), lowest, highest)
+    return dict(zip(PERCENTILES, (values / 1000).tolist()))
+
+
+def is_throughput(test: str, name: str) -> bool:
+    """Metrics where a lower value is a regression"""
+    last = name.rsplit("/", 1)[-1]
+    return (("throughput" in test and last == "value")
+            or last.endswith("_mbps") or last.endswith("per_sec"))
+
+
+class ResultsStore:
+    """Append-only SQLite store of every results file the tests wrote"""
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db = sqlite3.connect(self.db_path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def ingest(self, results_dir, build: str | None = None) -> list[int]:
+        """Store results files that are new or changed; returns the new run IDs"""
+        stored = set(self.db.execute("SELECT source, size, mtime_ns FROM runs"))
+        build = build or current_build()
+        new_runs = []
+
+        for path in sorted(Path(results_dir).glob("*.json")):
+            st = path.stat()
+            if (path.name, st.st_size, st.st_mtime_ns) in stored:
+                continue
+            try:
+                with path.open(encoding="utf-8") as f:
+                    document = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[!] Skipping {path.name}: {e}")
+                continue
+            if not isinstance(document, dict):
+                continue
+            with self.db:
+                new_runs.append(self.add_run(path, st, document, build))
+        return new_runs
+
+    def add_run(self, path: Path, st, document: dict, build: str) -> int:
+        cursor = self.db.execute(
+            "INSERT INTO runs (scenario, source, size, mtime_ns, timestamp, build, document) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (path.stem, path.name, st.st_size, st.st_mtime_ns, document.get("timestamp"),
+             document.get("build", build),
+             zlib.compress(json.dumps(document).encode("utf-8"))),
+        )
+        run_id = cursor.lastrowid
+        tests = document.get("tests", {})
+        if not isinstance(tests, dict):
+            return run_id
+
+        self.db.executemany(
+            "INSERT INTO metrics VALUES (?, ?, ?, ?, ?)",
+            [(run_id, *row) for row in flatten_metrics(tests)],
+        )
+        for test, latency in find_histograms(tests).items():
+            histogram = latency["histogram"]
+            if not histogram["counts"]:
+                continue
+            buckets = np.array([int(i) for i in histogram["counts"]], dtype=np.int64)
+            counts = np.array(list(histogram["counts"].values()), dtype=np.int64)
+            order = np.argsort(buckets)
+            buckets, counts = buckets[order], counts[order]
+            self.db.executemany(
+                "INSERT INTO buckets VALUES (?, ?, ?, ?)",
+                zip([run_id] * len(buckets), [test] * len(buckets),
+                    buckets.tolist(), counts.tolist()),
+            )
+            samples = int(counts.sum())
+            pcts = bucket_percentiles(buckets, counts, histogram["sub_bucket_bits"],
+                                      histogram["min"], histogram["max"])
+            self.db.execute(
+                "INSERT INTO aggregates VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, test, histogram["sub_bucket_bits"], samples,
+                 histogram["min"] / 1000, histogram["max"] / 1000,
+                 histogram["sum"] / samples / 1000, *pcts.values()),
+            )
+        return run_id
+
+    def latest_documents(self, scenarios=None) -> dict[str, dict]:
+        """The latest run of each scenario, decoded"""
+        rows = self.db.execute(
+            "SELECT scenario, document FROM runs WHERE run_id IN "
+            "(SELECT MAX(run_id) FROM runs GROUP BY scenario)"
+        )
+        return {
+            scenario: json.loads(zlib.decompress(document))
+            for scenario, document in rows
+            if scenarios is None or scenario in scenarios
+        }
+
+    def series(self, test: str, name: str, scenario: str | None = None) -> dict[str, dict]:
+        """A metric over all runs, by scenario: {"run_ids", "builds", "timestamps", "values"}"""
+        query = ("SELECT r.scenario, r.run_id, r.build, r.timestamp, m.value "
+                 "FROM metrics m JOIN runs r USING (run_id) WHERE m.test = ? AND m.name = ?")
+        params = [test, name]
+        if scenario:
+            query += " AND r.scenario = ?"
+            params.append(scenario)
+        result = {}
+        for scenario, run_id, build, timestamp, value in self.db.execute(
+                query + " ORDER BY r.run_id", params):
+            entry = result.setdefault(scenario, {"run_ids": [], "builds": [],
+                                                 "timestamps": [], "values": []})
+            entry["run_ids"].append(run_id)
+            entry["builds"].append(build)
+            entry["timestamps"].append(timestamp)
+            entry["values"].append(value)
+        for entry in result.values():
+            entry["values"] = np.array(entry["values"])
+        return result
+
+    def latency_trend(self, test: str) -> dict[str, list[tuple]]:
+        """Cached percentiles of a latency test by scenario, oldest run first"""
+        result = {}
+        for row in self.db.execute(
+                "SELECT r.scenario, r.run_id, r.build, a.p50, a.p90, a.p99, a.p999 "
+                "FROM aggregates a JOIN runs r USING (run_id) WHERE a.test = ? "
+                "ORDER BY r.run_id", (test,)):
+            result.setdefault(row[0], []).append(row[1:])
+        return result
+
+    def throughput_metrics(self) -> list[tuple[str, str]]:
+        names = self.db.execute("SELECT DISTINCT test, name FROM metrics ORDER BY test, name")
+        return [(test, name) for test, name in names if is_throughput(test, name)]
+
+    def regressions(self, threshold: float = DROP_THRESHOLD,
+                    baseline_runs: int = BASELINE_RUNS) -> list[dict]:
+        """Throughput metrics whose latest run dropped beyond the noise"""
+        flagged = []
+        for test, name in self.throughput_metrics():
+            for scenario, entry in self.series(test, name).items():
+                values = entry["values"]
+                history = values[-baseline_runs - 1:-1]
+                if len(history) < MIN_BASELINE_RUNS:
+                    continue
+                baseline = float(np.median(history))
+                if baseline <= 0:
+                    continue
+                noise = MAD_SCALE * float(np.median(np.abs(history - baseline))) / baseline
+                drop = (baseline - float(values[-1])) / baseline
+                limit = max(threshold, NOISE_WIDTHS * noise)
+                if drop > limit:
+                    flagged.append({
+                        "scenario": scenario,
+                        "metric": f"{test}/{name}",
+                        "baseline": baseline,
+                        "latest": float(values[-1]),
+                        "drop_percent": drop * 100,
+                        "limit_percent": limit * 100,
+                        "build": entry["builds"][-1],
+                        "run_id": entry["run_ids"][-1],
+                    })
+        return flagged
+
+    def latest_run_id(self) -> int:
+        return self.db.execute("SELECT COALESCE(MAX(run_id), 0) FROM runs").fetchone()[0]
+
+    def get_state(self, key: str) -> str | None:
+        row = self.db.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, key: str, value: str) -> None:
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO state VALUES (?, ?)", (key, value))
+
+    def close(self) -> None:
+        self.db.close()
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Store results files and show trends.")
+    parser.add_argument("--dir", default="./results", help="Results directory")
+    parser.add_argument("--db", default=None, help=f"Store path (default: <dir>/{STORE_NAME})")
+    parser.add_argument("--build", default=None,
+                        help="Build label for new runs (default: git commit)")
+    parser.add_argument("--trend", default=None, metavar="TEST/NAME",
+                        help="Print one metric across runs, e.g. throughput/value")
+    parser.add_argument("--regressions", action="store_true",
+                        help="Report throughput drops; exit 1 if there are any")
+    parser.add_argument("--threshold", type=float, default=DROP_THRESHOLD * 100,
+                        help=f"Smallest drop flagged, in %% (default: {DROP_THRESHOLD * 100:g})")
+    args = parser.parse_args()
+
+    store = ResultsStore(args.db or Path(args.dir) / STORE_NAME)
+    new_runs = store.ingest(args.dir, args.build)
+    print(f"[+] Stored {len(new_runs)} new runs ({store.latest_run_id()} runs in total)")
+
+    if args.trend:
+        test, _, name = args.trend.partition("/")
+        for scenario, entry in store.series(test, name or "value").items():
+            print(f"\n{scenario}")
+            for run_id, build, value in zip(entry["run_ids"], entry["builds"], entry["values"]):
+                print(f"  run {run_id:>5}  {build:>10}  {value:12.3f}")
+
+    if args.regressions:
+        flagged = store.regressions(args.threshold / 100)
+        for r in flagged:
+            print(f"[!] {r['scenario']} {r['metric']}: {r['latest']:.2f} vs "
+                  f"{r['baseline']:.2f} baseline, -{r['drop_percent']:.1f}% "
+                  f"(limit {r['limit_percent']:.1f}%, build {r['build']})")
+        if not flagged:
+            print("[+] No throughput regressions")
+        store.close()
+        raise SystemExit(1 if flagged else 0)
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,93 +4,241 @@ Master test runner for COSC 450 VPN project.
 
 This script runs:
   1. Network performance tests (baseline, VPN-only, VPN+full network)
-  2. Application-level performance tests (file-transfer)
+  2. Application-level performance tests (file-transfer, chat load on loopback,
+     file client startup time, socket profiles over an emulated link)
   3. Result analysis and plot generation
 
+The scenarios form a dependency graph: each one lists the scenarios it
+needs, how many CPUs it keeps busy and which shared resources it uses
+exclusively. Scenarios whose dependencies are done run concurrently while
+they fit in the CPU budget (--cpus, default: CPU count) and do not share a
+resource. For example, two tests through the VPN tunnel never overlap,
+because each would measure the other's traffic. Timing-sensitive tests
+(chat load, client startup) take the whole budget and run alone.
+`--cpus 1` runs everything in sequence. Each scenario's output goes to
+results/logs/<scenario>.log.
+
+While the suite runs, `resource_sampler.py` samples the chat and file
+servers and the network interfaces into results/resources.csv. When each
+scenario started and ended is written to results/logs/timeline.json, so
+the analyzer can line the two up.
+
 It assumes:
-  - iperf3 server is already running (e.g., `iperf3 -s -D`)
+  - the probe server is running on the VPN server
+    (`python3 network_performance.py --serve`); the loopback baseline
+    starts its own, and github.com is probed on port 443 (connect times only)
   - OpenVPN is connected when running VPN-related tests
   - File-transfer servers are running for application tests
+
+With --emulate PRESET, the application tests reach the local servers
+through `wan_emulator.py` instead of the VPN tunnel.
 """
 
+import argparse
+import json
+import os
 import subprocess
+import sys
+import time
 from pathlib import Path
 
-
-def run(cmd: list[str]) -> None:
-    """Run a command and echo it, raising on error."""
-    print("\n[+] Running:", " ".join(cmd))
-    subprocess.run(cmd, check=True)
+from resource_sampler import DEFAULT_MATCH, ResourceSampler
+
+# Scenarios taking ALL_CPUS run with nothing else alongside
+ALL_CPUS = 10 ** 6
+POLL_INTERVAL = 0.2
+
+
+def scenario(name: str, cmd: list[str], needs: list[str] = (), cpus: int = 1,
+             uses: set[str] = frozenset(), needs_success: bool = True) -> dict:
+    return {
+        "name": name,
+        "cmd": cmd,
+        "needs": list(needs),
+        "cpus": cpus,
+        "uses": set(uses),
+        "needs_success": needs_success,
+    }
+
+
+def check_graph(scenarios: list[dict]) -> None:
+    """Raise ValueError on unknown dependencies or cycles"""
+    names = {s["name"] for s in scenarios}
+    for s in scenarios:
+        unknown = set(s["needs"]) - names
+        if unknown:
+            raise ValueError(f"{s['name']} needs unknown scenarios: {sorted(unknown)}")
+
+    done: set[str] = set()
+    remaining = list(scenarios)
+    while remaining:
+        ready = [s for s in remaining if set(s["needs"]) <= done]
+        if not ready:
+            raise ValueError("Dependency cycle among: "
+                             + ", ".join(s["name"] for s in remaining))
+        done.update(s["name"] for s in ready)
+        remaining = [s for s in remaining if s["name"] not in done]
+
+
+def run_graph(scenarios: list[dict], cpu_budget: int, log_dir: Path,
+              timeline: list | None = None) -> dict[str, str]:
+    """Run the scenarios as their dependencies and resources allow.
+
+    Returns each scenario's outcome: "ok", "failed" or "skipped" (a
+    dependency it needs did not succeed). Each scenario that ran is added
+    to `timeline` with its wall-clock start and end.
+    """
+    check_graph(scenarios)
+    log_dir.mkdir(parents=True, exist_ok=True)
+    pending = list(scenarios)
+    running: dict[str, tuple[subprocess.Popen, dict, float, object, float]] = {}
+    outcome: dict[str, str] = {}
+    suite_start = time.monotonic()
+
+    def cpus_of(s: dict) -> int:
+        return min(s["cpus"], cpu_budget)
+
+    while pending or running:
+        for s in list(pending):
+            if not set(s["needs"]) <= outcome.keys():
+                continue
+            if s["needs_success"] and any(outcome[n] != "ok" for n in s["needs"]):
+                outcome[s["name"]] = "skipped"
+                pending.remove(s)
+                print(f"[!] {s['name']}: skipped, a dependency did not succeed")
+                continue
+            in_use = sum(cpus_of(r[1]) for r in running.values())
+            busy = set().union(*(r[1]["uses"] for r in running.values()))
+            if running and (in_use + cpus_of(s) > cpu_budget or s["uses"] & busy):
+                continue
+
+            log = (log_dir / f"{s['name']}.log").open("w")
+            log.write("$ " + " ".join(s["cmd"]) + "\n")
+            log.flush()
+            proc = subprocess.Popen(s["cmd"], stdout=log, stderr=subprocess.STDOUT)
+            running[s["name"]] = (proc, s, time.monotonic(), log, time.time())
+            pending.remove(s)
+            print(f"[+] {time.monotonic() - suite_start:7.1f}s  started  {s['name']}")
+
+        time.sleep(POLL_INTERVAL)
+        for name, (proc, s, started, log, wall_start) in list(running.items()):
+            if proc.poll() is None:
+                continue
+            log.close()
+            del running[name]
+            outcome[name] = "ok" if proc.returncode == 0 else "failed"
+            elapsed = time.monotonic() - started
+            if timeline is not None:
+                timeline.append({"scenario": name, "start": wall_start,
+                                 "end": time.time(), "outcome": outcome[name]})
+            print(f"[+] {time.monotonic() - suite_start:7.1f}s  {outcome[name]:>7}  "
+                  f"{name} ({elapsed:.1f}s)")
+            if proc.returncode != 0:
+                tail = (log_dir / f"{name}.log").read_text(errors="replace").splitlines()[-10:]
+                print("\n".join(f"        | {line}" for line in tail))
+
+    return outcome
 
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description="Run all performance tests.")
+    parser.add_argument("--emulate", default=None,
+                        help="Emulated link preset for the application tests (see wan_emulator.py)")
+    parser.add_argument("--cpus", type=int, default=os.cpu_count() or 1,
+                        help="CPU budget for concurrent scenarios; 1 runs them in sequence "
+                             "(default: CPU count)")
+    parser.add_argument("--sample-interval", type=float, default=0.5,
+                        help="Seconds between resource samples, 0 to disable (default: 0.5)")
+    parser.add_argument("--fast-charts", action="store_true",
+                        help="Render charts at low resolution (analyze_results.py --fast)")
+    args = parser.parse_args()
+    emulate = ["--emulate", args.emulate] if args.emulate else []
+
     here = Path(__file__).resolve().parent
     results_dir = here / "results"
     results_dir.mkdir(exist_ok=True)
+    python = sys.executable
+
+    def script(name: str, output: str, *extra: str) -> list[str]:
+        return [python, str(here / name), *extra, "--output", str(results_dir / output)]
+
+    # Without a baseline there is nothing to gate on yet: this run saves one
+    baseline = results_dir / "baselines" / "microbench.json"
+    if not baseline.exists():
+        print(f"[!] No microbenchmark baseline at {baseline}; this run saves one "
+              "instead of comparing")
+
+    scenarios = [
+        # 1. Network performance tests
+        scenario("baseline_network",
+                 script("network_performance.py", "baseline_network.json",
+                        "--host", "127.0.0.1", "--local-server"),
+                 cpus=2),
+        scenario("vpn_network",
+                 script("network_performance.py", "vpn_network.json", "--host", "10.8.0.1"),
+                 uses={"tunnel"}),
+        scenario("vpn_full_network",
+                 script("network_performance.py", "vpn_full_network.json",
+                        "--host", "github.com", "--port", "443"),
+                 uses={"tunnel"}),
+        # 2. Application performance tests
+        scenario("app_performance",
+                 script("application_performance.py", "app_performance.json", *emulate),
+                 cpus=2, uses=set() if args.emulate else {"tunnel"}),
+        scenario("chat_load", script("chat_load_test.py", "chat_load.json", *emulate),
+                 cpus=ALL_CPUS),
+        scenario("client_startup",
+                 script("client_startup_benchmark.py", "client_startup.json"),
+                 cpus=ALL_CPUS),
+        scenario("socket_profiles",
+                 script("socket_profile_sweep.py", "socket_profiles.json"),
+                 cpus=2),
+        scenario("upload_header_check",
+                 script("upload_header_check.py", "upload_header_check.json")),
+        scenario("microbench",
+                 script("microbench.py", "microbench.json",
+                        "--compare" if baseline.exists() else "--save-baseline",
+                        "--baseline", str(baseline)),
+                 cpus=ALL_CPUS),
+    ]
+    # 3. Analyze whatever results the tests produced
+    scenarios.append(scenario(
+        "analysis",
+        [python, str(here / "analyze_results.py"), "--dir", str(results_dir),
+         "--jobs", str(args.cpus), *(["--fast"] if args.fast_charts else [])],
+        needs=[s["name"] for s in scenarios], cpus=ALL_CPUS, needs_success=False,
+    ))
 
     print("=== Master Test Runner ===")
-
-    # 1. Network performance tests
-    print("\n=== Step 1: Network performance tests ===")
-    run(
-        [
-            "python3",
-            str(here / "network_performance.py"),
-            "--host",
-            "127.0.0.1",
-            "--output",
-            str(results_dir / "baseline_network.json"),
-        ]
-    )
-
-    run(
-        [
-            "python3",
-            str(here / "network_performance.py"),
-            "--host",
-            "10.8.0.1",
-            "--output",
-            str(results_dir / "vpn_network.json"),
-        ]
-    )
-
-    run(
-        [
-            "python3",
-            str(here / "network_performance.py"),
-            "--host",
-            "github.com",
-            "--output",
-            str(results_dir / "vpn_full_network.json"),
-        ]
-    )
-
-    # 2. Application performance tests
-    print("\n=== Step 2: Application performance tests ===")
-    run(
-        [
-            "python3",
-            str(here / "application_performance.py"),
-            "--output",
-            str(results_dir / "app_performance.json"),
-        ]
-    )
-
-    # 3. Analyze results (network plots + summary)
-    print("\n=== Step 3: Analyzing results & generating plots ===")
-    run(
-        [
-            "python3",
-            str(here / "analyze_results.py"),
-            "--dir",
-            str(results_dir),
-        ]
-    )
-
-    print("\n[+] All tests completed successfully.")
+    print(f"[+] {len(scenarios)} scenarios, CPU budget {args.cpus}, "
+          f"logs in {results_dir / 'logs'}")
+    start = time.monotonic()
+    sampler = None
+    if args.sample_interval > 0:
+        sampler = ResourceSampler(results_dir / "resources.csv", match=DEFAULT_MATCH,
+                                  interval=args.sample_interval)
+        sampler.start()
+    timeline: list[dict] = []
+    # The analysis reads the samples, so the sampler stops before it runs
+    tests, analysis = scenarios[:-1], scenarios[-1]
+    try:
+        outcome = run_graph(tests, max(1, args.cpus), results_dir / "logs", timeline)
+    finally:
+        if sampler:
+            sampler.stop()
+        with (results_dir / "logs" / "timeline.json").open("w") as f:
+            json.dump(timeline, f, indent=2)
+    outcome.update(run_graph([dict(analysis, needs=[])], max(1, args.cpus),
+                             results_dir / "logs"))
+
+    failed = [name for name, result in outcome.items() if result != "ok"]
+    print(f"\n[+] Finished in {time.monotonic() - start:.0f}s")
     print(f"[+] Results directory: {results_dir}")
+    if failed:
+        print(f"[!] Not successful: {', '.join(failed)}")
+        sys.exit(1)
+    print("[+] All tests completed successfully.")
 
 
 if __name__ == "__main__":
     main()
-
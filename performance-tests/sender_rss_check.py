@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Peak-RSS check for the file-transfer client's send path.
+
+Writes a large test file, starts a minimal in-process sink that speaks the
+file-transfer protocol (it discards payloads, so only the client's memory
+is under test), and uploads the file with `client/file_client.py` in a
+subprocess while sampling that process's RSS from /proc.
+
+The client hashes and sends from a memory mapping and drops pages it has
+finished with, so its peak RSS should stay far below the file size. The
+check fails (non-zero exit) if the peak exceeds --max-rss-mb.
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from chat_load_test import free_port
+from soak_test import read_process_stats
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+FILE_CLIENT = PROJECT_ROOT / "file-transfer" / "client" / "file_client.py"
+sys.path.insert(0, str(PROJECT_ROOT / "file-transfer"))
+
+from shared.protocol import (  # noqa: E402
+    FileTransferProtocol, MSG_FILE_COMPLETE
+)
+
+
+def run_sink(server: socket.socket) -> None:
+    """Accept one upload, read and discard it, and acknowledge it."""
+    conn, _ = server.accept()
+    buffer = bytearray(1024 * 1024)
+    with conn:
+        while True:
+            header = FileTransferProtocol.receive_header(conn)
+            if header is None:
+                return
+            remaining = header["payload_size"]
+            while remaining:
+                n = conn.recv_into(buffer, min(remaining, len(buffer)))
+                if not n:
+                    return
+                remaining -= n
+            if header["msg_type"] == MSG_FILE_COMPLETE:
+                FileTransferProtocol.send_message(
+                    conn, MSG_FILE_COMPLETE, b"SUCCESS", {"saved_as": "discarded"}
+                )
+
+
+def write_test_file(path: Path, size: int) -> None:
+    block = os.urandom(16 * 1024 * 1024)
+    with path.open("wb") as f:
+        written = 0
+        while written < size:
+            n = min(len(block), size - written)
+            f.write(block[:n])
+            written += n
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Client send-path RSS check.")
+    parser.add_argument("--size-mb", type=int, default=2048,
+                        help="Size of the file to send in MB (default: 2048)")
+    parser.add_argument("--max-rss-mb", type=float, default=150.0,
+                        help="Allowed peak client RSS in MB (default: 150)")
+    parser.add_argument("--dir", default=None,
+                        help="Where to write the test file (default: system temp dir)")
+    parser.add_argument(
+        "--output",
+        default="results/sender_rss.json",
+        help="Path to output JSON file (default: results/sender_rss.json)",
+    )
+    args = parser.parse_args()
+
+    print("=== Sender RSS Check ===")
+    port = free_port()
+    server = socket.create_server(("127.0.0.1", port))
+    sink = threading.Thread(target=run_sink, args=(server,), daemon=True)
+    sink.start()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        path = Path(tmp) / "payload.bin"
+        print(f"[+] Writing {args.size_mb} MB test file ...")
+        write_test_file(path, args.size_mb * 1024 * 1024)
+
+        print("[+] Sending it with file_client.py ...")
+        start = time.monotonic()
+        proc = subprocess.Popen(
+            [sys.executable, str(FILE_CLIENT), "--host", "127.0.0.1",
+             "--port", str(port), "--file", str(path)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        peak_rss = 0.0
+        while proc.poll() is None:
+            try:
+                peak_rss = max(peak_rss, read_process_stats(proc.pid)["rss_mb"])
+            except (FileNotFoundError, ProcessLookupError, KeyError):
+                pass
+            time.sleep(0.05)
+        elapsed = time.monotonic() - start
+
+    server.close()
+    passed = proc.returncode == 0 and peak_rss <= args.max_rss_mb
+    status = "PASS" if passed else "FAIL"
+    print(f"[{'+' if passed else '!'}] {status}: peak client RSS {peak_rss:.1f} MB "
+          f"for a {args.size_mb} MB file ({args.size_mb / elapsed:.0f} MB/s)")
+
+    output_data = {
+        "timestamp": datetime.now().isoformat(),
+        "target": "127.0.0.1",
+        "config": vars(args),
+        "tests": {
+            "sender_rss": {
+                "file_mb": args.size_mb,
+                "peak_rss_mb": peak_rss,
+                "seconds": elapsed,
+                "passed": passed,
+            },
+        },
+        "passed": passed,
+    }
+
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with output_path.open("w", encoding="utf-8") as f:
+        json.dump(output_data, f, indent=2)
+    print(f"\n[+] RSS results saved to {output_path}")
+
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Connection-churn soak test for the chat and file-transfer servers.
+
+Starts both servers on loopback with short idle timeouts and hammers them
+with a mix of well-behaved clients and clients that vanish without closing
+(stop sending mid-handshake or mid-transfer, like a VPN client that dropped
+off the network). While this runs, the thread count, open file descriptors
+and RSS of each server are sampled from /proc.
+
+The test passes when, after the churn stops and the idle timeout has had
+time to fire, every server is back near its baseline thread and fd counts
+and RSS growth stays under a limit. Exit code is non-zero on failure.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from chat_load_test import free_port
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+CHAT_SERVER = PROJECT_ROOT / "chat" / "server" / "chat_server.py"
+FILE_SERVER = PROJECT_ROOT / "file-transfer" / "server" / "file_server.py"
+sys.path.insert(0, str(PROJECT_ROOT / "file-transfer"))
+
+from shared.protocol import (  # noqa: E402
+    FileTransferProtocol, MSG_FILE_CHUNK, MSG_FILE_COMPLETE, MSG_FILE_HEADER
+)
+
+
+def read_process_stats(pid: int) -> dict:
+    """Threads, open fds and RSS of a process."""
+    stats = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key == "Threads":
+                stats["threads"] = int(value)
+            elif key == "VmRSS":
+                stats["rss_mb"] = int(value.split()[0]) / 1024
+    stats["fds"] = len(os.listdir(f"/proc/{pid}/fd"))
+    return stats
+
+
+class StatsSampler(threading.Thread):
+    def __init__(self, pid: int, interval: float = 0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples: list[dict] = []
+        self.stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self.stop_event.wait(self.interval):
+            try:
+                sample = read_process_stats(self.pid)
+            except (FileNotFoundError, ProcessLookupError):
+                return
+            sample["time"] = time.monotonic()
+            self.samples.append(sample)
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        self.join()
+
+
+def start_server(cmd: list[str], port: int) -> subprocess.Popen:
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+class Churner:
+    """Open and abandon connections in a mix of good and bad patterns."""
+
+    def __init__(self, chat_port: int, file_port: int, hold: float):
+        self.chat_port = chat_port
+        self.file_port = file_port
+        self.hold = hold  # how long vanished clients keep their socket open
+        self.abandoned: list[tuple[float, socket.socket]] = []
+        self.lock = threading.Lock()
+        self.counts: dict[str, int] = {}
+        self.errors = 0
+        self.payload = os.urandom(4096)
+
+    def abandon(self, sock: socket.socket) -> None:
+        """Stop talking on a socket but keep it open like a dead peer."""
+        with self.lock:
+            self.abandoned.append((time.monotonic() + self.hold, sock))
+
+    def close_expired(self, force: bool = False) -> None:
+        now = time.monotonic()
+        with self.lock:
+            keep = []
+            for deadline, sock in self.abandoned:
+                if force or deadline <= now:
+                    sock.close()
+                else:
+                    keep.append((deadline, sock))
+            self.abandoned = keep
+
+    def chat_good(self, n: int) -> None:
+        with socket.create_connection(("127.0.0.1", self.chat_port), timeout=5) as s:
+            s.sendall(f"soak_good_{n}\nhello from soak\n/ping\n".encode())
+            s.recv(4096)
+
+    def chat_silent(self, n: int) -> None:
+        s = socket.create_connection(("127.0.0.1", self.chat_port), timeout=5)
+        s.sendall(f"soak_silent_{n}\n".encode())
+        self.abandon(s)
+
+    def chat_no_hello(self, n: int) -> None:
+        s = socket.create_connection(("127.0.0.1", self.chat_port), timeout=5)
+        self.abandon(s)
+
+    def file_good(self, n: int) -> None:
+        checksum = FileTransferProtocol.calculate_checksum(self.payload)
+        with socket.create_connection(("127.0.0.1", self.file_port), timeout=5) as s:
+            FileTransferProtocol.send_message(
+                s, MSG_FILE_HEADER, b"",
+                {"filename": f"soak_{n}.bin", "filesize": len(self.payload),
+                 "checksum": checksum},
+            )
+            FileTransferProtocol.send_message(s, MSG_FILE_CHUNK, self.payload)
+            FileTransferProtocol.send_message(
+                s, MSG_FILE_COMPLETE, b"", {"checksum": checksum}
+            )
+            FileTransferProtocol.receive_message(s)
+
+    def file_vanish(self, n: int) -> None:
+        s = socket.create_connection(("127.0.0.1", self.file_port), timeout=5)
+        FileTransferProtocol.send_message(
+            s, MSG_FILE_HEADER, b"",
+            {"filename": f"soak_vanish_{n}.bin", "filesize": 1 << 20,
+             "checksum": "0" * 64},
+        )
+        FileTransferProtocol.send_message(s, MSG_FILE_CHUNK, self.payload)
+        self.abandon(s)
+
+    def file_half_header(self, n: int) -> None:
+        s = socket.create_connection(("127.0.0.1", self.file_port), timeout=5)
+        s.sendall(b"{\"msg_type\": 1")
+        self.abandon(s)
+
+    def run(self, duration: float, rate: float, seed: int) -> None:
+        patterns = [
+            self.chat_good, self.chat_silent, self.chat_no_hello,
+            self.file_good, self.file_vanish, self.file_half_header,
+        ]
+        rng = random.Random(seed)
+        end = time.monotonic() + duration
+        n = 0
+        while time.monotonic() < end:
+            pattern = rng.choice(patterns)
+            try:
+                pattern(n)
+            except OSError:
+                self.errors += 1
+            self.counts[pattern.__name__] = self.counts.get(pattern.__name__, 0) + 1
+            n += 1
+            self.close_expired()
+            time.sleep(1.0 / rate)
+
+
+def check_bounded(name: str, samples: list[dict], baseline: dict,
+                  settled: dict, max_rss_growth_mb: float) -> dict:
+    peak = {k: max(s[k] for s in samples) for k in ("threads", "fds", "rss_mb")}
+    ok = (
+        settled["threads"] <= baseline["threads"] + 2
+        and settled["fds"] <= baseline["fds"] + 2
+        and settled["rss_mb"] - baseline["rss_mb"] <= max_rss_growth_mb
+    )
+    status = "PASS" if ok else "FAIL"
+    print(f"[{'+' if ok else '!'}] {name}: {status}  "
+          f"threads {baseline['threads']}->{peak['threads']} peak->{settled['threads']}  "
+          f"fds {baseline['fds']}->{peak['fds']} peak->{settled['fds']}  "
+          f"rss {baseline['rss_mb']:.1f}->{settled['rss_mb']:.1f} MB")
+    return {"baseline": baseline, "peak": peak, "settled": settled, "passed": ok}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Connection-churn soak test.")
+    parser.add_argument("--duration", type=float, default=60.0,
+                        help="Seconds of churn (default: 60)")
+    parser.add_argument("--rate", type=float, default=50.0,
+                        help="New connections per second per thread (default: 50)")
+    parser.add_argument("--threads", type=int, default=4,
+                        help="Churning threads (default: 4)")
+    parser.add_argument("--idle-timeout", type=float, default=2.0,
+                        help="Idle timeout given to the servers (default: 2)")
+    parser.add_argument("--max-rss-growth", type=float, default=20.0,
+                        help="Allowed RSS growth per server in MB (default: 20)")
+    parser.add_argument(
+        "--output",
+        default="results/soak.json",
+        help="Path to output JSON file (default: results/soak.json)",
+    )
+    args = parser.parse_args()
+
+    print("=== Connection Churn Soak Test ===")
+    chat_port = free_port()
+    file_port = free_port()
+    timeout = str(args.idle_timeout)
+
+    storage = PROJECT_ROOT / "performance-tests" / "results" / "soak_uploads"
+    servers = {
+        "chat_server": start_server(
+            [sys.executable, str(CHAT_SERVER), "--host", "127.0.0.1",
+             "--port", str(chat_port), "--idle-timeout", timeout,
+             "--hello-timeout", timeout, "--join-replay", "0"],
+            chat_port,
+        ),
+        "file_server": start_server(
+            [sys.executable, str(FILE_SERVER), "--host", "127.0.0.1",
+             "--port", str(file_port), "--storage", str(storage),
+             "--idle-timeout", timeout, "--read-timeout", timeout],
+            file_port,
+        ),
+    }
+
+    results = {}
+    try:
+        time.sleep(1)
+        baselines = {name: read_process_stats(p.pid) for name, p in servers.items()}
+        samplers = {name: StatsSampler(p.pid) for name, p in servers.items()}
+        for sampler in samplers.values():
+            sampler.start()
+
+        # Vanished clients hold their sockets past the server timeout, so
+        # only server-side reaping can free those resources
+        churners = [Churner(chat_port, file_port, hold=args.idle_timeout * 3)
+                    for _ in range(args.threads)]
+        workers = [
+            threading.Thread(target=c.run, args=(args.duration, args.rate, i))
+            for i, c in enumerate(churners)
+        ]
+        print(f"[+] Churning for {args.duration:.0f}s with {args.threads} threads ...")
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+
+        print("[+] Churn done, waiting for idle timeouts ...")
+        time.sleep(args.idle_timeout * 2 + 2)
+        for c in churners:
+            c.close_expired(force=True)
+        time.sleep(2)
+
+        for sampler in samplers.values():
+            sampler.stop()
+        for name, proc in servers.items():
+            settled = read_process_stats(proc.pid)
+            results[name] = check_bounded(
+                name, samplers[name].samples, baselines[name], settled,
+                args.max_rss_growth,
+            )
+
+        counts: dict[str, int] = {}
+        for c in churners:
+            for k, v in c.counts.items():
+                counts[k] = counts.get(k, 0) + v
+    finally:
+        for proc in servers.values():
+            proc.terminate()
+            proc.wait()
+        # The server keeps partial uploads in a subdirectory of storage
+        shutil.rmtree(storage, ignore_errors=True)
+
+    passed = all(r["passed"] for r in results.values())
+    output_data = {
+        "timestamp": datetime.now().isoformat(),
+        "target": "127.0.0.1",
+        "config": vars(args),
+        "connections": counts,
+        "client_errors": sum(c.errors for c in churners),
+        "tests": {"soak": results},
+        "passed": passed,
+    }
+
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with output_path.open("w", encoding="utf-8") as f:
+        json.dump(output_data, f, indent=2)
+    print(f"\n[+] Soak results saved to {output_path}")
+
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Socket profile sweep for the chat and file-transfer servers.
+
+Runs both servers with each socket profile (see `shared/sockopts.py`)
+behind a loopback relay that emulates a slower, longer link, and for each
+round-trip time measures:
+
+  - upload and download throughput of a test file (`FileTransferClient`)
+  - segments the client sent for the upload (TCP_INFO), which shows the
+    effect of corking
+  - chat broadcast latency when lines are sent in bursts, which is where
+    Nagle's algorithm holds back the second line of a burst
+
+The link is emulated by `wan_emulator.py` (no jitter or encryption, MTU
+1500). The relay ends the TCP connection, so its window is set to what
+the endpoints would get on the emulated path: the BDP-sized buffers
+when the profile is given the link, otherwise the kernel's autotuning
+limit (tcp_rmem max). The `default` case runs without link information,
+like the servers did before socket profiles existed.
+
+Results are written to a JSON file that `ResultsAnalyzer` can pick up.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from chat_load_test import STAMP_MARKER, free_port
+from latency_histogram import LatencyHistogram
+from sender_rss_check import write_test_file
+from wan_emulator import WanEmulator, autotune_limit, link_profile
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+CHAT_SERVER = PROJECT_ROOT / "chat" / "server" / "chat_server.py"
+FILE_SERVER = PROJECT_ROOT / "file-transfer" / "server" / "file_server.py"
+sys.path.insert(0, str(PROJECT_ROOT / "file-transfer" / "client"))
+
+from file_client import FileTransferClient  # noqa: E402
+from shared.sockopts import SOCKET_PROFILES, SocketTuning, effective_options  # noqa: E402
+
+# struct tcp_info: tcpi_segs_out follows 136 bytes of older fields (Linux 4.2+)
+TCP_INFO_SEGS_OUT = 136
+
+
+def segments_sent(sock: socket.socket) -> int | None:
+    if not hasattr(socket, "TCP_INFO"):
+        return None
+    info = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, 256)
+    if len(info) < TCP_INFO_SEGS_OUT + 4:
+        return None
+    return struct.unpack_from("I", info, TCP_INFO_SEGS_OUT)[0]
+
+
+def start_server(script: Path, port: int, extra: list[str]) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, str(script), "--host", "127.0.0.1", "--port", str(port), *extra],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError(f"{script.name} did not start")
+
+
+def measure_file_transfer(port: int, path: Path, link_args: dict, profile: str) -> dict:
+    size_mb = path.stat().st_size / (1024 * 1024)
+
+    def connect() -> FileTransferClient:
+        client = FileTransferClient("127.0.0.1", port, heartbeat_interval=0,
+                                    progress="none", socket_profile=profile, **link_args)
+        if not client.connect():
+            raise RuntimeError("Could not connect to the file server")
+        return client
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        # The server closes the connection after an upload
+        client = connect()
+        options = effective_options(client.socket)
+        start = time.perf_counter()
+        if not client.send_file(str(path)):
+            raise RuntimeError("Upload failed")
+        upload = time.perf_counter() - start
+        segments = segments_sent(client.socket)
+        client.disconnect()
+
+        client = connect()
+        name = next(client.iter_files())["name"]
+        start = time.perf_counter()
+        if not client.download_file(name, str(path.with_suffix(".down"))):
+            raise RuntimeError("Download failed")
+        download = time.perf_counter() - start
+        client.disconnect()
+
+    result = {
+        "upload_seconds": upload,
+        "upload_mbps": size_mb * 8 * 1.048576 / upload,
+        "download_seconds": download,
+        "download_mbps": size_mb * 8 * 1.048576 / download,
+        "client_socket": options,
+    }
+    if segments:
+        result["upload_segments"] = segments
+        result["bytes_per_segment"] = path.stat().st_size / segments
+    return result
+
+
+def measure_chat_bursts(port: int, tuning: SocketTuning, bursts: int, burst_size: int) -> dict:
+    """Send `burst_size` stamped lines back to back, `bursts` times."""
+    def open_client(name: str) -> socket.socket:
+        sock = tuning.apply(socket.socket(socket.AF_INET, socket.SOCK_STREAM))
+        sock.connect(("127.0.0.1", port))
+        sock.sendall(f"{name}\n".encode("utf-8"))
+        return sock
+
+    sender = open_client("sweep_sender")
+    receiver = open_client("sweep_receiver")
+    time.sleep(1.5)  # let the batched join notice go out
+    receiver.settimeout(0.2)
+    try:
+        while receiver.recv(65536):
+            pass
+    except socket.timeout:
+        pass
+    receiver.settimeout(10)
+
+    latencies = LatencyHistogram()
+    buffer = b""
+    for _ in range(bursts):
+        for _ in range(burst_size):
+            sender.sendall(f"LT {time.monotonic_ns()}\n".encode("utf-8"))
+        received = 0
+        while received < burst_size:
+            while b"\n" not in buffer:
+                buffer += receiver.recv(4096)
+            line, buffer = buffer.split(b"\n", 1)
+            marker = line.rfind(STAMP_MARKER.encode())
+            if marker >= 0:
+                sent_ns = int(line[marker + len(STAMP_MARKER):])
+                latencies.record((time.monotonic_ns() - sent_ns) / 1e6)
+                received += 1
+
+    sender.close()
+    receiver.close()
+    return latencies.summary()
+
+
+def run_case(profile: str, use_link: bool, rtt_ms: float, args, path: Path,
+             storage: Path) -> dict:
+    link_args = {"link_mbps": args.link_mbps, "rtt_ms": rtt_ms} if use_link else {}
+    tuning = SocketTuning(profile, **link_args)
+    window = tuning.buffer_size or autotune_limit()
+    server_args = ["--socket-profile", profile]
+    if use_link:
+        server_args += ["--link-mbps", str(args.link_mbps), "--rtt-ms", str(rtt_ms)]
+
+    file_port, chat_port = free_port(), free_port()
+    servers = [
+        start_server(FILE_SERVER, file_port, server_args + [
+            "--storage", str(storage), "--idle-timeout", "0", "--progress-interval", "0"]),
+        start_server(CHAT_SERVER, chat_port, server_args + ["--presence-interval", "1"]),
+    ]
+    link = link_profile("lan", rtt_ms=rtt_ms, jitter_ms=0, link_mbps=args.link_mbps)
+    file_relay = WanEmulator(file_port, link=link, window=window).start()
+    chat_relay = WanEmulator(chat_port, link=link, window=window).start()
+    try:
+        return {
+            "profile": profile,
+            "link_given": use_link,
+            "rtt_ms": rtt_ms,
+            "settings": tuning.describe(),
+            "window_bytes": window,
+            "file_transfer": measure_file_transfer(file_relay.port, path, link_args, profile),
+            "chat_latency": measure_chat_bursts(chat_relay.port, tuning,
+                                                args.bursts, args.burst_size),
+        }
+    finally:
+        file_relay.close()
+        chat_relay.close()
+        for proc in servers:
+            proc.terminate()
+            proc.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Socket profile sweep over an emulated link.")
+    parser.add_argument("--rtt-ms", type=float, nargs="+", default=[2, 20, 80],
+                        help="Emulated round-trip times in ms (default: 2 20 80)")
+    parser.add_argument("--link-mbps", type=float, default=100,
+                        help="Emulated link speed in Mbit/s (default: 100)")
+    parser.add_argument("--size-mb", type=int, default=8,
+                        help="Size of the transferred file in MB (default: 8)")
+    parser.add_argument("--bursts", type=int, default=100,
+                        help="Chat bursts per case (default: 100)")
+    parser.add_argument("--burst-size", type=int, default=2,
+                        help="Chat lines sent back to back per burst (default: 2)")
+    parser.add_argument(
+        "--output",
+        default="results/socket_profiles.json",
+        help="Path to output JSON file (default: results/socket_profiles.json)",
+    )
+    args = parser.parse_args()
+
+    # The old behaviour (no options, no link information) is the baseline
+    cases = [("default", False)] + [(p, True) for p in SOCKET_PROFILES if p != "default"]
+
+    print("=== Socket Profile Sweep ===")
+    print(f"[+] Link {args.link_mbps:g} Mbit/s, RTT {args.rtt_ms} ms, "
+          f"{args.size_mb} MB file, chat bursts of {args.burst_size}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "payload.bin"
+        write_test_file(path, args.size_mb * 1024 * 1024)
+        for rtt_ms in args.rtt_ms:
+            for profile, use_link in cases:
+                storage = Path(tmp) / f"store_{profile}_{rtt_ms:g}"
+                case = run_case(profile, use_link, rtt_ms, args, path, storage)
+                results.append(case)
+                transfer, chat = case["file_transfer"], case["chat_latency"]
+                segments = transfer.get("bytes_per_segment")
+                print(f"[+] rtt {rtt_ms:>5g} ms {profile:>11}: "
+                      f"up {transfer['upload_mbps']:6.1f} Mbit/s, "
+                      f"down {transfer['download_mbps']:6.1f} Mbit/s, "
+                      + (f"{segments / 1024:5.1f} KB/segment, " if segments else "")
+                      + f"chat p50 {chat['p50']:.1f} ms p99 {chat['p99']:.1f} ms")
+
+    output_data = {
+        "timestamp": datetime.now().isoformat(),
+        "target": "127.0.0.1 (emulated link)",
+        "config": vars(args),
+        "tests": {"socket_profiles": results},
+    }
+
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with output_path.open("w", encoding="utf-8") as f:
+        json.dump(output_data, f, indent=2)
+    print(f"\n[+] Socket profile results saved to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
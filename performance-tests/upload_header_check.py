@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Upload header check for the file-transfer server.
+
+Starts `server/file_server.py` on a free port with a temporary storage
+directory and sends it upload headers a client controls:
+
+  - tree-hash block sizes that are zero, tiny, not a power of two, huge
+    or not a number (a zero block size used to hang the connection's
+    thread)
+  - file sizes that are negative, not a number, above the server's
+    --max-upload-mb or larger than the disk (the server preallocates the
+    announced size)
+  - an upload that sends more data than its header announced
+
+The server must answer each with MSG_ERROR and drop the upload within
+--timeout seconds. Well-formed uploads must still succeed, and a stale
+`.uploads/*.part` file placed in the storage directory before startup
+must be gone once the server runs.
+
+The check fails (non-zero exit) if any case gets the wrong answer.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from chat_load_test import free_port
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+FILE_SERVER = PROJECT_ROOT / "file-transfer" / "server" / "file_server.py"
+sys.path.insert(0, str(PROJECT_ROOT / "file-transfer"))
+
+from shared.protocol import (  # noqa: E402
+    FileTransferProtocol, HASH_TREE, MSG_ERROR, MSG_FILE_CHUNK, MSG_FILE_COMPLETE,
+    MSG_FILE_HEADER
+)
+from shared.treehash import MIN_TREE_BLOCK_SIZE, TreeHasher, valid_block_size  # noqa: E402
+
+PAYLOAD = os.urandom(3 * MIN_TREE_BLOCK_SIZE + 1000)
+MAX_UPLOAD_MB = 64
+# The server is told to keep all but this much of the disk free, so an
+# upload below MAX_UPLOAD_MB can still be too large for the disk
+ALLOWED_FREE_MB = 4
+STALE_PART = Path(".uploads") / "stale.part"
+
+# (case name, extra header fields, expected reply type)
+CASES = [
+    ("block_size_zero", {"block_size": 0}, MSG_ERROR),
+    ("block_size_one", {"block_size": 1}, MSG_ERROR),
+    ("block_size_below_min", {"block_size": MIN_TREE_BLOCK_SIZE // 2}, MSG_ERROR),
+    ("block_size_not_power_of_two", {"block_size": 3 * 1024 * 1024}, MSG_ERROR),
+    ("block_size_huge", {"block_size": 1 << 40}, MSG_ERROR),
+    ("block_size_negative", {"block_size": -4096}, MSG_ERROR),
+    ("block_size_string", {"block_size": "4194304"}, MSG_ERROR),
+    ("block_size_valid", {"block_size": MIN_TREE_BLOCK_SIZE}, MSG_FILE_COMPLETE),
+    ("file_size_negative", {"filesize": -1}, MSG_ERROR),
+    ("file_size_string", {"filesize": "1000"}, MSG_ERROR),
+    ("file_size_above_max", {"filesize": MAX_UPLOAD_MB * 1024 * 1024 + 1}, MSG_ERROR),
+    ("file_size_above_disk", {"filesize": 4 * ALLOWED_FREE_MB * 1024 * 1024}, MSG_ERROR),
+    ("data_above_file_size", {"filesize": len(PAYLOAD) // 2}, MSG_ERROR),
+]
+
+
+def wait_for_port(port: int, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def run_case(port: int, fields: dict, timeout: float) -> tuple[int | None, str, float]:
+    """Send one tree-hash upload; returns (reply type, reply text, seconds)."""
+    fields = {"block_size": MIN_TREE_BLOCK_SIZE, **fields}
+    checksum = "0" * 64
+    if valid_block_size(fields["block_size"]):
+        tree = TreeHasher(fields["block_size"])
+        tree.update(PAYLOAD)
+        checksum = tree.hexdigest()
+    metadata = {"filename": "header_check.bin", "filesize": len(PAYLOAD),
+                "checksum": checksum, "hash_mode": HASH_TREE, **fields}
+
+    start = time.monotonic()
+    with socket.create_connection(("127.0.0.1", port), timeout=timeout) as sock:
+        FileTransferProtocol.send_message(sock, MSG_FILE_HEADER, b"", metadata)
+        try:
+            # A rejecting server may already have closed the connection
+            FileTransferProtocol.send_message(sock, MSG_FILE_CHUNK, PAYLOAD)
+            FileTransferProtocol.send_message(sock, MSG_FILE_COMPLETE, b"",
+                                              {"checksum": checksum})
+        except OSError:
+            pass
+        try:
+            msg_type, _, payload = FileTransferProtocol.receive_message(sock)
+        except socket.timeout:
+            return None, "no reply (timed out)", time.monotonic() - start
+        except OSError as e:
+            return None, f"connection error: {e}", time.monotonic() - start
+    reply = payload.decode("utf-8", "replace") if payload else ""
+    return msg_type, reply, time.monotonic() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="File-transfer upload header check.")
+    parser.add_argument("--timeout", type=float, default=5.0,
+                        help="Seconds to wait for each reply (default: 5)")
+    parser.add_argument(
+        "--output",
+        default="results/upload_header_check.json",
+        help="Path to output JSON file (default: results/upload_header_check.json)",
+    )
+    args = parser.parse_args()
+
+    print("=== Upload Header Check ===")
+    port = free_port()
+    results = {}
+    with tempfile.TemporaryDirectory() as storage:
+        # Left over from a "crashed" earlier run; startup must remove it
+        (Path(storage) / STALE_PART).parent.mkdir()
+        (Path(storage) / STALE_PART).write_bytes(b"x" * 4096)
+        min_free_mb = shutil.disk_usage(storage).free // (1024 * 1024) - ALLOWED_FREE_MB
+        server = subprocess.Popen(
+            [sys.executable, str(FILE_SERVER), "--host", "127.0.0.1", "--port", str(port),
+             "--storage", storage, "--progress-interval", "0",
+             "--max-upload-mb", str(MAX_UPLOAD_MB), "--min-free-mb", str(min_free_mb)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_for_port(port, 10.0)
+            swept = not (Path(storage) / STALE_PART).exists()
+            results["stale_part_swept"] = {"passed": swept, "reply": "", "seconds": 0.0}
+            print(f"[{'+' if swept else '!'}] stale_part_swept: "
+                  f"{'removed' if swept else 'still there'}")
+            for name, fields, expected in CASES:
+                msg_type, reply, seconds = run_case(port, fields, args.timeout)
+                passed = msg_type == expected
+                results[name] = {"passed": passed, "reply": reply, "seconds": seconds}
+                print(f"[{'+' if passed else '!'}] {name}: {reply or msg_type} "
+                      f"({seconds * 1000:.0f} ms)")
+        finally:
+            server.terminate()
+            server.wait()
+
+    passed = all(r["passed"] for r in results.values())
+    print(f"[{'+' if passed else '!'}] {'PASS' if passed else 'FAIL'}: "
+          f"{sum(r['passed'] for r in results.values())}/{len(results)} cases")
+
+    output_data = {
+        "timestamp": datetime.now().isoformat(),
+        "target": "127.0.0.1",
+        "config": vars(args),
+        "tests": {"upload_header_check": results},
+        "passed": passed,
+    }
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with output_path.open("w", encoding="utf-8") as f:
+        json.dump(output_data, f, indent=2)
+    print(f"\n[+] Header check results saved to {output_path}")
+
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""
+WAN/VPN link emulator for loopback performance tests.
+
+A userspace TCP relay that makes a loopback connection behave like a
+connection through the VPN tunnel, so the application benchmarks can be
+reproduced without OpenVPN, iperf3 or a second machine. Each direction
+of each relayed connection goes through a model of the link:
+
+  - latency: every segment arrives half the round-trip time after it left
+  - jitter: a random extra delay per segment (uniform, +/- jitter_ms);
+    segments are never reordered, as TCP would hide that anyway
+  - bandwidth: segments leave no faster than link_mbps, counting the
+    per-packet header and tunnel overhead; all connections share the
+    link, and its queue holds at most one round trip's worth of data
+    (at least QUEUE_MIN_SECONDS) like a router buffer sized to the BDP
+  - MTU: data is cut into segments of at most mtu - 40 bytes (the inner
+    IP and TCP headers) and written to the receiver one segment at a time
+  - encryption: each segment is sealed and opened again like the two ends
+    of the tunnel would: "hmac-sha256" (OpenVPN's packet authentication)
+    or "aes-gcm" (a TLS 1.3 AES-GCM record through an in-memory TLS pair,
+    which needs the openssl CLI for a throwaway certificate). The work
+    runs on the relay's single event loop thread, like OpenVPN's.
+
+The relay ends the TCP connection, so it also caps the bytes in flight
+per direction at `window` and only reopens the window a full round trip
+after the data was sent: what TCP's window does on the real path.
+
+Use it in-process (`WanEmulator(...).start()`) or as a standalone
+forwarder in front of any server:
+
+    python3 wan_emulator.py --target 127.0.0.1:9999 --listen-port 9000 --preset vpn
+
+`--self-check` relays a known number of bytes through every crypto mode
+and exits 1 unless each arrives complete.
+"""
+
+import argparse
+import asyncio
+import collections
+import hashlib
+import hmac
+import os
+import random
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+# Inner IPv4 + TCP headers, taken out of every segment's MTU
+TCP_IP_HEADERS = 40
+
+# Shortest queue the bottleneck holds, for links with little or no latency
+QUEUE_MIN_SECONDS = 0.01
+
+# rtt_ms, jitter_ms, link_mbps (0 = unlimited), mtu, overhead (tunnel bytes
+# per packet on top of the inner headers), crypto
+LINK_PRESETS = {
+    "loopback": {"rtt_ms": 0, "jitter_ms": 0, "link_mbps": 0, "mtu": 65535,
+                 "overhead": 0, "crypto": "none"},
+    "lan": {"rtt_ms": 1, "jitter_ms": 0.1, "link_mbps": 1000, "mtu": 1500,
+            "overhead": 0, "crypto": "none"},
+    # OpenVPN over UDP on broadband: tun MTU 1400, ~69 bytes of outer
+    # IP/UDP/OpenVPN headers and AEAD tag per packet, AES-256-GCM
+    "vpn": {"rtt_ms": 30, "jitter_ms": 3, "link_mbps": 100, "mtu": 1400,
+            "overhead": 69, "crypto": "aes-gcm"},
+    "vpn-wan": {"rtt_ms": 80, "jitter_ms": 10, "link_mbps": 20, "mtu": 1400,
+                "overhead": 69, "crypto": "aes-gcm"},
+    "mobile": {"rtt_ms": 120, "jitter_ms": 30, "link_mbps": 10, "mtu": 1400,
+               "overhead": 69, "crypto": "aes-gcm"},
+}
+
+CRYPTO_MODES = ("none", "hmac-sha256", "aes-gcm")
+
+
+def link_profile(preset: str = "loopback", **overrides) -> dict:
+    """A preset with some of its values replaced (None values are ignored)"""
+    if preset not in LINK_PRESETS:
+        raise ValueError(f"Unknown link preset: {preset}")
+    link = dict(LINK_PRESETS[preset])
+    link.update({k: v for k, v in overrides.items() if v is not None})
+    if link["crypto"] not in CRYPTO_MODES:
+        raise ValueError(f"Unknown crypto mode: {link['crypto']}")
+    return link
+
+
+def describe_link(link: dict) -> str:
+    rate = f"{link['link_mbps']:g} Mbit/s" if link["link_mbps"] else "unlimited"
+    return (f"RTT {link['rtt_ms']:g} ms +/- {link['jitter_ms']:g} ms, {rate}, "
+            f"MTU {link['mtu']}, crypto {link['crypto']}")
+
+
+def autotune_limit() -> int:
+    """Largest receive window the kernel grows a socket to on its own"""
+    try:
+        with open("/proc/sys/net/ipv4/tcp_rmem") as f:
+            return int(f.read().split()[2])
+    except (OSError, IndexError, ValueError):
+        return 6 * 1024 * 1024
+
+
+_certificate = None
+_certificate_lock = threading.Lock()
+
+
+def _throwaway_certificate() -> tuple[str, str]:
+    """Self-signed certificate for the in-memory tunnel, made once per process"""
+    global _certificate
+    with _certificate_lock:
+        if _certificate is None:
+            directory = Path(tempfile.mkdtemp(prefix="wan_emulator_"))
+            certfile, keyfile = directory / "tunnel.crt", directory / "tunnel.key"
+            subprocess.run(
+                ["openssl", "req", "-x509", "-nodes", "-days", "1",
+                 "-newkey", "ec", "-pkeyopt", "ec_paramgen_curve:prime256v1",
+                 "-keyout", str(keyfile), "-out", str(certfile), "-subj", "/CN=tunnel"],
+                check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            _certificate = (str(certfile), str(keyfile))
+        return _certificate
+
+
+class TunnelCipher:
+    """Both ends of one direction of the tunnel: seal() protects a packet
+    the way the sending end would and checks it the way the receiving end
+    would, so the relay pays the tunnel's CPU cost per packet"""
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        if mode == "hmac-sha256":
+            self.key = os.urandom(32)
+        elif mode == "aes-gcm":
+            self._open_tls_pair()
+
+    def _open_tls_pair(self) -> None:
+        certfile, keyfile = _throwaway_certificate()
+        server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        server_context.load_cert_chain(certfile, keyfile)
+        client_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        client_context.check_hostname = False
+        client_context.verify_mode = ssl.CERT_NONE
+        for context in (server_context, client_context):
+            context.minimum_version = ssl.TLSVersion.TLSv1_3
+
+        # Each end writes into the BIO the other reads from
+        self.sender_out, self.receiver_in = ssl.MemoryBIO(), ssl.MemoryBIO()
+        self.receiver_out, self.sender_in = ssl.MemoryBIO(), ssl.MemoryBIO()
+        self.sender = client_context.wrap_bio(self.sender_in, self.sender_out)
+        self.receiver = server_context.wrap_bio(self.receiver_in, self.receiver_out,
+                                                server_side=True)
+        for _ in range(10):
+            done = True
+            for end in (self.sender, self.receiver):
+                try:
+                    end.do_handshake()
+                except ssl.SSLWantReadError:
+                    done = False
+            self.receiver_in.write(self.sender_out.read())
+            self.sender_in.write(self.receiver_out.read())
+            if done:
+                return
+        raise RuntimeError("In-memory TLS handshake did not complete")
+
+    def seal(self, packet: bytes) -> bytes:
+        if self.mode == "hmac-sha256":
+            tag = hmac.new(self.key, packet, hashlib.sha256).digest()
+            if not hmac.compare_digest(tag, hmac.new(self.key, packet, hashlib.sha256).digest()):
+                raise ValueError("Packet authentication failed")
+            return packet
+        if self.mode == "aes-gcm":
+            self.sender.write(packet)
+            self.receiver_in.write(self.sender_out.read())
+            # One read() returns at most one TLS record (16 KB), and a
+            # packet can span several
+            opened = bytearray()
+            while len(opened) < len(packet):
+                try:
+                    chunk = self.receiver.read(len(packet) - len(opened))
+                except ssl.SSLWantReadError:
+                    chunk = b""
+                if not chunk:
+                    raise ValueError(f"Tunnel opened {len(opened)} of {len(packet)} bytes")
+                opened += chunk
+            return bytes(opened)
+        return packet
+
+
+class WanEmulator:
+    """Relay connections to a target through an emulated link"""
+
+    def __init__(self, target_port: int, target_host: str = "127.0.0.1",
+                 link: dict | None = None, window: int | None = None,
+                 listen_port: int = 0, seed: int | None = None):
+        self.target = (target_host, target_port)
+        self.link = link or link_profile()
+        self.window = window or autotune_limit()
+        self.listen_port = listen_port
+        self.random = random.Random(seed)
+        self.port = None
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.ready = threading.Event()
+        self.connections = 0
+        # When each direction of the link is next free; connections share it
+        self.link_free = {"up": 0.0, "down": 0.0}
+
+    def start(self) -> "WanEmulator":
+        """Start the event loop thread; returns once the relay listens"""
+        # Make the certificate here, not on the loop thread mid-test
+        if self.link["crypto"] == "aes-gcm":
+            _throwaway_certificate()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        return self
+
+    def close(self) -> None:
+        """Drop all relayed connections and stop the event loop thread"""
+        if self.loop and self.loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._cancel_all(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+
+    async def _cancel_all(self) -> None:
+        self.server.close()
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _run(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(
+            asyncio.start_server(self._relay, "127.0.0.1", self.listen_port)
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.server.close()
+            self.loop.close()
+
+    async def _relay(self, client_reader: asyncio.StreamReader,
+                     client_writer: asyncio.StreamWriter) -> None:
+        try:
+            server_reader, server_writer = await asyncio.open_connection(*self.target)
+        except OSError:
+            client_writer.close()
+            return
+        self.connections += 1
+        # A link does not hold back small packets, so neither does the relay
+        for writer in (client_writer, server_writer):
+            writer.get_extra_info("socket").setsockopt(
+                socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            await asyncio.gather(
+                self._direction(client_reader, server_writer, "up"),
+                self._direction(server_reader, client_writer, "down"),
+            )
+        except asyncio.CancelledError:
+            pass  # the emulator is closing
+        finally:
+            client_writer.close()
+            server_writer.close()
+
+    async def _direction(self, reader: asyncio.StreamReader,
+                         writer: asyncio.StreamWriter, way: str) -> None:
+        """Carry one direction of a connection over the emulated link"""
+        link = self.link
+        loop = asyncio.get_running_loop()
+        one_way = link["rtt_ms"] / 2000
+        jitter = link["jitter_ms"] / 1000
+        byte_time = 8 / (link["link_mbps"] * 1_000_000) if link["link_mbps"] else 0.0
+        queue_limit = max(link["rtt_ms"] / 1000, QUEUE_MIN_SECONDS)
+        segment_size = max(1, link["mtu"] - TCP_IP_HEADERS)
+        packet_overhead = TCP_IP_HEADERS + link["overhead"]
+        cipher = TunnelCipher(link["crypto"])
+
+        in_transit = collections.deque()  # (arrival time, segment), None at EOF
+        arrived = asyncio.Event()
+        acks = collections.deque()        # (time the window reopens, bytes)
+
+        async def deliver() -> None:
+            while True:
+                while not in_transit:
+                    arrived.clear()
+                    await arrived.wait()
+                if in_transit[0] is None:
+                    break
+                delay = in_transit[0][0] - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                # Hand over every segment that has arrived by now, one
+                # write per segment like packets off the wire
+                now = loop.time()
+                while in_transit and in_transit[0] is not None and in_transit[0][0] <= now:
+                    writer.write(in_transit.popleft()[1])
+                try:
+                    await writer.drain()
+                except OSError:
+                    return
+            try:
+                writer.write_eof()
+            except OSError:
+                pass
+
+        delivery = asyncio.ensure_future(deliver())
+        last_arrival = 0.0
+        in_flight = 0
+        try:
+            while True:
+                now = loop.time()
+                while acks and acks[0][0] <= now:
+                    in_flight -= acks.popleft()[1]
+                if in_flight >= self.window:
+                    await asyncio.sleep(acks[0][0] - now)
+                    continue
+                # A full bottleneck queue stalls the sender, like drops would
+                backlog = self.link_free[way] - now
+                if byte_time and backlog > queue_limit:
+                    await asyncio.sleep(backlog - queue_limit)
+                    continue
+                try:
+                    data = await reader.read(min(65536, self.window - in_flight))
+                except OSError:
+                    data = b""
+                if not data:
+                    break
+                now = loop.time()
+                for start in range(0, len(data), segment_size):
+                    segment = cipher.seal(data[start:start + segment_size])
+                    link_free = max(now, self.link_free[way]) + (
+                        len(segment) + packet_overhead) * byte_time
+                    self.link_free[way] = link_free
+                    arrival = link_free + one_way
+                    if jitter:
+                        arrival += self.random.uniform(-jitter, jitter)
+                    arrival = last_arrival = max(arrival, last_arrival, now)
+                    acks.append((arrival + one_way, len(segment)))
+                    in_flight += len(segment)
+                    in_transit.append((arrival, segment))
+                arrived.set()
+        finally:
+            in_transit.append(None)
+            arrived.set()
+            await delivery
+
+
+def add_link_arguments(parser: argparse.ArgumentParser) -> None:
+    """--preset plus per-value overrides, shared by the benchmarks"""
+    parser.add_argument("--preset", choices=sorted(LINK_PRESETS), default="vpn",
+                        help="Emulated link (default: vpn)")
+    parser.add_argument("--link-rtt-ms", type=float, default=None,
+                        help="Override the preset round-trip time in ms")
+    parser.add_argument("--link-jitter-ms", type=float, default=None,
+                        help="Override the preset jitter in ms")
+    parser.add_argument("--link-mbps", type=float, default=None,
+                        help="Override the preset bandwidth in Mbit/s (0 = unlimited)")
+    parser.add_argument("--link-mtu", type=int, default=None,
+                        help="Override the preset tunnel MTU")
+    parser.add_argument("--link-crypto", choices=CRYPTO_MODES, default=None,
+                        help="Override the preset tunnel encryption")
+
+
+def link_from_args(args: argparse.Namespace) -> dict:
+    return link_profile(args.preset, rtt_ms=args.link_rtt_ms, jitter_ms=args.link_jitter_ms,
+                        link_mbps=args.link_mbps, mtu=args.link_mtu, crypto=args.link_crypto)
+
+
+def start_emulator_process(target_port: int, preset: str,
+                           extra: list[str] | None = None) -> tuple[subprocess.Popen, int]:
+    """Run the emulator as its own process (its own CPU, like a VPN hop);
+    returns the process and the port it listens on"""
+    proc = subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve()), "--target",
+         f"127.0.0.1:{target_port}", "--preset", preset, *(extra or [])],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+    for line in proc.stdout:
+        if "->" in line:
+            port = int(line.split("->")[0].rsplit(":", 1)[1])
+            proc.stdout.close()
+            return proc, port
+    proc.wait()
+    raise RuntimeError("WAN emulator did not start")
+
+
+def relay_byte_count(crypto: str, size: int = 1_000_000) -> int:
+    """Send size bytes through an emulated loopback link to a sink;
+    returns how many bytes the sink received"""
+    sink = socket.create_server(("127.0.0.1", 0))
+    received = 0
+
+    def drain() -> None:
+        nonlocal received
+        conn, _ = sink.accept()
+        with conn:
+            while chunk := conn.recv(65536):
+                received += len(chunk)
+
+    reader = threading.Thread(target=drain, daemon=True)
+    reader.start()
+    emulator = WanEmulator(sink.getsockname()[1], link=link_profile("loopback", crypto=crypto))
+    emulator.start()
+    try:
+        with socket.create_connection(("127.0.0.1", emulator.port)) as conn:
+            conn.sendall(os.urandom(size))
+            conn.shutdown(socket.SHUT_WR)
+            reader.join(timeout=30)
+    finally:
+        emulator.close()
+        sink.close()
+    return received
+
+
+def self_check(size: int = 1_000_000) -> bool:
+    """Check that every crypto mode relays all bytes"""
+    passed = True
+    for crypto in CRYPTO_MODES:
+        received = relay_byte_count(crypto, size)
+        ok = received == size
+        passed = passed and ok
+        print(f"[{'+' if ok else '!'}] {crypto}: relayed {received:,} of {size:,} bytes")
+    return passed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Loopback WAN/VPN link emulator.")
+    parser.add_argument("--target", help="host:port of the server to relay to")
+    parser.add_argument("--self-check", action="store_true",
+                        help="Check that every crypto mode relays all bytes, then exit")
+    parser.add_argument("--listen-port", type=int, default=0,
+                        help="Loopback port to listen on (default: any free port)")
+    parser.add_argument("--window-kb", type=int, default=0,
+                        help="Bytes in flight per direction, in KB (default: tcp_rmem max)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Seed for the jitter, for repeatable runs")
+    add_link_arguments(parser)
+    args = parser.parse_args()
+
+    if args.self_check:
+        sys.exit(0 if self_check() else 1)
+    if not args.target:
+        parser.error("--target is required")
+    host, _, port = args.target.rpartition(":")
+    emulator = WanEmulator(int(port), host or "127.0.0.1", link_from_args(args),
+                           window=args.window_kb * 1024, listen_port=args.listen_port,
+                           seed=args.seed)
+    emulator.start()
+    print(f"[+] Emulating {describe_link(emulator.link)}")
+    print(f"[+] 127.0.0.1:{emulator.port} -> {args.target}", flush=True)
+    try:
+        emulator.thread.join()
+    except KeyboardInterrupt:
+        print("\n[!] Emulator stopped")
+
+
+if __name__ == "__main__":
+    main()
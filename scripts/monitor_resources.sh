@@ -1,22 +1,10 @@
 #!/bin/bash
+# Sample the chat/file servers and network interfaces for DURATION seconds
+# (default 300). The sampling is done by performance-tests/resource_sampler.py,
+# which reads /proc and /sys directly; extra arguments are passed to it.
 
-OUTPUT_FILE="resource_usage.log"
-DURATION=300   # 5 minutes
-
-echo "Monitoring system resources for $DURATION seconds..."
-echo "Timestamp,CPU%,Memory%,NetworkRx,NetworkTx" > $OUTPUT_FILE
-
-for i in $(seq 1 $DURATION); do
-    TIMESTAMP=$(date +%s)
-    CPU=$(top -bn1 | grep "Cpu(s)" | sed "s/.*, *\([0-9.]*\)%* id.*/\1/" | awk '{print 100 - $1}')
-    MEM=$(free | grep Mem | awk '{print ($3/$2) * 100.0}')
-    
-    NET_RX=$(cat /sys/class/net/tun0/statistics/rx_bytes 2>/dev/null || echo 0)
-    NET_TX=$(cat /sys/class/net/tun0/statistics/tx_bytes 2>/dev/null || echo 0)
-
-    echo "$TIMESTAMP,$CPU,$MEM,$NET_RX,$NET_TX" >> $OUTPUT_FILE
-    sleep 1
-done
-
-echo "Monitoring complete. Results saved to $OUTPUT_FILE"
+OUTPUT_FILE="resource_usage.csv"
+DURATION=${1:-300}
 
+exec python3 "$(dirname "$0")/../performance-tests/resource_sampler.py" \
+    --duration "$DURATION" --output "$OUTPUT_FILE" "${@:2}"